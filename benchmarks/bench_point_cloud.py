@@ -0,0 +1,134 @@
+"""
+Point cloud benchmark, runnable offline without QGIS:
+
+    python benchmarks/bench_point_cloud.py --size 500 --density 20 --plots 100 --plot-size 30
+
+Generates a synthetic LAS/LAZ scene and plot polygons, then times the
+stages of the point cloud algorithm separately:
+
+* metrics: streaming height metrics plus the ALS equation over all heights;
+* clipping: vectorized point-in-polygon selection for every plot;
+* end to end: the batched per-polygon path (reading, clipping, optional
+  ground TIN normalization, metrics), with the requested number of worker
+  processes.
+
+For each stage it reports wall time, points per second and the peak RSS of
+the process and, once worker processes have run, of the largest worker.
+"""
+
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from processing_provider.tnc_carbon_point_cloud_metrics import StreamingHeightMetrics, acd_als # noqa: E402
+from processing_provider.tnc_carbon_point_cloud_io import PolygonRegion, iter_las_chunks # noqa: E402
+from processing_provider.tnc_carbon_point_cloud_batch import accumulate_regions_batched # noqa: E402
+from processing_provider.tnc_carbon_point_cloud_normalize import HeightNormalizer # noqa: E402
+from synthetic_las import generate_points, plot_squares, write_geojson, write_las # noqa: E402
+
+
+def peak_rss_mb(who='self'):
+    """Peak resident set size in MB of this process (``'self'``) or of its largest finished worker (``'children'``).
+
+    Returns None when unavailable.
+    """
+    try:
+        import resource
+        target = resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN
+        peak = resource.getrusage(target).ru_maxrss
+        # Linux informa em KB, macOS em bytes
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        if who != 'self':
+            return None
+        try:
+            import psutil # type: ignore
+            return psutil.Process().memory_info().peak_wset / 1024 ** 2
+        except Exception:
+            return None
+
+
+def report(stage, seconds, points, workers=1):
+    rate = points / seconds if seconds > 0 else float('inf')
+    rss = peak_rss_mb()
+    rss_text = f'{rss:,.0f} MB' if rss is not None else 'n/a'
+    children = peak_rss_mb('children') if workers > 1 else None
+    if children:
+        # Os processos de trabalho não entram no RSS do processo principal
+        rss_text += f' (workers {children:,.0f} MB)'
+    print(f'{stage:<12} {seconds:>9.3f} s {points:>14,} pts {rate:>14,.0f} pts/s   peak RSS {rss_text}')
+
+
+def bench_metrics(path):
+    start = time.perf_counter()
+    accumulator = StreamingHeightMetrics()
+    for chunk in iter_las_chunks(path):
+        accumulator.update(chunk['z'])
+    metrics = accumulator.metrics()
+    acd_als(metrics['hm'], metrics['kh'], metrics['h5'], metrics['h10'], metrics['hiq'], metrics['h100'])
+    report('metrics', time.perf_counter() - start, accumulator.count)
+
+
+def bench_clipping(x, y, regions):
+    start = time.perf_counter()
+    selected = 0
+    for region in regions:
+        selected += int(region.contains(x, y).sum())
+    report('clipping', time.perf_counter() - start, x.size * len(regions))
+    return selected
+
+
+def bench_end_to_end(path, regions, workers, min_height, ground_tin):
+    start = time.perf_counter()
+    results = accumulate_regions_batched(path, regions, workers, HeightNormalizer(min_height, ground_tin=ground_tin))
+    points = sum(accumulator.count for accumulator, _ in results)
+    report('end-to-end', time.perf_counter() - start, points, workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=float, default=300.0, help='scene side in metres')
+    parser.add_argument('--density', type=float, default=20.0, help='points per m²')
+    parser.add_argument('--canopy-cover', type=float, default=0.7)
+    parser.add_argument('--plots', type=int, default=50, help='number of plot polygons')
+    parser.add_argument('--plot-size', type=float, default=30.0, help='plot side in metres')
+    parser.add_argument('--laz', action='store_true', help='write LAZ instead of LAS')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--min-height', type=float, default=None)
+    parser.add_argument('--ground-tin', action='store_true', help='normalize heights with a TIN of the ground points')
+    parser.add_argument('--output-dir', default=None, help='keep the generated files here')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix='tnccc-bench-')
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, 'synthetic.laz' if args.laz else 'synthetic.las')
+
+    start = time.perf_counter()
+    x, y, z, classification = generate_points(args.size, args.density, args.canopy_cover, seed=args.seed)
+    write_las(path, x, y, z, classification)
+    squares = plot_squares(args.size, args.plots, args.plot_size, seed=args.seed)
+    write_geojson(os.path.join(output_dir, 'plots.geojson'), squares)
+    regions = [PolygonRegion([square], args.plot_size ** 2) for square in squares]
+    print(f'Scene: {x.size:,} points, {args.plots} plots of {args.plot_size} m, '
+          f'generated in {time.perf_counter() - start:.1f} s -> {path}')
+
+    bench_metrics(path)
+    bench_clipping(x, y, regions)
+    del x, y, z, classification
+    bench_end_to_end(path, regions, args.workers, args.min_height, args.ground_tin)
+
+
+if __name__ == '__main__':
+    main()
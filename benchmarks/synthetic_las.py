@@ -0,0 +1,112 @@
+"""
+Synthetic LiDAR generator for the point cloud benchmarks.
+
+The scene is a flat-ish terrain with a forest canopy made of conical tree
+crowns. Point density, canopy cover and tree heights are controllable, and
+square plot polygons are scattered over the scene.
+"""
+
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import json
+import math
+
+import numpy as np
+import laspy # type: ignore
+
+
+def generate_points(size, density, canopy_cover=0.7, tree_height=(8.0, 35.0), ground_fraction=0.25, seed=0):
+    """Returns ``x, y, z, classification`` arrays for a ``size`` x ``size`` m scene.
+
+    ``density`` is in points per m². A share ``ground_fraction`` of the
+    returns hits the ground (class 2); the remaining ones fall inside tree
+    crowns where there is canopy, or on low vegetation elsewhere.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(size * size * density)
+    x = rng.uniform(0, size, n)
+    y = rng.uniform(0, size, n)
+    ground = 100.0 + 0.02 * x + 0.01 * y + 0.5 * np.sin(x / 40.0) * np.cos(y / 55.0)
+
+    # Copas cônicas: raio proporcional à altura, posições sorteadas até atingir a cobertura pedida
+    mean_height = sum(tree_height) / 2
+    crown_area = math.pi * (0.25 * mean_height) ** 2
+    tree_count = max(1, int(canopy_cover * size * size / crown_area))
+    tree_x = rng.uniform(0, size, tree_count)
+    tree_y = rng.uniform(0, size, tree_count)
+    tree_h = rng.uniform(tree_height[0], tree_height[1], tree_count)
+    cell = max(1.0, 0.5 * tree_height[1])
+    nearest_tree = _nearest_tree(x, y, tree_x, tree_y, cell)
+
+    dx = x - tree_x[nearest_tree]
+    dy = y - tree_y[nearest_tree]
+    distance = np.sqrt(dx * dx + dy * dy)
+    radius = 0.25 * tree_h[nearest_tree]
+    in_crown = distance < radius
+    crown_top = tree_h[nearest_tree] * (1 - distance / np.maximum(radius, 1e-6))
+
+    is_ground = rng.random(n) < ground_fraction
+    height = np.where(in_crown, crown_top * rng.uniform(0.6, 1.0, n), rng.uniform(0.0, 1.5, n))
+    height[is_ground] = 0.0
+    z = ground + height + rng.normal(0, 0.03, n)
+    classification = np.where(is_ground, 2, np.where(in_crown, 5, 3)).astype(np.uint8)
+    return x, y, z, classification
+
+
+def write_las(path, x, y, z, classification, epsg=31983):
+    header = laspy.LasHeader(point_format=6, version='1.4')
+    header.offsets = [float(np.floor(x.min())), float(np.floor(y.min())), float(np.floor(z.min()))]
+    header.scales = [0.001, 0.001, 0.001]
+    try:
+        from pyproj import CRS # type: ignore
+        header.add_crs(CRS.from_epsg(epsg))
+    except Exception:
+        pass
+    las = laspy.LasData(header)
+    las.x = x
+    las.y = y
+    las.z = z
+    las.classification = classification
+    las.write(path)
+
+
+def plot_squares(size, plots, plot_size, seed=0):
+    """``plots`` square plots of side ``plot_size`` spread over the scene, as ring lists."""
+    rng = np.random.default_rng(seed + 1)
+    margin = plot_size / 2
+    centers = rng.uniform(margin, size - margin, (plots, 2))
+    squares = []
+    for cx, cy in centers:
+        h = plot_size / 2
+        squares.append([(cx - h, cy - h), (cx + h, cy - h), (cx + h, cy + h), (cx - h, cy + h), (cx - h, cy - h)])
+    return squares
+
+
+def write_geojson(path, squares, epsg=31983):
+    features = [{
+        'type': 'Feature',
+        'properties': {'id': index},
+        'geometry': {'type': 'Polygon', 'coordinates': [[list(point) for point in square]]},
+    } for index, square in enumerate(squares)]
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({
+            'type': 'FeatureCollection',
+            'crs': {'type': 'name', 'properties': {'name': f'urn:ogc:def:crs:EPSG::{epsg}'}},
+            'features': features,
+        }, file)
+
+
+def _nearest_tree(x, y, tree_x, tree_y, cell):
+    # Árvore da mesma célula da grade (aproximação que evita uma matriz pontos x árvores)
+    cols = int(np.ceil((max(x.max(), tree_x.max()) + 1) / cell))
+    tree_cell = (tree_y // cell).astype(np.int64) * cols + (tree_x // cell).astype(np.int64)
+    order = np.argsort(tree_cell)
+    sorted_cells = tree_cell[order]
+    point_cell = (y // cell).astype(np.int64) * cols + (x // cell).astype(np.int64)
+    position = np.clip(np.searchsorted(sorted_cells, point_cell), 0, order.size - 1)
+    # Pontos em células sem árvore recebem uma árvore distante e ficam fora das copas
+    return order[position]
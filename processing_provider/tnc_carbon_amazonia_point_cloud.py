@@ -10,20 +10,58 @@ from qgis.core import (QgsProcessingAlgorithm, # type: ignore
                        QgsProcessingParameterVectorLayer,
                        QgsProcessingParameterPointCloudLayer,
                        QgsProcessingParameterNumber,
+                       QgsProcessingParameterRasterLayer,
+                       QgsProcessingParameterBoolean,
+                       QgsProcessingParameterFile,
                        QgsProcessingParameterFileDestination,
+                       QgsProcessingParameterRasterDestination,
+                       QgsProcessingParameterString,
+                       QgsProcessingParameterField,
                        QgsWkbTypes,
-                       QgsVectorLayer)
+                       QgsVectorLayer,
+                       QgsCoordinateTransform,
+                       QgsCoordinateReferenceSystem,
+                       QgsUnitTypes,
+                       QgsProcessingException,
+                       QgsProcessingUtils,
+                       NULL)
 
-import numpy as np
-from scipy import stats #type: ignore
+from osgeo import gdal # type: ignore
 import processing #type: ignore
 import csv
+import math
+
+from .tnc_carbon_point_cloud_metrics import StreamingHeightMetrics, acd_als
+from .tnc_carbon_point_cloud_io import DEFAULT_CHUNK_SIZE, PolygonRegion, can_stream, iter_las_chunks, laspy, union_bbox
+from .tnc_carbon_point_cloud_catalog import TileCatalog
+from .tnc_carbon_point_cloud_batch import accumulate_regions_batched
+from .tnc_carbon_point_cloud_index_cache import MembershipIndex, file_fingerprint, regions_fingerprint
+from .tnc_carbon_point_cloud_normalize import HeightNormalizer, ground_tiles
+from .tnc_carbon_point_cloud_decimation import DensityThinner
+from .tnc_carbon_point_cloud_octree import OctreeQuery, is_octree_source, octree_index
+from .tnc_carbon_point_cloud_grid import PointGrid, grid_strips, strip_rows_for, write_grid_raster
+from .tnc_carbon_table_outputs import parquet_available, rows_to_columns, write_geopackage, write_parquet
+from .tnc_carbon_zonal_results import ZONE_LAYER_NAME, zone_geometries, zone_keys
+from .tnc_carbon_run_registry import RunRegistry
 
 class TNC_Carbon_Amazonia_Point_Cloud(QgsProcessingAlgorithm):
     INPUT_POLYGON = 'INPUT_POLYGON'
     INPUT_CLOUD = 'INPUT_POINT_CLOUD'
+    INPUT_TILE_FOLDER = 'INPUT_TILE_FOLDER'
+    INPUT_DTM = 'INPUT_DTM'
+    INPUT_GROUND_TIN = 'INPUT_GROUND_TIN'
     INPUT_FILTER = 'INPUT_HEIGH_FILTER'
+    INPUT_WORKERS = 'INPUT_WORKERS'
+    INPUT_TARGET_DENSITY = 'INPUT_TARGET_DENSITY'
+    INPUT_INDEX_CACHE = 'INPUT_INDEX_CACHE'
+    INPUT_GRID_CELL_SIZE = 'INPUT_GRID_CELL_SIZE'
     OUTPUT = 'OUTPUT_CSV_PATH'
+    OUTPUT_GRID = 'OUTPUT_GRID'
+    OUTPUT_GPKG = 'OUTPUT_GPKG'
+    OUTPUT_PARQUET = 'OUTPUT_PARQUET'
+    INPUT_REGISTRY = 'INPUT_REGISTRY'
+    INPUT_REGISTRY_CAMPAIGN = 'INPUT_REGISTRY_CAMPAIGN'
+    INPUT_REGISTRY_KEY_FIELD = 'INPUT_REGISTRY_KEY_FIELD'
 
     METRIC_NAMES = {
         "ACD": "Densidade de Carbono",
@@ -35,6 +73,8 @@ class TNC_Carbon_Amazonia_Point_Cloud(QgsProcessingAlgorithm):
         "hiq": "Intervalo interquartil",
         "kh": "Curtose",
         "cnt": "Contagem de Pontos",
+        "cnt_orig": "Contagem original de pontos",
+        "dens": "Densidade efetiva (pts/m²)",
         "id": "ID"
     }
 
@@ -50,7 +90,30 @@ class TNC_Carbon_Amazonia_Point_Cloud(QgsProcessingAlgorithm):
         self.addParameter(
             QgsProcessingParameterPointCloudLayer(
                 self.INPUT_CLOUD,
-                'Camada Raster de Entrada Cloud Point'
+                'Camada Raster de Entrada Cloud Point',
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.INPUT_TILE_FOLDER,
+                'Pasta com tiles LAS/LAZ (usada no lugar da camada de nuvem de pontos)',
+                behavior=QgsProcessingParameterFile.Folder,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterRasterLayer(
+                self.INPUT_DTM,
+                'Modelo digital de terreno (DTM) para normalizar as alturas',
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.INPUT_GROUND_TIN,
+                'Normalizar as alturas com um TIN dos pontos de solo (classe 2) quando não houver DTM',
+                defaultValue=False
             )
         )
         self.addParameter(
@@ -62,6 +125,33 @@ class TNC_Carbon_Amazonia_Point_Cloud(QgsProcessingAlgorithm):
                 optional=True
             )
         )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.INPUT_TARGET_DENSITY,
+                'Densidade máxima para decimação (pts/m², 0 = sem decimação)',
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=0,
+                minValue=0,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.INPUT_WORKERS,
+                'Número de processos paralelos (1 = sequencial)',
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=1,
+                minValue=1,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.INPUT_INDEX_CACHE,
+                'Reutilizar o índice de pontos por polígono (grava um arquivo auxiliar ao lado da nuvem)',
+                defaultValue=False
+            )
+        )
         self.addParameter(
             QgsProcessingParameterFileDestination(
                 self.OUTPUT,
@@ -69,34 +159,178 @@ class TNC_Carbon_Amazonia_Point_Cloud(QgsProcessingAlgorithm):
                 'CSV files (*.csv)'
             )
         )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_GPKG,
+                'GeoPackage de saída com as métricas por polígono',
+                'GeoPackage files (*.gpkg)',
+                optional=True,
+                createByDefault=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_PARQUET,
+                'Arquivo GeoParquet de saída com as métricas por polígono',
+                'Parquet files (*.parquet)',
+                optional=True,
+                createByDefault=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.INPUT_REGISTRY,
+                'Registro de resultados (banco SQLite, criado se não existir)',
+                behavior=QgsProcessingParameterFile.File,
+                fileFilter='SQLite databases (*.sqlite *.db)',
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterString(
+                self.INPUT_REGISTRY_CAMPAIGN,
+                'Campanha (rótulo no registro de resultados)',
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.INPUT_REGISTRY_KEY_FIELD,
+                'Campo chave dos polígonos no registro (ex.: código do imóvel)',
+                parentLayerParameterName=self.INPUT_POLYGON,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.INPUT_GRID_CELL_SIZE,
+                'Tamanho da célula do raster de ACD (em unidades do SRC da nuvem, valor padrão = 20)',
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=20.0,
+                minValue=0.1,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterRasterDestination(
+                self.OUTPUT_GRID,
+                'Raster de densidade de carbono (ACD e desvio padrão por célula)',
+                optional=True,
+                createByDefault=False
+            )
+        )
 
     def processAlgorithm(self, parameters, context, feedback):
         # Receber camada de núvem de pontos, camada shapefile, e caminho para a saída do CSV
         cloud_layer = self.parameterAsPointCloudLayer(parameters, self.INPUT_CLOUD, context)
         polygon_layer = self.parameterAsVectorLayer(parameters, self.INPUT_POLYGON, context)
         csv_path = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
+        workers = self.parameterAsInt(parameters, self.INPUT_WORKERS, context)
+        gpkg_path = self.parameterAsFileOutput(parameters, self.OUTPUT_GPKG, context)
+        parquet_path = self.parameterAsFileOutput(parameters, self.OUTPUT_PARQUET, context)
+        if parquet_path and not parquet_available():
+            raise QgsProcessingException('A saída Parquet requer o pacote pyarrow')
+        catalog = self.tile_catalog(parameters, context, feedback)
+        if cloud_layer is None and catalog is None:
+            raise QgsProcessingException('Informe uma camada de nuvem de pontos ou uma pasta de tiles LAS/LAZ')
+        cloud_crs = self.cloud_crs(cloud_layer, catalog, polygon_layer, feedback)
+        normalizer = self.height_normalizer(parameters, cloud_crs, context, feedback)
+        target_density = self.parameterAsDouble(parameters, self.INPUT_TARGET_DENSITY, context) or None
+        unit_area = self.square_meters_per_unit(cloud_crs, self.cloud_bbox(cloud_layer, catalog))
+        if target_density:
+            feedback.pushInfo(f'Decimando a nuvem para no máximo {target_density} pts/m² antes do cálculo das métricas')
 
         results = []
+        # ID de feição do QGIS de cada linha, para registrar e juntar geometrias sem depender da ordem de iteração
+        fids = []
+        # A octree só é usada para COPC/EPT ou quando não há leitura direta: para LAS/LAZ locais o QGIS também
+        # monta uma octree, mas a leitura direta respeita os processos e o índice por polígono
+        octree = None
+        if polygon_layer is not None and catalog is None \
+                and (is_octree_source(cloud_layer) or not can_stream(cloud_layer.source())):
+            octree = octree_index(cloud_layer)
         
         if polygon_layer is None:
             # Caso não haja camada de polígonos, processar todos os pontos
             feedback.pushInfo('Shapefile não identificado. Aplicando equação à todos os pontos na camada...')
-            valid_points = cloud_layer
+            valid_points = catalog if catalog is not None else cloud_layer
+            bbox = self.cloud_bbox(cloud_layer, catalog)
+            area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
             metrics = {self.METRIC_NAMES['id']: -1}
-            metrics |= self.apply_equation(valid_points, context, feedback)
+            metrics |= self.apply_equation(valid_points, normalizer, context, feedback,
+                                           DensityThinner(target_density, bbox, unit_area), area)
             results.append(metrics)
+            fids.append(-1)
+        elif catalog is not None:
+            # Catálogo de tiles: para cada lote de polígonos só os tiles que o intersectam são abertos
+            total = polygon_layer.featureCount()
+            feedback.pushInfo(f'{total} polígono(s) identificado(s). Processando {len(catalog.tiles)} tile(s) com {workers} processo(s)...')
+            fids, ids, _, regions = self.polygon_regions(polygon_layer, cloud_crs, context)
+            region_results = accumulate_regions_batched(catalog, regions, workers, normalizer, target_density, feedback,
+                                                        unit_area=unit_area)
+            if region_results is None:
+                return {}
+            for feature_id, region, (accumulator, thinner) in zip(ids, regions, region_results):
+                metrics = {self.METRIC_NAMES['id']: feature_id}
+                metrics |= self.metrics_row(accumulator, feedback, thinner, region.area)
+                results.append(metrics)
+        elif octree is not None:
+            # Nuvem indexada (COPC/EPT): cada polígono lê apenas os nós da octree que o intersectam
+            total = polygon_layer.featureCount()
+            feedback.pushInfo(f'{total} polígono(s) identificado(s). Consultando a octree da nuvem...')
+            if workers > 1 or self.parameterAsBoolean(parameters, self.INPUT_INDEX_CACHE, context):
+                feedback.pushInfo('A octree é consultada polígono a polígono; processos e índice por polígono não se aplicam')
+            query = OctreeQuery(octree)
+            fids, ids, geometries, regions = self.polygon_regions(polygon_layer, cloud_crs, context)
+            if normalizer.needs_ground_pass:
+                # Um só TIN para todos os polígonos, com o solo ao redor das bordas e não só o recortado em cada um
+                normalizer.prepare(query.iter_ground_chunks(ground_tiles([region.bbox for region in regions])))
+            for current, (feature_id, geometry, region) in enumerate(zip(ids, geometries, regions), 1):
+                if feedback.isCanceled():
+                    return {}
+                thinner = DensityThinner(target_density, region.bbox, unit_area)
+                accumulator = self.accumulate_chunks(lambda: query.iter_chunks(geometry, region),
+                                                     normalizer, thinner, feedback)
+                metrics = {self.METRIC_NAMES['id']: feature_id}
+                metrics |= self.metrics_row(accumulator, feedback, thinner, region.area)
+                results.append(metrics)
+                feedback.setProgress(100 * current / max(total, 1))
+        elif can_stream(cloud_layer.source()):
+            # Leitura direta: os polígonos são agrupados espacialmente e, se pedido, distribuídos entre processos
+            total = polygon_layer.featureCount()
+            feedback.pushInfo(f'{total} polígono(s) identificado(s). Processando com {workers} processo(s)...')
+            fids, ids, _, regions = self.polygon_regions(polygon_layer, cloud_crs, context)
+            index = None
+            if self.parameterAsBoolean(parameters, self.INPUT_INDEX_CACHE, context):
+                index = MembershipIndex(cloud_layer.source(), file_fingerprint(cloud_layer.source()),
+                                        regions_fingerprint(fids, regions))
+                if index.is_valid():
+                    feedback.pushInfo(f'Reutilizando o índice de pontos por polígono em "{index.path}"')
+                else:
+                    feedback.pushInfo(f'Criando o índice de pontos por polígono em "{index.path}"')
+            region_results = accumulate_regions_batched(cloud_layer.source(), regions, workers, normalizer,
+                                                        target_density, feedback, index=index, unit_area=unit_area)
+            if region_results is None:
+                return {}
+            for feature_id, region, (accumulator, thinner) in zip(ids, regions, region_results):
+                metrics = {self.METRIC_NAMES['id']: feature_id}
+                metrics |= self.metrics_row(accumulator, feedback, thinner, region.area)
+                results.append(metrics)
         else:
+            if workers > 1:
+                feedback.pushWarning('Modo paralelo requer o pacote laspy e uma nuvem LAS/LAZ. Processando sequencialmente...')
             # Caso contrário, processar cada polígono individualmente
             total = polygon_layer.featureCount()
             feedback.pushInfo(f'{total} polígono(s) identificado(s).')
+            if normalizer.needs_ground_pass:
+                # TIN montado uma vez com o solo da nuvem ao redor dos polígonos, não com os pontos de cada recorte
+                _, _, _, regions = self.polygon_regions(polygon_layer, cloud_crs, context)
+                normalizer.prepare(self.point_chunks(cloud_layer, context, feedback)(), union_bbox(regions))
             current = 0
             for f in polygon_layer.getFeatures():
                 current += 1
-                metrics = {}
-                if 'id' in f.fields().names():
-                    metrics[self.METRIC_NAMES['id']] = f['id']
-                else:
-                    metrics[self.METRIC_NAMES['id']] = f.id()
+                metrics = {self.METRIC_NAMES['id']: self.feature_id(f)}
+                fids.append(f.id())
                 feedback.pushInfo(f'Processando pontos no polígono {f.id()} ({current}/{total})')
                 # Cria camada de polígono temporária do formato do polígono atual
                 current_polygon = self.create_temp_polygon_layer(polygon_layer, cloud_layer, f, context, feedback)
@@ -109,8 +343,12 @@ class TNC_Carbon_Amazonia_Point_Cloud(QgsProcessingAlgorithm):
                     'OUTPUT': 'TEMPORARY_OUTPUT'
                 }, context=context, feedback=feedback, is_child_algorithm=False)
                 valid_points = clip_result['OUTPUT']
+                extent = current_polygon.extent()
+                bbox = (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum())
+                area = sum(feature.geometry().area() for feature in current_polygon.getFeatures())
                 # Aplica a equação sobre os pontos dentro do polígono temporário
-                metrics |= self.apply_equation(valid_points, context, feedback)
+                metrics |= self.apply_equation(valid_points, normalizer, context, feedback,
+                                               DensityThinner(target_density, bbox, unit_area), area)
                 results.append(metrics)
 
         feedback.pushInfo(f'Processamento finalizado, criando arquivo csv com o resultado em "{csv_path}"')
@@ -121,7 +359,177 @@ class TNC_Carbon_Amazonia_Point_Cloud(QgsProcessingAlgorithm):
             for row in results:
                 writer.writerow(row)
 
-        return {}
+        registry_path = self.parameterAsFile(parameters, self.INPUT_REGISTRY, context)
+        if registry_path:
+            run_id = self.record_run(parameters, registry_path, results, fids, cloud_layer, polygon_layer, context)
+            feedback.pushInfo(f'Execução {run_id} registrada em "{registry_path}"')
+
+        outputs = {self.OUTPUT: csv_path}
+        if gpkg_path or parquet_path:
+            self.write_tables(results, fids, polygon_layer, gpkg_path, parquet_path)
+            if gpkg_path:
+                outputs[self.OUTPUT_GPKG] = gpkg_path
+            if parquet_path:
+                outputs[self.OUTPUT_PARQUET] = parquet_path
+        grid_path = self.parameterAsOutputLayer(parameters, self.OUTPUT_GRID, context)
+        if grid_path:
+            # Parâmetro opcional: vazio volta ao padrão em vez de dividir por zero
+            cell_size = self.parameterAsDouble(parameters, self.INPUT_GRID_CELL_SIZE, context) or 20.0
+            points = catalog if catalog is not None else cloud_layer
+            self.process_grid(points, self.cloud_bbox(cloud_layer, catalog), cloud_crs, normalizer, target_density,
+                              unit_area, cell_size, grid_path, context, feedback)
+            if feedback.isCanceled():
+                return {}
+            outputs[self.OUTPUT_GRID] = grid_path
+
+        return outputs
+
+    def record_run(self, parameters, registry_path, results, fids, cloud_layer, polygon_layer, context):
+        # zone_id é o ID de feição do QGIS (único e nunca nulo); zone_key guarda o campo escolhido ou o atributo 'id'
+        key_field = self.parameterAsString(parameters, self.INPUT_REGISTRY_KEY_FIELD, context) or None
+        keys = [None] * len(results)
+        if polygon_layer is not None and key_field:
+            keys = zone_keys(polygon_layer, np.array(fids, dtype=np.int64), key_field)
+        elif polygon_layer is not None:
+            keys = [None if row[self.METRIC_NAMES['id']] == NULL else row[self.METRIC_NAMES['id']] for row in results]
+        dtm_layer = self.parameterAsRasterLayer(parameters, self.INPUT_DTM, context)
+        inputs = {
+            self.INPUT_CLOUD: cloud_layer.source() if cloud_layer is not None else None,
+            self.INPUT_TILE_FOLDER: self.parameterAsFile(parameters, self.INPUT_TILE_FOLDER, context) or None,
+            self.INPUT_POLYGON: polygon_layer.source() if polygon_layer is not None else None,
+            self.INPUT_DTM: dtm_layer.source() if dtm_layer is not None else None,
+        }
+        fixed = (self.METRIC_NAMES['id'], self.METRIC_NAMES['ACD'], self.METRIC_NAMES['cnt'])
+        rows = []
+        for row, fid, key in zip(results, fids, keys):
+            # A equação ALS fornece ACD em kg C/m² (1 kg/m² = 10 ton/ha)
+            acd = row[self.METRIC_NAMES['ACD']]
+            metrics = {name: value for name, value in row.items() if name not in fixed}
+            rows.append((fid, key, row[self.METRIC_NAMES['cnt']],
+                         None if acd is None else acd * 10, acd, None, None, metrics))
+        campaign = self.parameterAsString(parameters, self.INPUT_REGISTRY_CAMPAIGN, context) or None
+        with RunRegistry(registry_path) as registry:
+            return registry.record_run(self.name(), self.groupId(), parameters, inputs, rows, campaign)
+
+    def write_tables(self, results, fids, polygon_layer, gpkg_path, parquet_path):
+        # Mesmas colunas do CSV, com a geometria original de cada polígono, buscada pelo ID de feição
+        columns = rows_to_columns(results)
+        geometries = crs_wkt = None
+        if polygon_layer is not None:
+            geometries = zone_geometries(polygon_layer, np.array(fids, dtype=np.int64))
+            crs_wkt = polygon_layer.crs().toWkt()
+        if gpkg_path:
+            write_geopackage(gpkg_path, ZONE_LAYER_NAME, columns, geometries, crs_wkt)
+        if parquet_path:
+            write_parquet(parquet_path, columns, geometries, crs_wkt)
+
+    def process_grid(self, points, bbox, cloud_crs, normalizer, target_density, unit_area, cell_size, grid_path, context,
+                     feedback):
+        # Raster contínuo: métricas e ACD por célula, calculadas de forma vetorizada, uma faixa de linhas por vez
+        grid = PointGrid(bbox[0], bbox[1], bbox[2], bbox[3], cell_size)
+        point_count = points.point_count if isinstance(points, TileCatalog) else points.pointCount()
+        strip_rows = strip_rows_for(grid, point_count)
+        feedback.pushInfo(f'Calculando raster de ACD com {grid.cols} x {grid.rows} células de {cell_size} '
+                          f'em faixas de {strip_rows} linha(s)')
+        chunks = self.point_chunks(points, context, feedback)
+        if normalizer.needs_ground_pass:
+            normalizer.prepare(chunks())
+        thinner = DensityThinner(target_density, bbox, unit_area)
+        strips = grid_strips(chunks, normalizer, grid, thinner, strip_rows, feedback)
+        write_grid_raster(grid_path, grid, strips, [('ACD', 'ACD'), ('sigma', 'sgm')], cloud_crs.toWkt())
+
+    def tile_catalog(self, parameters, context, feedback):
+        folder = self.parameterAsFile(parameters, self.INPUT_TILE_FOLDER, context)
+        if not folder:
+            return None
+        if laspy is None:
+            raise QgsProcessingException('A leitura de pastas de tiles requer o pacote laspy')
+        catalog = TileCatalog.open(folder)
+        if not catalog.tiles:
+            raise QgsProcessingException(f'Nenhum arquivo LAS/LAZ encontrado em "{folder}"')
+        feedback.pushInfo(f'{len(catalog.tiles)} tile(s) e {catalog.point_count} ponto(s) no catálogo "{folder}"')
+        return catalog
+
+    def cloud_crs(self, cloud_layer, catalog, polygon_layer, feedback):
+        if catalog is None:
+            return cloud_layer.crs()
+        if catalog.crs_wkt:
+            return QgsCoordinateReferenceSystem.fromWkt(catalog.crs_wkt)
+        if polygon_layer is not None:
+            feedback.pushWarning('Os tiles não informam o SRC; assumindo o SRC da camada de polígonos')
+            return polygon_layer.crs()
+        return QgsCoordinateReferenceSystem()
+
+    def cloud_bbox(self, cloud_layer, catalog):
+        if catalog is not None:
+            return catalog.extent
+        extent = cloud_layer.extent()
+        return (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum())
+
+    def square_meters_per_unit(self, crs, bbox):
+        # Área de uma unidade quadrada do SRC: a decimação trabalha em pts/m² mesmo em pés ou graus
+        if crs.isGeographic():
+            latitude = math.radians((bbox[1] + bbox[3]) / 2)
+            return 111320.0 * 110574.0 * max(math.cos(latitude), 1e-6)
+        factor = QgsUnitTypes.fromUnitToUnitFactor(crs.mapUnits(), QgsUnitTypes.DistanceMeters)
+        return factor * factor if factor > 0 else 1.0
+
+    def height_normalizer(self, parameters, cloud_crs, context, feedback):
+        # Alturas acima do solo: DTM amostrado em cada ponto, TIN dos pontos de solo ou elevação bruta
+        dtm_layer = self.parameterAsRasterLayer(parameters, self.INPUT_DTM, context)
+        ground_tin = self.parameterAsBoolean(parameters, self.INPUT_GROUND_TIN, context)
+        min_height = None
+        if parameters.get(self.INPUT_FILTER) is not None:
+            min_height = self.parameterAsDouble(parameters, self.INPUT_FILTER, context)
+
+        dtm_path = None
+        if dtm_layer is not None:
+            dtm_path = dtm_layer.source()
+            if dtm_layer.crs() != cloud_crs:
+                dtm_path = self.reproject_dtm(dtm_layer, cloud_crs, feedback)
+            feedback.pushInfo('Normalizando alturas com o DTM')
+        elif ground_tin:
+            feedback.pushInfo('Normalizando alturas com o TIN dos pontos de solo')
+        else:
+            feedback.pushInfo('Nenhum DTM informado: usando as elevações da nuvem como alturas')
+        if min_height is not None:
+            feedback.pushInfo(f'Descartando pontos abaixo de {min_height} m')
+        return HeightNormalizer(min_height, dtm_path, ground_tin)
+
+    def reproject_dtm(self, dtm_layer, cloud_crs, feedback):
+        # VRT reprojetado: o DTM é lido sob demanda no SRC da nuvem, sem gravar um raster novo
+        if not cloud_crs.isValid():
+            raise QgsProcessingException('O SRC do DTM é diferente do SRC da nuvem, que não é conhecido: informe um DTM no SRC da nuvem')
+        feedback.pushInfo(f'Reprojetando o DTM de {dtm_layer.crs().authid()} para {cloud_crs.authid()}')
+        vrt_path = QgsProcessingUtils.generateTempFilename('dtm_reprojected.vrt')
+        dataset = gdal.Warp(vrt_path, dtm_layer.source(), format='VRT', dstSRS=cloud_crs.toWkt(), resampleAlg='bilinear')
+        if dataset is None:
+            raise QgsProcessingException(f'Não foi possível reprojetar o DTM "{dtm_layer.source()}"')
+        dataset = None
+        return vrt_path
+
+    def feature_id(self, feature):
+        if 'id' in feature.fields().names():
+            return feature['id']
+        return feature.id()
+
+    def polygon_regions(self, polygon_layer, cloud_crs, context):
+        # Converte os polígonos para o SRC da nuvem, em estruturas que podem ser enviadas aos processos
+        transform = QgsCoordinateTransform(polygon_layer.crs(), cloud_crs, context.transformContext())
+        fids = []
+        ids = []
+        geometries = []
+        regions = []
+        for f in polygon_layer.getFeatures():
+            geometry = f.geometry()
+            geometry.transform(transform)
+            parts = geometry.asMultiPolygon() if geometry.isMultipart() else [geometry.asPolygon()]
+            rings = [[(p.x(), p.y()) for p in ring] for part in parts for ring in part]
+            fids.append(f.id())
+            ids.append(self.feature_id(f))
+            geometries.append(geometry)
+            regions.append(PolygonRegion(rings, geometry.area()))
+        return fids, ids, geometries, regions
 
     def create_temp_polygon_layer(self, polygon_layer, cloud_layer, feature, context, feedback):
         temp_layer = QgsVectorLayer("Polygon?crs={}".format(polygon_layer.crs().authid()), "temp", "memory")
@@ -139,24 +547,85 @@ class TNC_Carbon_Amazonia_Point_Cloud(QgsProcessingAlgorithm):
         
         return reprojection_result['OUTPUT']
     
-    def apply_equation(self, points, context, feedback):
+    def apply_equation(self, points, normalizer, context, feedback, thinner=None, area=None):
+        thinner = thinner or DensityThinner()
+        chunks = self.point_chunks(points, context, feedback)
+        accumulator = self.accumulate_chunks(chunks, normalizer, thinner, feedback)
+        return self.metrics_row(accumulator, feedback, thinner, area)
+
+    def accumulate_chunks(self, chunks, normalizer, thinner, feedback):
+        # As alturas são lidas em blocos e acumuladas, sem manter todos os pontos em memória
+        accumulator = StreamingHeightMetrics()
+        if not normalizer.is_prepared:
+            normalizer.prepare(chunks())
+        if thinner.needs_count_pass:
+            # Primeira passada da decimação: pontos por célula, já sem os que o filtro de altura descarta
+            for chunk in chunks():
+                if feedback.isCanceled():
+                    return accumulator
+                valid = np.isfinite(normalizer.normalize(chunk))
+                thinner.count(chunk['x'][valid], chunk['y'][valid])
+        for chunk in chunks():
+            if feedback.isCanceled():
+                break
+            heights = normalizer.normalize(chunk)
+            valid = np.flatnonzero(np.isfinite(heights))
+            keep = thinner.thin(chunk['x'][valid], chunk['y'][valid], chunk['z'][valid])
+            accumulator.update(heights[valid[keep]])
+        return accumulator
+
+    def point_chunks(self, points, context, feedback):
+        # Retorna uma função que percorre os pontos em blocos (pode ser chamada mais de uma vez)
+        if isinstance(points, TileCatalog):
+            return lambda: points.iter_chunks()
+        source = points.source() if hasattr(points, 'source') else points
+        if can_stream(source):
+            return lambda: iter_las_chunks(source)
+        # Caminho alternativo (sem laspy): exporta os pontos uma única vez com o PDAL
+        exported = self.export_points(points, context, feedback)
+        return lambda: self.iter_exported_chunks(exported)
+
+    def export_points(self, points, context, feedback):
         point_geopackage = processing.run("pdal:exportvector", {
             'INPUT': points,
             'OUTPUT': 'TEMPORARY_OUTPUT'
         }, context=context, feedback=feedback)
-            
-        z_extract = processing.run("native:extractzvalues", {
-            'INPUT': point_geopackage['OUTPUT'],
-            'SUMMARIES': [0],
-            'COLUMN_PREFIX': 'z_',
-            'OUTPUT': 'TEMPORARY_OUTPUT'
-        }, context=context, feedback=feedback)
+        return QgsVectorLayer(point_geopackage['OUTPUT'], 'points', 'ogr')
+
+    def iter_exported_chunks(self, point_layer):
+        has_class = 'Classification' in point_layer.fields().names()
+        buffer = np.empty((4, DEFAULT_CHUNK_SIZE), dtype=np.float64)
+        filled = 0
+        for f in point_layer.getFeatures():
+            point = f.geometry().constGet()
+            buffer[0, filled] = point.x()
+            buffer[1, filled] = point.y()
+            buffer[2, filled] = point.z()
+            buffer[3, filled] = f['Classification'] if has_class else 0
+            filled += 1
+            if filled == DEFAULT_CHUNK_SIZE:
+                yield self.chunk_from_buffer(buffer, filled)
+                filled = 0
+        if filled:
+            yield self.chunk_from_buffer(buffer, filled)
+
+    def chunk_from_buffer(self, buffer, size):
+        return {
+            'x': buffer[0, :size].copy(),
+            'y': buffer[1, :size].copy(),
+            'z': buffer[2, :size].copy(),
+            'classification': buffer[3, :size].astype(np.uint8),
+        }
+
+    def metrics_row(self, accumulator, feedback, thinner=None, area=None):
+        metrics = accumulator.metrics()
+        density = {
+            self.METRIC_NAMES["cnt_orig"]: thinner.original_count if thinner is not None else None,
+            self.METRIC_NAMES["dens"]: thinner.effective_density(area) if thinner is not None else None,
+        }
 
-        # Alturas de todos os pontos individualmente
-        valid_heights = [f['z_first'] for f in z_extract['OUTPUT'].getFeatures()]
-        
         # Caso vazio retornar nulo
-        if len(valid_heights) == 0:
+        if metrics is None:
             feedback.pushWarning('Nenhum ponto encontrado no polígono')
             return {
             self.METRIC_NAMES["ACD"]: None,
@@ -168,34 +637,32 @@ class TNC_Carbon_Amazonia_Point_Cloud(QgsProcessingAlgorithm):
             self.METRIC_NAMES["hiq"]: None,
             self.METRIC_NAMES["kh"]: None,
             self.METRIC_NAMES["cnt"]: 0
-        }
+        } | density
 
-        hm = float(np.mean(valid_heights)) # média
-        h5 = float(np.percentile(valid_heights, 5)) # percentil 5
-        h10 = float(np.percentile(valid_heights, 10)) # percentil 10
-        h100 = float(np.max(valid_heights)) # percentil 100 (ou valor máximo)
-        h25 = float(np.percentile(valid_heights, 25))  # quartil 1
-        h75 = float(np.percentile(valid_heights, 75))  # quartil 3
-        hiq = float(h75 - h25)  # interquartil
-        kh = abs(float(stats.kurtosis(valid_heights))) # curtose (!!! Valores não batem com os valores do programa do joão !!!)
+        hm = metrics['hm'] # média
+        h5 = metrics['h5'] # percentil 5
+        h10 = metrics['h10'] # percentil 10
+        h100 = metrics['h100'] # percentil 100 (ou valor máximo)
+        hiq = metrics['hiq'] # interquartil
+        kh = metrics['kh'] if metrics['kh'] is not None else float('nan') # curtose (!!! Valores não batem com os valores do programa do joão !!!)
+        cnt = metrics['cnt']
 
-        feedback.pushInfo(f"hm: {hm}, h5: {h5}, h10: {h10}, h100: {h100}, hiq: {hiq}, kh: {kh}, cnt: {len(valid_heights)}")
+        feedback.pushInfo(f"hm: {hm}, h5: {h5}, h10: {h10}, h100: {h100}, hiq: {hiq}, kh: {kh}, cnt: {cnt}")
 
         # Equação
-        ACD_ALS = 0.2 * (hm ** 2.02) * (kh ** 0.66) * (h5 ** 0.11) * (h10 ** -0.32) * (hiq ** 0.5) * (h100 ** -0.82)
-        sigma = 0.66 * (ACD_ALS ** 0.71) # Desvio padrão
+        ACD_ALS, sigma = acd_als(hm, kh, h5, h10, hiq, h100)
 
         return {
-            self.METRIC_NAMES["ACD"]: ACD_ALS,
-            self.METRIC_NAMES["sgm"]: sigma,
+            self.METRIC_NAMES["ACD"]: float(ACD_ALS),
+            self.METRIC_NAMES["sgm"]: float(sigma),
             self.METRIC_NAMES["hm"]: hm,
             self.METRIC_NAMES["h5"]: h5,
             self.METRIC_NAMES["h10"]: h10,
             self.METRIC_NAMES["h100"]: h100,
             self.METRIC_NAMES["hiq"]: hiq,
             self.METRIC_NAMES["kh"]: kh,
-            self.METRIC_NAMES["cnt"]: len(valid_heights)
-        }
+            self.METRIC_NAMES["cnt"]: cnt
+        } | density
 
     def name(self):
         return 'amazonpointcloud'
@@ -44,6 +44,11 @@ from .tnc_carbon_atlantic_dtm_dsm import TNC_Carbon_Atlantic_DTM_DSM
 from .tnc_carbon_global_chm import TNC_Carbon_Global_CHM
 from .tnc_carbon_global_dtm_dsm import TNC_Carbon_Global_DTM_DSM
 
+from .tnc_carbon_multi_epoch import TNC_Carbon_Multi_Epoch
+from .tnc_carbon_threshold_sweep import TNC_Carbon_Threshold_Sweep
+from .tnc_carbon_dask import TNC_Carbon_Dask
+from .tnc_carbon_user_models import TNC_Carbon_User_Model_CHM, TNC_Carbon_User_Model_DTM_DSM, load_user_models
+
 
 class CarbonCalculatorProvider(QgsProcessingProvider):
 
@@ -65,7 +70,7 @@ class CarbonCalculatorProvider(QgsProcessingProvider):
         Loads all algorithms belonging to this provider.
         """
         self.addAlgorithm(TNC_Carbon_Amazonia_CHM())
-        #self.addAlgorithm(TNC_Carbon_Amazonia_Point_Cloud())
+        self.addAlgorithm(TNC_Carbon_Amazonia_Point_Cloud())
         self.addAlgorithm(TNC_Carbon_Amazonia_DTM_DSM())
         self.addAlgorithm(TNC_Carbon_Cerrado_CHM())
         self.addAlgorithm(TNC_Carbon_Cerrado_DTM_DSM())
@@ -73,6 +78,17 @@ class CarbonCalculatorProvider(QgsProcessingProvider):
         self.addAlgorithm(TNC_Carbon_Atlantic_DTM_DSM())
         self.addAlgorithm(TNC_Carbon_Global_CHM())
         self.addAlgorithm(TNC_Carbon_Global_DTM_DSM())
+        for biome_algorithm in (TNC_Carbon_Amazonia_CHM, TNC_Carbon_Cerrado_CHM, TNC_Carbon_Atlantic_CHM,
+                                TNC_Carbon_Global_CHM):
+            self.addAlgorithm(TNC_Carbon_Multi_Epoch(biome_algorithm))
+            self.addAlgorithm(TNC_Carbon_Threshold_Sweep(biome_algorithm))
+            self.addAlgorithm(TNC_Carbon_Dask(biome_algorithm))
+        # Modelos declarados nos registros do usuário, relidos a cada recarga do provedor
+        for model in load_user_models():
+            if 'chm' in model.algorithms:
+                self.addAlgorithm(TNC_Carbon_User_Model_CHM(model))
+            if 'dtm_dsm' in model.algorithms:
+                self.addAlgorithm(TNC_Carbon_User_Model_DTM_DSM(model))
         
 
 
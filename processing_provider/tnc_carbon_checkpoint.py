@@ -0,0 +1,181 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import hashlib
+import os
+import time
+
+import numpy as np
+from osgeo import gdal # type: ignore
+
+from qgis.core import QgsProcessingUtils # type: ignore
+
+from .tnc_carbon_run_registry import input_fingerprint
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_SUFFIX = '.tnccc-checkpoint.npz'
+# Intervalo mínimo entre duas gravações do diário
+DEFAULT_CHECKPOINT_SECONDS = 30.0
+# Parâmetros que só mudam como a execução roda, não o resultado
+EXECUTION_PARAMETERS = ('INPUT_CHECKPOINT', 'INPUT_MEMORY_BUDGET')
+
+
+class RasterCheckpoint:
+    """Journal of the rows completed by each pass and of the accumulators at that point.
+
+    Windows are written in order, so the progress of a pass is just the
+    number of rows done. ``update`` runs in the writer thread after each
+    window and rewrites the journal at most every ``interval`` seconds; the
+    ``state`` callable it receives is only called then, and must leave every
+    row it counts on disk (flush the output raster) before returning the
+    accumulators. ``outputs`` are synced to disk before each journal write.
+
+    The journal is a compressed ``.npz`` replaced atomically, holding the
+    run signature, the passes in order, and per pass ``<pass>/done`` and its
+    ``<pass>/<name>`` arrays. It is ignored when the signature differs, and
+    recording a pass drops the passes after it, since they depend on it.
+    """
+
+    def __init__(self, path, signature, outputs=(), interval=DEFAULT_CHECKPOINT_SECONDS):
+        self.path = path
+        self.signature = signature
+        self.outputs = [output for output in outputs if output]
+        self.interval = interval
+        self.passes = {}
+        self._written_at = time.monotonic()
+        self._load()
+
+    def _load(self):
+        try:
+            with np.load(self.path, allow_pickle=False) as journal:
+                if int(journal['version']) != CHECKPOINT_VERSION or str(journal['signature']) != self.signature:
+                    return
+                for name in journal['passes'].tolist():
+                    prefix = f'{name}/'
+                    state = {key[len(prefix):]: journal[key] for key in journal.files
+                             if key.startswith(prefix) and key != f'{name}/done'}
+                    self.passes[name] = (int(journal[f'{name}/done']), state)
+        except (OSError, ValueError, KeyError):
+            # Diário ausente ou corrompido: a execução começa do zero
+            self.passes = {}
+
+    def resume(self, name, accumulators=()):
+        """``(rows_done, state)`` recorded for the pass ``name``; ``(0, None)`` when it starts over.
+
+        The pass also starts over when its state lacks the arrays of one of
+        the ``accumulators`` (objects with ``state()``), e.g. an output the
+        interrupted run did not ask for: it cannot be restored.
+        """
+        done, state = self.passes.get(name, (0, None))
+        if state is not None:
+            missing = [key for accumulator in accumulators if accumulator is not None
+                       for key in accumulator.state() if key not in state]
+            if missing:
+                self.discard(name)
+                return 0, None
+        return done, state
+
+    def discard(self, name):
+        """Forgets the pass ``name`` and the passes after it (e.g. when its output raster is gone)."""
+        names = list(self.passes)
+        if name in names:
+            for later in names[names.index(name):]:
+                del self.passes[later]
+
+    def update(self, name, done, state, force=False):
+        """Records that the first ``done`` rows of the pass ``name`` are complete.
+
+        The journal is written when ``force`` is set or ``interval`` seconds
+        have passed since the last write; ``state()`` returns the arrays of
+        the accumulators.
+        """
+        if not force and time.monotonic() - self._written_at < self.interval:
+            return
+        names = list(self.passes)
+        if name in names:
+            for later in names[names.index(name) + 1:]:
+                del self.passes[later]
+        self.passes[name] = (done, state())
+        self._write()
+
+    def _write(self):
+        for output in self.outputs:
+            _sync(output)
+        arrays = {'version': CHECKPOINT_VERSION, 'signature': self.signature, 'passes': np.array(list(self.passes))}
+        for name, (done, state) in self.passes.items():
+            arrays[f'{name}/done'] = done
+            arrays.update((f'{name}/{key}', value) for key, value in state.items())
+        # Grava em um arquivo temporário e troca no final, para nunca deixar um diário pela metade
+        staging = self.path + '.tmp'
+        with open(staging, 'wb') as file:
+            np.savez_compressed(file, **arrays)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(staging, self.path)
+        self._written_at = time.monotonic()
+
+    def remove(self):
+        """Deletes the journal once every output is complete."""
+        for path in (self.path, self.path + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def run_signature(algorithm, parameters, context, output_path):
+    """Hash of the algorithm, its input parameters, the fingerprints of its input layers and the output raster path.
+
+    Output parameters are left out (except the raster written in place), so
+    a rerun with new temporary tables still resumes, and so are the
+    ``EXECUTION_PARAMETERS``.
+    """
+    digest = hashlib.sha1(algorithm.id().encode('utf-8'))
+    digest.update(os.path.abspath(output_path).encode('utf-8'))
+    # Modelos do registro podem mudar sem mudar o ID do algoritmo
+    digest.update(repr(getattr(algorithm, 'MODEL_EQUATION', None)).encode('utf-8'))
+    for definition in algorithm.parameterDefinitions():
+        name = definition.name()
+        if definition.isDestination() or name in EXECUTION_PARAMETERS:
+            continue
+        if definition.type() in ('raster', 'vector', 'source'):
+            layer = algorithm.parameterAsLayer(parameters, name, context)
+            source = layer.source() if layer is not None else ''
+            value = f'{source}:{input_fingerprint(source)}'
+        else:
+            value = algorithm.parameterAsString(parameters, name, context)
+        digest.update(f'|{name}={value}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def open_checkpoint(algorithm, parameters, context, output_path, feedback):
+    """Journal next to ``output_path`` for this run, reporting what is resumed."""
+    checkpoint = RasterCheckpoint(output_path + CHECKPOINT_SUFFIX,
+                                  run_signature(algorithm, parameters, context, output_path), [output_path])
+    if os.path.abspath(output_path).startswith(os.path.abspath(QgsProcessingUtils.tempFolder())):
+        feedback.pushWarning("A saída temporária muda a cada execução: escolha um arquivo de saída para poder retomar")
+    for name, (done, _) in checkpoint.passes.items():
+        feedback.pushInfo(f"Retomando a passada '{name}' após {done} linhas concluídas ({checkpoint.path})")
+    return checkpoint
+
+
+def resumable_output(checkpoint, name, path):
+    """The output raster written so far by the pass ``name`` when it resumes, opened for update; None otherwise."""
+    if checkpoint is None or not checkpoint.resume(name)[0]:
+        return None
+    out_ds = gdal.Open(path, gdal.GA_Update) if os.path.isfile(path) else None
+    if out_ds is None:
+        # Sem o raster parcial a passada recomeça
+        checkpoint.discard(name)
+    return out_ds
+
+
+def _sync(path):
+    if not os.path.isfile(path):
+        return
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
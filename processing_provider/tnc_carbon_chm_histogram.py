@@ -0,0 +1,254 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import csv
+
+import numpy as np
+
+# Classes de 10 cm até 100 m; alturas acima caem na última classe
+HISTOGRAM_BIN_WIDTH = 0.1
+HISTOGRAM_MAX_HEIGHT = 100.0
+HISTOGRAM_VERSION = 2
+# Contagens por zona pendentes antes de serem somadas às acumuladas
+HISTOGRAM_MERGE_ENTRIES = 1 << 20
+# Tolerância para considerar um limiar sobre o limite de uma classe
+_EDGE_TOLERANCE = 1e-6
+
+
+def parse_thresholds(text, bin_width=HISTOGRAM_BIN_WIDTH, max_height=HISTOGRAM_MAX_HEIGHT):
+    """Sorted unique thresholds from a comma/space separated list; raises ``ValueError`` when invalid.
+
+    Each threshold must fall on a histogram bin edge (a multiple of
+    ``bin_width``) no higher than ``max_height``.
+    """
+    values = sorted({float(value) for value in (text or '').replace(';', ',').replace(',', ' ').split()})
+    if any(value < 0 for value in values):
+        raise ValueError('thresholds must not be negative')
+    off_edge = [value for value in values if not _on_edge(value, bin_width) or value > max_height]
+    if off_edge:
+        raise ValueError(f'thresholds must be multiples of {bin_width:g} m up to {max_height:g} m, not '
+                         f'{", ".join(f"{value:g}" for value in off_edge)}')
+    return values
+
+
+def _on_edge(threshold, bin_width):
+    steps = threshold / bin_width
+    return abs(steps - round(steps)) <= _EDGE_TOLERANCE
+
+
+class ChmHistogram:
+    """CHM height histogram of the valid pixels, for the whole raster and per zone.
+
+    It is filled in the canopy-cover pass, next to the valid/canopy counts,
+    and keeps the CHM sum of each zone. Both are enough to recompute the
+    carbon for any canopy-cover threshold without reading the pixels again:
+    the canopy cover rate is the share of valid pixels at or above the
+    threshold (the upper tail of the cumulative histogram), and the models
+    are linear in the CHM, so the zone density only needs its mean CHM.
+
+    Thresholds must fall on a bin edge (a multiple of ``HISTOGRAM_BIN_WIDTH``);
+    others raise ``ValueError`` instead of being rounded to one.
+
+    Per zone the counts are sparse: ``zone_keys`` holds ``zone * bins + bin``
+    for the bins a zone actually has, sorted, and ``zone_values`` their
+    counts (int32 while they fit), so many small polygons cost a few
+    entries each instead of a full row of bins. Partials only cover the zones
+    present in a window; they are buffered and merged in batches.
+    """
+
+    def __init__(self, ids=None, bin_width=HISTOGRAM_BIN_WIDTH, max_height=HISTOGRAM_MAX_HEIGHT):
+        self.ids = np.array([-1] if ids is None else ids, dtype=np.int64)
+        self.bin_width = float(bin_width)
+        self.max_height = float(max_height)
+        self.bins = int(round(self.max_height / self.bin_width)) + 1
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+        self.chm_sum = 0.0
+        self.zone_keys = np.zeros(0, dtype=np.int64)
+        self.zone_values = np.zeros(0, dtype=np.int32)
+        self.zone_sums = np.zeros(self.ids.size, dtype=np.float64)
+        self._pending = []
+        self._pending_entries = 0
+
+    def bin_index(self, heights):
+        # Margem pequena para que alturas exatamente no limite caiam na classe de cima, como em chm >= limiar
+        index = np.floor(np.asarray(heights, dtype=np.float64) / self.bin_width + 1e-6)
+        return np.clip(index, 0, self.bins - 1).astype(np.int64)
+
+    def threshold_bins(self, thresholds):
+        """Bin of each threshold; raises ``ValueError`` for thresholds off the bin edges or above the last one."""
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        off_edge = [value for value in thresholds.tolist()
+                    if value < 0 or value > self.max_height or not _on_edge(value, self.bin_width)]
+        if off_edge:
+            raise ValueError(f'thresholds must be multiples of {self.bin_width:g} m up to {self.max_height:g} m, '
+                             f'not {", ".join(f"{value:g}" for value in off_edge)}')
+        return self.bin_index(thresholds)
+
+    def partial(self, zone_ids, chm, valid):
+        """Counts of one window; ``zone_ids`` is None when the whole raster is a single zone."""
+        heights = chm[valid]
+        index = self.bin_index(heights)
+        counts = np.bincount(index, minlength=self.bins)
+        chm_sum = float(heights.sum(dtype=np.float64))
+        if zone_ids is None:
+            keys = np.flatnonzero(counts)
+            return counts, chm_sum, np.zeros(1, dtype=np.int64), keys, counts[keys], np.array([chm_sum])
+        zones = zone_ids[valid]
+        in_zone = zones >= 0
+        present, position = np.unique(zones[in_zone], return_inverse=True)
+        keys, zone_counts = np.unique(present[position] * self.bins + index[in_zone], return_counts=True)
+        zone_sums = np.bincount(position, weights=heights[in_zone].astype(np.float64), minlength=present.size)
+        return counts, chm_sum, present, keys, zone_counts, zone_sums
+
+    def add(self, partial):
+        counts, chm_sum, present, keys, zone_counts, zone_sums = partial
+        self.counts += counts
+        self.chm_sum += chm_sum
+        self.zone_sums[present] += zone_sums
+        self._pending.append((keys, zone_counts))
+        self._pending_entries += keys.size
+        if self._pending_entries >= max(HISTOGRAM_MERGE_ENTRIES, self.zone_keys.size):
+            self._merge()
+
+    def _merge(self):
+        if not self._pending:
+            return
+        keys = np.concatenate([self.zone_keys] + [keys for keys, _ in self._pending])
+        values = np.concatenate([self.zone_values.astype(np.int64)] + [values.astype(np.int64)
+                                                                     for _, values in self._pending])
+        self._pending = []
+        self._pending_entries = 0
+        self.zone_keys, self.zone_values = _sum_by_key(keys, values)
+
+    def zone_counts(self, first_bins=None):
+        """Valid pixels of each zone, or, per entry of ``first_bins``, those in that bin or above (``(zones, n)``)."""
+        self._merge()
+        zones = self.zone_keys // self.bins
+        values = self.zone_values.astype(np.float64)
+        if first_bins is None:
+            return np.bincount(zones, weights=values, minlength=self.ids.size).astype(np.int64)
+        bins = self.zone_keys % self.bins
+        counts = np.zeros((self.ids.size, len(first_bins)), dtype=np.int64)
+        for column, first in enumerate(first_bins):
+            above = bins >= first
+            counts[:, column] = np.bincount(zones[above], weights=values[above], minlength=self.ids.size)
+        return counts
+
+    def state(self):
+        """Accumulated counts as arrays, for a checkpoint journal (see ``restore``)."""
+        self._merge()
+        return {'histogram_counts': self.counts, 'histogram_chm_sum': np.float64(self.chm_sum),
+                'histogram_zone_keys': self.zone_keys, 'histogram_zone_values': self.zone_values,
+                'histogram_zone_sums': self.zone_sums}
+
+    def restore(self, state):
+        self.counts = np.array(state['histogram_counts'], dtype=np.int64)
+        self.chm_sum = float(state['histogram_chm_sum'])
+        self._set_zone_counts(state, 'histogram_')
+        self.zone_sums = np.array(state['histogram_zone_sums'], dtype=np.float64)
+
+    def _set_zone_counts(self, arrays, prefix):
+        self._pending = []
+        self._pending_entries = 0
+        if f'{prefix}zone_counts' in arrays:
+            # Diários e arquivos antigos guardam a matriz densa zonas x classes
+            dense = np.asarray(arrays[f'{prefix}zone_counts']).ravel()
+            keys = np.flatnonzero(dense)
+            self.zone_keys, self.zone_values = _sum_by_key(keys, dense[keys].astype(np.int64))
+        else:
+            self.zone_keys = np.array(arrays[f'{prefix}zone_keys'], dtype=np.int64)
+            self.zone_values = np.array(arrays[f'{prefix}zone_values'])
+
+    def canopy_cover_rate(self, thresholds):
+        """Global canopy cover rate for each threshold."""
+        valid = self.counts.sum()
+        above = self._tail(self.counts)[self.threshold_bins(thresholds)]
+        return above / valid if valid else np.full(len(thresholds), np.nan)
+
+    def sweep(self, thresholds, coefficients, pixel_area_m2):
+        """Carbon per zone and threshold, as columns of a long table (one row per zone and threshold).
+
+        Adds a total row (ID ``-1``) per threshold when there is more than
+        one zone.
+        """
+        intercept, canopy_cover, height = coefficients
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        canopy_cover_rate = self.canopy_cover_rate(thresholds)
+        ids = self.ids
+        count = self.zone_counts()
+        sums = self.zone_sums
+        zone_canopy = self.zone_counts(self.threshold_bins(thresholds))
+        if ids.size > 1:
+            ids = np.append(ids, -1)
+            count = np.append(count, count.sum())
+            sums = np.append(sums, sums.sum())
+            zone_canopy = np.vstack([zone_canopy, zone_canopy.sum(axis=0)])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_chm = np.where(count > 0, sums / count, np.nan)
+            zone_rate = np.where(count[:, None] > 0, zone_canopy / count[:, None], np.nan)
+        density = intercept + canopy_cover * canopy_cover_rate[None, :] + height * mean_chm[:, None]
+        carbon_ton = density * (count * pixel_area_m2 / 10000)[:, None]
+        zones, steps = density.shape
+        return {
+            'ID': np.repeat(ids, steps),
+            'Canopy cover threshold (m)': np.tile(thresholds, zones),
+            'Canopy cover rate': np.tile(canopy_cover_rate, zones),
+            'Zone canopy cover rate': zone_rate.ravel(),
+            'Area (ha)': np.repeat(count * pixel_area_m2 / 10000, steps),
+            'Carbon Density (ton/ha)': density.ravel(),
+            'Carbon (ton)': carbon_ton.ravel(),
+        }
+
+    def save(self, path, pixel_area_m2):
+        """Writes the histogram sidecar (compressed ``.npz``)."""
+        self._merge()
+        np.savez_compressed(
+            path, version=HISTOGRAM_VERSION, bin_width=self.bin_width, max_height=self.max_height,
+            pixel_area_m2=pixel_area_m2, ids=self.ids, counts=self.counts, chm_sum=self.chm_sum,
+            zone_keys=self.zone_keys, zone_values=self.zone_values, zone_sums=self.zone_sums)
+
+    @classmethod
+    def load(cls, path):
+        """Returns ``(histogram, pixel_area_m2)`` from a sidecar written by ``save``."""
+        with np.load(path) as data:
+            if int(data['version']) > HISTOGRAM_VERSION:
+                raise ValueError(f'unsupported histogram version {int(data["version"])}')
+            histogram = cls(data['ids'], float(data['bin_width']), float(data['max_height']))
+            histogram.counts = data['counts']
+            histogram.chm_sum = float(data['chm_sum'])
+            histogram._set_zone_counts(data, '')
+            histogram.zone_sums = data['zone_sums']
+            return histogram, float(data['pixel_area_m2'])
+
+    @staticmethod
+    def _tail(counts):
+        # Pixels na classe do limiar ou acima (cumulativo a partir do topo)
+        return np.cumsum(counts[..., ::-1], axis=-1)[..., ::-1]
+
+
+def _sum_by_key(keys, values):
+    """Sorted unique ``keys`` with the sum of their ``values``, in int32 while the sums fit."""
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if keys.size else np.zeros(0, dtype=np.int64)
+    sums = np.add.reduceat(values, starts) if keys.size else np.zeros(0, dtype=np.int64)
+    if sums.size == 0 or sums.max() <= np.iinfo(np.int32).max:
+        sums = sums.astype(np.int32)
+    return keys[starts], sums
+
+
+def write_sweep_csv(csv_path, columns):
+    with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(list(columns))
+        cells = []
+        for values in columns.values():
+            column = values.astype(object)
+            if values.dtype.kind == 'f':
+                column[np.isnan(values)] = None
+            cells.append(column.tolist())
+        writer.writerows(zip(*cells))
@@ -0,0 +1,231 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import numpy as np
+
+from qgis.PyQt.QtCore import QCoreApplication # type: ignore
+from qgis.core import (QgsProcessingAlgorithm, # type: ignore
+                       QgsWkbTypes,
+                       QgsProcessingParameterVectorLayer,
+                       QgsProcessingParameterRasterLayer,
+                       QgsProcessingParameterNumber,
+                       QgsProcessingParameterString,
+                       QgsProcessingParameterRasterDestination,
+                       QgsProcessingParameterFileDestination,
+                       QgsProcessingParameterDefinition,
+                       QgsProcessingException)
+
+from osgeo import gdal, osr # type: ignore
+
+from .tnc_carbon_dask_backend import (DEFAULT_CHUNK_PIXELS, GdalBandArray, canopy_cover_counts, carbon_density,
+                                      chm_array, dask_available, distributed_available, dtm_dsm_array, scheduler,
+                                      whole_raster_mean, write_density_raster, zonal_sums)
+from .tnc_carbon_zonal_results import ZonalResults, write_zonal_csv
+from .tnc_carbon_zone_raster import disjoint_zone_groups, rasterize_zones
+
+
+class TNC_Carbon_Dask(QgsProcessingAlgorithm):
+    """CHM or DTM+DSM carbon as chunked Dask graphs, for rasters too large for one machine.
+
+    The canopy-cover reduction, the model and the zonal sums are expressed
+    over the GDAL datasets as Dask arrays and run on the local threaded
+    scheduler, or on a ``distributed`` cluster when a scheduler address is
+    given (the workers must see the input paths and the processing temp
+    folder). The model expression is the one of ``biome_algorithm``.
+
+    The zones are rasterized (see ``rasterize_zones``), so a polygon gets
+    the pixels whose center it holds, and overlapping polygons are burned
+    in separate groups (see ``disjoint_zone_groups``) so each one keeps the
+    whole overlap. The zonal statistics of the single-process algorithms
+    count pixels the same way, except for polygons holding at most one
+    pixel center, which they weight by the intersected area instead.
+    """
+    INPUT_RASTER = 'INPUT_RASTER'
+    INPUT_RASTER_DTM = 'INPUT_RASTER_DTM'
+    INPUT_RASTER_DSM = 'INPUT_RASTER_DSM'
+    INPUT_POLYGON = 'INPUT_POLYGON'
+    INPUT_CANOPY_COVER_THRESHOLD = 'INPUT_CANOPY_COVER_THRESHOLD'
+    INPUT_DASK_SCHEDULER = 'INPUT_DASK_SCHEDULER'
+    INPUT_DASK_CHUNK = 'INPUT_DASK_CHUNK'
+    OUTPUT_RASTER = 'OUTPUT_RASTER'
+    OUTPUT_CSV = 'OUTPUT_CSV'
+
+    def __init__(self, biome_algorithm):
+        super().__init__()
+        self.biome_algorithm = biome_algorithm
+        self.biome = biome_algorithm()
+        self.MODEL_COEFFICIENTS = biome_algorithm.MODEL_COEFFICIENTS
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(
+            QgsProcessingParameterRasterLayer(
+                self.INPUT_RASTER,
+                self.tr('Canopy height model raster layer (CHM)'),
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterRasterLayer(
+                self.INPUT_RASTER_DTM,
+                self.tr('Digital terrain model raster layer (DTM), instead of the CHM'),
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterRasterLayer(
+                self.INPUT_RASTER_DSM,
+                self.tr('Digital surface model raster layer (DSM), instead of the CHM'),
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterVectorLayer(
+                self.INPUT_POLYGON,
+                self.tr('Polygon layer'),
+                [QgsWkbTypes.PolygonGeometry],
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.INPUT_CANOPY_COVER_THRESHOLD,
+                self.tr('Canopy cover threshold (default = 2.0m)'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=2.0,
+                optional=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterRasterDestination(
+                self.OUTPUT_RASTER,
+                self.tr('Output raster layer'),
+                optional=True,
+                createByDefault=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_CSV,
+                self.tr('Output CSV file'),
+                'CSV files (*.csv)'
+            )
+        )
+        for parameter in [
+            QgsProcessingParameterString(
+                self.INPUT_DASK_SCHEDULER,
+                self.tr('Dask distributed scheduler address (empty = local threads)'),
+                optional=True
+            ),
+            QgsProcessingParameterNumber(
+                self.INPUT_DASK_CHUNK,
+                self.tr('Dask chunk size in pixels'),
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=DEFAULT_CHUNK_PIXELS,
+                minValue=256,
+                optional=True
+            ),
+        ]:
+            parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+            self.addParameter(parameter)
+
+    def processAlgorithm(self, parameters, context, feedback):
+        if not dask_available():
+            raise QgsProcessingException(self.tr('The Dask backend requires the dask package'))
+        raster_layer = self.parameterAsRasterLayer(parameters, self.INPUT_RASTER, context)
+        raster_layer_dtm = self.parameterAsRasterLayer(parameters, self.INPUT_RASTER_DTM, context)
+        raster_layer_dsm = self.parameterAsRasterLayer(parameters, self.INPUT_RASTER_DSM, context)
+        polygon_layer = self.parameterAsVectorLayer(parameters, self.INPUT_POLYGON, context)
+        canopy_cover_threshold = self.parameterAsDouble(parameters, self.INPUT_CANOPY_COVER_THRESHOLD, context)
+        scheduler_address = self.parameterAsString(parameters, self.INPUT_DASK_SCHEDULER, context).strip()
+        chunk_pixels = self.parameterAsInt(parameters, self.INPUT_DASK_CHUNK, context) or DEFAULT_CHUNK_PIXELS
+        output_path = self.parameterAsOutputLayer(parameters, self.OUTPUT_RASTER, context)
+        csv_path = self.parameterAsFileOutput(parameters, self.OUTPUT_CSV, context)
+
+        if scheduler_address and not distributed_available():
+            raise QgsProcessingException(self.tr('A scheduler address requires the distributed package'))
+        if raster_layer is not None:
+            reference_path = raster_layer.source()
+        elif raster_layer_dtm is not None and raster_layer_dsm is not None:
+            reference_path = raster_layer_dtm.source()
+        else:
+            raise QgsProcessingException(self.tr('Provide a CHM raster or a DTM and DSM pair'))
+
+        reference_ds = gdal.Open(reference_path)
+        projection = reference_ds.GetProjection()
+        geotransform = reference_ds.GetGeoTransform()
+        linear_units_factor = osr.SpatialReference(wkt=projection).GetLinearUnits()
+        pixel_area_m2 = abs(geotransform[1]) * abs(geotransform[5]) * (linear_units_factor ** 2)
+
+        with scheduler(scheduler_address) as client:
+            if client is not None:
+                feedback.pushInfo(f'Dask distribuído: {client}')
+            if raster_layer is not None:
+                chm, mask, nodata_value = chm_array(reference_path, chunk_pixels)
+            else:
+                chm, mask, nodata_value = dtm_dsm_array(reference_path, raster_layer_dsm.source(), chunk_pixels)
+            feedback.pushInfo(f'{chm.npartitions} blocos de até {chm.chunksize[0]} x {chm.chunksize[1]} pixels')
+
+            total_coverage, canopy_coverage = canopy_cover_counts(chm, mask, canopy_cover_threshold)
+            feedback.setProgress(25)
+            if feedback.isCanceled():
+                return {}
+            canopy_cover_rate = canopy_coverage / total_coverage
+            density = carbon_density(chm, mask, self.MODEL_COEFFICIENTS, canopy_cover_rate)
+
+            if polygon_layer is None:
+                count, mean = whole_raster_mean(density)
+                zonal_results = ZonalResults([-1], [count], [mean])
+            else:
+                ids, groups = disjoint_zone_groups(polygon_layer, feedback)
+                if feedback.isCanceled():
+                    return {}
+                if groups.size and groups.max() > 0:
+                    feedback.pushInfo(f'Polígonos sobrepostos: {groups.max() + 1} rasterizações de polígonos disjuntos')
+                position = {feature_id: index for index, feature_id in enumerate(ids.tolist())}
+                counts = np.zeros(ids.size)
+                sums = np.zeros(ids.size)
+                for group in np.unique(groups):
+                    zones_ds, group_ids = rasterize_zones(polygon_layer, reference_ds, context, feedback,
+                                                          ids[groups == group].tolist())
+                    zones_path = zones_ds.GetDescription()
+                    zones_ds = None
+                    zones = GdalBandArray(zones_path, dtype=np.int64).to_dask(chunk_pixels)
+                    at = [position[feature_id] for feature_id in group_ids.tolist()]
+                    counts[at], sums[at] = zonal_sums(density, zones, group_ids.size)
+                    if feedback.isCanceled():
+                        return {}
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    zonal_results = ZonalResults(ids, np.where(counts > 0, counts, np.nan),
+                                                 np.where(counts > 0, sums / counts, np.nan))
+                for feature_id in zonal_results.uncovered_ids():
+                    feedback.pushWarning(f"Feature {feature_id} não cobre nenhum pixel da camada")
+            feedback.setProgress(50)
+
+            outputs = {self.OUTPUT_CSV: csv_path}
+            if output_path:
+                write_density_raster(output_path, density, geotransform, projection, nodata_value, feedback)
+                outputs[self.OUTPUT_RASTER] = output_path
+
+        write_zonal_csv(csv_path, zonal_results, pixel_area_m2, feedback=feedback)
+        return outputs
+
+    def name(self):
+        return f'{self.biome.groupId()}dask'
+
+    def displayName(self):
+        return self.tr('CHM or DTM/DSM with the Dask backend (large rasters)')
+
+    def group(self):
+        return self.biome.group()
+
+    def groupId(self):
+        return self.biome.groupId()
+
+    def tr(self, string):
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        return TNC_Carbon_Dask(self.biome_algorithm)
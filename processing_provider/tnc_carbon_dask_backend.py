@@ -0,0 +1,196 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import contextlib
+import threading
+
+import numpy as np
+from osgeo import gdal # type: ignore
+
+try:
+    import dask # type: ignore
+    import dask.array as da # type: ignore
+except ImportError:
+    dask = da = None
+
+try:
+    import distributed # type: ignore
+except ImportError:
+    distributed = None
+
+# Lado dos blocos do grafo (em pixels), arredondado para múltiplos dos blocos do arquivo menores que ele
+DEFAULT_CHUNK_PIXELS = 4096
+
+
+def dask_available():
+    return da is not None
+
+
+def distributed_available():
+    return distributed is not None
+
+
+class GdalBandArray:
+    """Read-only array view of a GDAL band for ``dask.array.from_array``.
+
+    Only the path is pickled, so the same graph runs on the local threaded
+    scheduler or on ``distributed`` workers (which must see the same path).
+    Each thread opens its own dataset handle.
+    """
+
+    def __init__(self, path, band=1, dtype=np.float32):
+        self.path = path
+        self.band = band
+        ds = gdal.Open(path)
+        band_obj = ds.GetRasterBand(band)
+        self.shape = (ds.RasterYSize, ds.RasterXSize)
+        self.block_size = band_obj.GetBlockSize()
+        self.nodata = band_obj.GetNoDataValue()
+        self.dtype = np.dtype(dtype)
+        self.ndim = 2
+        self._local = threading.local()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def __getitem__(self, key):
+        rows, cols = key
+        band = getattr(self._local, 'band', None)
+        if band is None:
+            self._local.ds = gdal.Open(self.path)
+            band = self._local.band = self._local.ds.GetRasterBand(self.band)
+        yoff, ysize = rows.start or 0, (rows.stop or self.shape[0]) - (rows.start or 0)
+        xoff, xsize = cols.start or 0, (cols.stop or self.shape[1]) - (cols.start or 0)
+        return band.ReadAsArray(xoff, yoff, xsize, ysize).astype(self.dtype)
+
+    def to_dask(self, chunk_pixels=DEFAULT_CHUNK_PIXELS):
+        block_x, block_y = self.block_size
+        chunks = (chunk_side(block_y, chunk_pixels), chunk_side(block_x, chunk_pixels))
+        return da.from_array(self, chunks=chunks, lock=False, asarray=True, fancy=False)
+
+
+def chunk_side(block, chunk_pixels):
+    """Chunk side along one axis: ``chunk_pixels`` rounded down to whole blocks, or cut inside a block larger than it.
+
+    A stripped GeoTIFF has blocks as wide as the raster; rounding up to them
+    would make every chunk span the whole width.
+    """
+    block = max(1, block)
+    if block > chunk_pixels:
+        return max(1, chunk_pixels)
+    return chunk_pixels // block * block
+
+
+def nodata_mask(values, nodata_value):
+    # Mesmo critério do pipeline em janelas
+    if nodata_value is None:
+        return da.zeros(values.shape, dtype=bool, chunks=values.chunks)
+    if np.isnan(nodata_value):
+        return da.isnan(values)
+    return values == nodata_value
+
+
+def chm_array(chm_path, chunk_pixels=DEFAULT_CHUNK_PIXELS):
+    """Returns ``(chm, nodata_mask, nodata_value)`` as Dask arrays."""
+    source = GdalBandArray(chm_path)
+    chm = source.to_dask(chunk_pixels)
+    return chm, nodata_mask(chm, source.nodata), source.nodata
+
+
+def dtm_dsm_array(dtm_path, dsm_path, chunk_pixels=DEFAULT_CHUNK_PIXELS):
+    """Returns ``(|DSM - DTM|, nodata_mask, nodata_value)``; the DTM nodata marks invalid pixels."""
+    dtm_source = GdalBandArray(dtm_path)
+    dtm = dtm_source.to_dask(chunk_pixels)
+    dsm = GdalBandArray(dsm_path).to_dask(chunk_pixels).rechunk(dtm.chunks)
+    return abs(dsm - dtm), nodata_mask(dtm, dtm_source.nodata), dtm_source.nodata
+
+
+@contextlib.contextmanager
+def scheduler(address=None):
+    """Local threaded scheduler, or a ``distributed`` client connected to ``address``."""
+    if not address:
+        with dask.config.set(scheduler='threads'):
+            yield None
+        return
+    with distributed.Client(address) as client:
+        yield client
+
+
+def canopy_cover_counts(chm, mask, threshold):
+    """Canopy-cover reduction: ``(valid_pixels, canopy_pixels)`` in a single graph."""
+    valid = ~mask
+    total, canopy = dask.compute(valid.sum(), ((chm >= threshold) & valid).sum())
+    return int(total), int(canopy)
+
+
+def model_density(chm, coefficients, canopy_cover_rate):
+    # Mesma expressão (e tipos) de applyModel nos algoritmos de um processo só
+    intercept, canopy_cover, height = coefficients
+    return intercept + canopy_cover * canopy_cover_rate + height * chm
+
+
+def carbon_density(chm, mask, coefficients, canopy_cover_rate):
+    """Per-pixel carbon density (float32, NaN where nodata) as a lazy array."""
+    density = chm.map_blocks(model_density, coefficients, canopy_cover_rate, dtype=np.float32).astype(np.float32)
+    return da.where(mask, np.float32(np.nan), density)
+
+
+def zonal_sums(density, zones, zone_count):
+    """Per-zone ``(count, sum)`` of the valid density pixels; ``zones`` holds zone positions (``-1`` outside).
+
+    Each block is reduced with ``bincount`` to a vector of ``zone_count``
+    entries and the vectors are summed as a tree, so the zones never need
+    to fit in one chunk.
+    """
+    def block_sums(zone_block, density_block):
+        valid = (zone_block >= 0) & ~np.isnan(density_block)
+        index = zone_block[valid].astype(np.int64)
+        counts = np.bincount(index, minlength=zone_count).astype(np.float64)
+        sums = np.bincount(index, weights=density_block[valid].astype(np.float64), minlength=zone_count)
+        return np.stack([counts, sums])[None, None]
+
+    chunks = (tuple(1 for _ in density.chunks[0]), tuple(1 for _ in density.chunks[1]), (2,), (zone_count,))
+    blocks = da.map_blocks(block_sums, zones.rechunk(density.chunks), density, new_axis=[2, 3], chunks=chunks,
+                           dtype=np.float64)
+    totals = blocks.sum(axis=(0, 1)).compute()
+    return totals[0], totals[1]
+
+
+def whole_raster_mean(density):
+    count, total = dask.compute((~da.isnan(density)).sum(), da.nansum(density.astype(np.float64)))
+    return int(count), (float(total) / int(count) if count else np.nan)
+
+
+def write_density_raster(path, density, geotransform, projection, nodata_value, feedback=None):
+    """Writes the density row of chunks by row of chunks, from the client, so workers never write the file."""
+    ysize, xsize = density.shape
+    out_ds = gdal.GetDriverByName('GTiff').Create(path, xsize, ysize, 1, gdal.GDT_Float32,
+                                                  ['COMPRESS=DEFLATE', 'TILED=YES', 'BIGTIFF=IF_SAFER'])
+    out_ds.SetGeoTransform(geotransform)
+    out_ds.SetProjection(projection)
+    out_band = out_ds.GetRasterBand(1)
+    if nodata_value is not None:
+        out_band.SetNoDataValue(nodata_value)
+    yoff = 0
+    rows = density.chunks[0]
+    for number, height in enumerate(rows):
+        if feedback is not None and feedback.isCanceled():
+            break
+        block = density[yoff:yoff + height].compute()
+        if nodata_value is not None:
+            block[np.isnan(block)] = nodata_value
+        out_band.WriteArray(block, 0, yoff)
+        yoff += height
+        if feedback is not None:
+            feedback.setProgress(50 + 50 * (number + 1) / len(rows))
+    out_band.FlushCache()
+    out_ds = None
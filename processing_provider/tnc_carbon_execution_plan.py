@@ -0,0 +1,226 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import math
+
+from osgeo import gdal # type: ignore
+
+try:
+    import psutil # type: ignore
+except ImportError:
+    psutil = None
+
+from .tnc_carbon_chm_histogram import HISTOGRAM_BIN_WIDTH, HISTOGRAM_MAX_HEIGHT
+from .tnc_carbon_raster_pipeline import DEFAULT_QUEUE_DEPTH, DEFAULT_WINDOW_PIXELS, DEFAULT_WORKERS, window_rows
+
+IN_MEMORY, STREAMED, PARALLEL = 'in-memory', 'streamed', 'parallel'
+ENGINE_NAMES = {IN_MEMORY: 'em memória', STREAMED: 'em blocos, sequencial', PARALLEL: 'em blocos, paralelo'}
+# Orçamento quando a memória livre não pode ser lida
+DEFAULT_MEMORY_BUDGET_MB = 2048
+# Menor janela tentada antes de abrir mão das threads de cálculo
+MIN_PARALLEL_WINDOW_PIXELS = 1 << 18
+# Fração estimada das classes do histograma ocupadas em cada zona (contagens esparsas de 12 bytes)
+HISTOGRAM_ZONE_FILL = 0.25
+MB = 1 << 20
+
+# Vazões aproximadas para a estimativa de tempo (por thread de cálculo)
+READ_MB_S = 400.0
+COMPRESSED_READ_MB_S = 120.0
+WRITE_MB_S = 300.0
+CANOPY_PIXELS_S = 150e6
+HISTOGRAM_PIXELS_S = 40e6
+MODEL_PIXELS_S = 80e6
+LOCAL_CANOPY_PIXELS_S = 25e6
+TREES_PIXELS_S = 8e6
+
+
+class ExecutionPlan:
+    """How a raster run is executed: engine, window size, threads and the estimates behind the choice."""
+
+    def __init__(self, engine, window_rows, workers, queue_depth, peak_bytes, seconds, budget_bytes, available_bytes,
+                 metadata, notes):
+        self.engine = engine
+        self.window_rows = window_rows
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.peak_bytes = peak_bytes
+        self.seconds = seconds
+        self.budget_bytes = budget_bytes
+        self.available_bytes = available_bytes
+        self.metadata = metadata
+        self.notes = notes
+
+    def report(self, feedback):
+        metadata = self.metadata
+        feedback.pushInfo("Entrada: {} x {} pixels {}, blocos de {} x {}, compressão {}, {} polígono(s)".format(
+            metadata['xsize'], metadata['ysize'], metadata['data_type'], *metadata['block_size'],
+            metadata['compression'] or 'nenhuma', metadata['polygons']))
+        windows = math.ceil(metadata['ysize'] / self.window_rows)
+        feedback.pushInfo(f"Plano de execução: {ENGINE_NAMES[self.engine]}, {windows} janela(s) de {min(self.window_rows, metadata['ysize'])} "
+                          f"linhas, {self.workers} thread(s) de cálculo, fila de {self.queue_depth}")
+        available = f"{self.available_bytes / MB:.0f} MB" if self.available_bytes is not None else 'desconhecida'
+        feedback.pushInfo(f"Memória: pico estimado de {self.peak_bytes / MB:.0f} MB para um orçamento de "
+                          f"{self.budget_bytes / MB:.0f} MB (memória livre: {available})")
+        feedback.pushInfo(f"Tempo estimado das passadas raster: ~{format_duration(self.seconds)}")
+        for note in self.notes:
+            feedback.pushWarning(note)
+
+
+def available_memory():
+    """Memory available to new allocations in bytes, or None when it cannot be read."""
+    if psutil is not None:
+        return int(psutil.virtual_memory().available)
+    try:
+        with open('/proc/meminfo', encoding='ascii') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def raster_metadata(bands, polygons=0):
+    """Sizes, block layout, data types and compression of the input bands, without reading pixels."""
+    band = bands[0]
+    dataset = band.GetDataset()
+    compression = dataset.GetMetadataItem('COMPRESSION', 'IMAGE_STRUCTURE') if dataset is not None else None
+    return {
+        'xsize': band.XSize,
+        'ysize': band.YSize,
+        'block_size': tuple(band.GetBlockSize()),
+        'data_type': gdal.GetDataTypeName(band.DataType),
+        'input_bytes': [max(1, gdal.GetDataTypeSize(input_band.DataType) // 8) for input_band in bands],
+        'compression': compression,
+        'polygons': polygons,
+    }
+
+
+def plan_raster_run(bands, memory_budget_mb=0, polygons=0, histogram=False, local_canopy=None, trees=None,
+                    workers=DEFAULT_WORKERS, available_bytes=None):
+    """Chooses the engine and window size of the canopy and model passes under a memory budget.
+
+    Only metadata is read: the band sizes, block layout, data types and
+    compression, the number of polygons and the free memory. Peak memory is
+    estimated from the bytes per pixel each pass keeps for the windows in
+    flight in ``run_pipeline`` (read-ahead queue, windows waiting for or in
+    the compute threads, write-behind queue), including the halo rows of
+    ``local_canopy`` and ``trees``, plus the per-zone histogram.
+
+    The raster runs in memory (one window) when it is no larger than a
+    default window and fits the budget; otherwise the largest window that
+    fits with every compute thread is used, then fewer threads and a single
+    queued window. When even one block row does not fit (very wide rasters
+    in tall tiles), the strips go below the block height, and GDAL then
+    keeps the decoded block row in its cache. ``window_rows`` is meant for
+    ``raster_windows(band, rows=...)``. ``memory_budget_mb`` 0 means half of
+    the free memory.
+    """
+    metadata = raster_metadata(bands, polygons)
+    xsize, ysize = metadata['xsize'], metadata['ysize']
+    block_rows = max(1, metadata['block_size'][1])
+    if available_bytes is None:
+        available_bytes = available_memory()
+    notes = []
+    if memory_budget_mb > 0:
+        budget_bytes = int(memory_budget_mb * MB)
+        if available_bytes is not None and budget_bytes > available_bytes:
+            notes.append(f"O orçamento de memória ({memory_budget_mb:.0f} MB) é maior que a memória livre "
+                         f"({available_bytes / MB:.0f} MB): a máquina pode usar swap")
+    else:
+        budget_bytes = available_bytes // 2 if available_bytes is not None else DEFAULT_MEMORY_BUDGET_MB * MB
+    if block_rows >= ysize and metadata['compression'] and xsize * ysize > DEFAULT_WINDOW_PIXELS:
+        notes.append("O raster comprimido é gravado em uma única faixa: cada janela pode decodificar o arquivo "
+                     "inteiro; converta para GeoTIFF em blocos (TILED=YES) para ler em partes")
+
+    halo = max([stage.halo_y for stage in (local_canopy, trees) if stage is not None], default=0)
+    passes = _pass_costs(metadata['input_bytes'], polygons, histogram, local_canopy is not None, trees is not None)
+    bins = int(round(HISTOGRAM_MAX_HEIGHT / HISTOGRAM_BIN_WIDTH)) + 1
+    fixed = 2 * int(polygons * bins * HISTOGRAM_ZONE_FILL) * 12 if histogram else 0
+    align = window_rows(1, xsize, ysize, block_rows)
+    # Linha de blocos decodificada que o cache do GDAL guarda quando as janelas são mais baixas que os blocos
+    block_row_bytes = xsize * align * sum(metadata['input_bytes'])
+
+    def peak(rows, threads, depth):
+        read_rows = min(ysize, rows + 2 * halo)
+        held = depth + threads + 1
+        cached = block_row_bytes if rows < align else 0
+        return fixed + cached + max(xsize * (held * read_rows * read + threads * read_rows * compute
+                                             + depth * rows * write) for read, compute, write, _ in passes)
+
+    # Janelas menores que duas bordas quase não economizam memória e repetem a leitura
+    min_rows = max(align, math.ceil(2 * halo / align) * align)
+    split_rows = max(1, 2 * halo)
+    candidates = []
+    if xsize * ysize <= DEFAULT_WINDOW_PIXELS:
+        candidates.append((IN_MEMORY, math.ceil(ysize / align) * align, 1, 1))
+    window_pixels = DEFAULT_WINDOW_PIXELS
+    while True:
+        rows = max(min_rows, window_rows(window_pixels, xsize, ysize, block_rows))
+        candidates.append((PARALLEL, rows, max(1, workers), DEFAULT_QUEUE_DEPTH))
+        if window_pixels <= MIN_PARALLEL_WINDOW_PIXELS or rows == min_rows:
+            break
+        window_pixels //= 2
+    rows = max(min_rows, window_rows(DEFAULT_WINDOW_PIXELS, xsize, ysize, block_rows))
+    while True:
+        candidates.append((STREAMED, rows, 1, 1))
+        if rows <= min_rows:
+            break
+        rows = max(min_rows, rows // 2 // align * align)
+    # Último recurso: faixas mais baixas que os blocos
+    while rows > split_rows:
+        rows = max(split_rows, rows // 2)
+        candidates.append((STREAMED, rows, 1, 1))
+
+    for engine, rows, threads, depth in candidates:
+        if engine == PARALLEL and threads == 1:
+            engine = STREAMED
+        if peak(rows, threads, depth) <= budget_bytes:
+            break
+    else:
+        notes.append(f"Nem a menor janela cabe no orçamento de memória ({budget_bytes / MB:.0f} MB): "
+                     "a execução pode usar mais memória que o previsto")
+    rows = min(rows, math.ceil(ysize / align) * align)
+    if rows < align:
+        notes.append(f"Faixas de {rows} linhas, mais baixas que os blocos de {align} linhas, para caber no "
+                     f"orçamento: cada linha de blocos ({block_row_bytes / MB:.0f} MB decodificados) é lida do cache "
+                     "do GDAL por várias janelas")
+        if gdal.GetCacheMax() < block_row_bytes:
+            notes.append(f"O cache do GDAL ({gdal.GetCacheMax() / MB:.0f} MB) é menor que uma linha de blocos: "
+                         "os blocos serão decodificados de novo a cada janela; aumente GDAL_CACHEMAX ou converta o "
+                         "raster para blocos menores")
+    seconds = _estimate_seconds(passes, xsize * ysize, metadata, threads)
+    return ExecutionPlan(engine, rows, threads, depth, peak(rows, threads, depth), seconds, budget_bytes,
+                         available_bytes, metadata, notes)
+
+
+def _pass_costs(input_bytes, polygons, histogram, local_canopy, trees):
+    """Per pass: bytes per pixel read, computed (temporaries) and queued for writing, and pixels per second."""
+    # Leitura no tipo nativo, cópia em float32 e máscara de nodata; DTM + DSM também guardam |DSM - DTM|
+    read = sum(size + 4 for size in input_bytes) + (4 if len(input_bytes) > 1 else 0) + 1
+    canopy_read = read + (8 if histogram and polygons else 0)
+    canopy_compute = 2 + (30 if histogram else 0)
+    canopy_speed = 1 / (1 / CANOPY_PIXELS_S + (1 / HISTOGRAM_PIXELS_S if histogram else 0))
+    model_compute = 12 + (40 if local_canopy else 0) + (26 if trees else 0)
+    model_speed = 1 / (1 / MODEL_PIXELS_S + (1 / LOCAL_CANOPY_PIXELS_S if local_canopy else 0)
+                       + (1 / TREES_PIXELS_S if trees else 0))
+    return [(canopy_read, canopy_compute, 0, canopy_speed), (read, model_compute, 4, model_speed)]
+
+
+def _estimate_seconds(passes, pixels, metadata, workers):
+    # Cada passada é limitada pelo estágio mais lento do pipeline: leitura, cálculo ou escrita
+    read_speed = (COMPRESSED_READ_MB_S if metadata['compression'] else READ_MB_S) * MB
+    read_seconds = pixels * sum(metadata['input_bytes']) / read_speed
+    return sum(max(read_seconds, pixels / (speed * workers), pixels * write / (WRITE_MB_S * MB))
+               for _, _, write, speed in passes)
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f'{max(1, round(seconds))} s'
+    if seconds < 3600:
+        return f'{seconds / 60:.0f} min'
+    return f'{seconds / 3600:.1f} h'
@@ -0,0 +1,465 @@
+"""Local job service for carbon calculations.
+
+Runs the provider algorithms for other tools on the same host, over HTTP
+on localhost (or a Unix socket), without each tool scripting QGIS::
+
+    TNCCC_JOB_TOKEN=... python -m <plugin>.processing_provider.tnc_carbon_job_service --port 8765 --workers 4
+
+Every request must carry ``Authorization: Bearer <token>`` (the token is
+taken from ``--token`` or ``TNCCC_JOB_TOKEN``, or generated and printed at
+startup) and a ``Host`` naming localhost, so other users of the host and
+web pages (through DNS rebinding) cannot submit jobs. Only the algorithms of
+this provider (``tnccc:``) can be run.
+
+API (JSON):
+
+* ``POST /jobs`` with ``{"algorithm": "amazonchm", "parameters": {...}}``
+  (or ``"amazonpointcloud"`` for a point cloud) and ``Content-Type:
+  application/json`` queues a job and answers ``202`` with its ``id``
+  (``503`` when the queue is full);
+* ``GET /jobs`` and ``GET /jobs/<id>`` return the status, timings, outputs
+  and error (finished jobs are forgotten after ``--finished-ttl-hours`` or
+  beyond the ``--keep-finished`` most recent ones, then answer ``404``);
+* ``DELETE /jobs/<id>`` cancels a queued job;
+* ``GET /jobs/<id>/outputs/<name>`` streams an output file.
+"""
+
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import hmac
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import secrets
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import unquote
+
+PROVIDER_ID = 'tnccc'
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+DEFAULT_MAX_QUEUED = 100
+# Jobs terminados mantidos para consulta: os mais recentes, por no máximo este tempo
+DEFAULT_KEEP_FINISHED = 1000
+DEFAULT_FINISHED_TTL = 24 * 3600.0
+# Jobs com entradas acima deste tamanho vão para a fila de jobs grandes
+DEFAULT_LARGE_JOB_BYTES = 1 << 30
+MAX_REQUEST_BYTES = 1 << 20
+STREAM_CHUNK = 1 << 20
+TOKEN_ENVIRONMENT = 'TNCCC_JOB_TOKEN'
+# Nomes aceitos no cabeçalho Host (com ou sem porta)
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '[::1]')
+ALGORITHM_NAME = re.compile(r'[a-z0-9_]+')
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+SMALL, LARGE = 'small', 'large'
+
+HTTP_REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 401: 'Unauthorized', 403: 'Forbidden',
+                404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+                415: 'Unsupported Media Type', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+_qgis_application = None
+
+
+class ServiceError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+
+    def __init__(self, job_id, algorithm, parameters, lane, input_bytes):
+        self.id = job_id
+        self.algorithm = algorithm
+        self.parameters = parameters
+        self.lane = lane
+        self.input_bytes = input_bytes
+        self.status = QUEUED
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.outputs = {}
+        self.error = None
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'algorithm': self.algorithm,
+            'status': self.status,
+            'lane': self.lane,
+            'input_bytes': self.input_bytes,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'outputs': self.outputs,
+            'error': self.error,
+        }
+
+
+class JobService:
+    """Queue of carbon jobs run on a bounded pool of worker processes.
+
+    Admission control: at most ``max_queued`` jobs wait at once (further
+    submissions are refused), and jobs are split by the size of their input
+    files into a small and a large lane. Large jobs can only take
+    ``large_slots`` of the ``workers`` slots, so the remaining slots are
+    always free for small jobs; when ``large_slots`` would take every slot
+    (e.g. a single worker) one more worker is started for the small lane.
+    Within what each lane may use, the oldest job starts first.
+
+    Finished jobs are kept for ``finished_ttl`` seconds and at most the
+    ``keep_finished`` most recent ones, so a long-running service does not
+    grow with every job it ever ran.
+
+    ``executor_factory(workers)`` creates the executor at start and again
+    when a worker process dies; it and ``run_job`` default to a spawned
+    process pool with QGIS initialized once per process and ``run_algorithm``.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, large_slots=None, max_queued=DEFAULT_MAX_QUEUED,
+                 large_job_bytes=DEFAULT_LARGE_JOB_BYTES, executor_factory=None, run_job=None,
+                 keep_finished=DEFAULT_KEEP_FINISHED, finished_ttl=DEFAULT_FINISHED_TTL):
+        workers = max(1, workers)
+        self.large_slots = max(1, workers - 1) if large_slots is None else max(0, large_slots)
+        # Pelo menos uma vaga fica sempre livre para os jobs pequenos
+        self.workers = max(workers, self.large_slots + 1)
+        self.max_queued = max_queued
+        self.large_job_bytes = large_job_bytes
+        self.executor_factory = executor_factory or process_pool
+        self.executor = None
+        self.run_job = run_job or run_algorithm
+        self.keep_finished = max(0, keep_finished)
+        self.finished_ttl = finished_ttl
+        self.jobs = {}
+        self.finished = collections.deque()
+        self.queue = []
+        self.running = {SMALL: 0, LARGE: 0}
+        self._ids = itertools.count(1)
+        self._wakeup = None
+        self._dispatcher = None
+
+    async def start(self):
+        self.executor = self.executor_factory(self.workers)
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, algorithm, parameters):
+        if not isinstance(algorithm, str) or not algorithm:
+            raise ServiceError(400, 'missing "algorithm"')
+        if not isinstance(parameters, dict):
+            raise ServiceError(400, '"parameters" must be an object')
+        self._forget_finished()
+        if len(self.queue) >= self.max_queued:
+            raise ServiceError(503, 'the job queue is full, try again later')
+        provider, _, name = algorithm.rpartition(':')
+        if provider not in ('', PROVIDER_ID) or not ALGORITHM_NAME.fullmatch(name):
+            raise ServiceError(403, f'only the {PROVIDER_ID} algorithms can be run, not "{algorithm}"')
+        algorithm = f'{PROVIDER_ID}:{name}'
+        input_bytes = input_size(parameters)
+        lane = LARGE if input_bytes >= self.large_job_bytes else SMALL
+        if lane == LARGE and self.large_slots == 0:
+            raise ServiceError(503, 'large jobs are not accepted by this service')
+        job = Job(str(next(self._ids)), algorithm, parameters, lane, input_bytes)
+        self.jobs[job.id] = job
+        self.queue.append(job)
+        self._wakeup.set()
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job.status != QUEUED:
+            raise ServiceError(409, f'job {job_id} is {job.status}; only queued jobs can be cancelled')
+        self.queue.remove(job)
+        job.status = CANCELLED
+        self._finish(job)
+        return job
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise ServiceError(404, f'job {job_id} not found')
+        return job
+
+    def _finish(self, job):
+        job.finished_at = time.time()
+        self.finished.append(job)
+        self._forget_finished()
+
+    def _forget_finished(self):
+        # Os terminados estão em ordem de término: os mais antigos saem primeiro
+        expired = time.time() - self.finished_ttl
+        while self.finished and (len(self.finished) > self.keep_finished or self.finished[0].finished_at < expired):
+            del self.jobs[self.finished.popleft().id]
+
+    def _next_job(self):
+        if sum(self.running.values()) >= self.workers:
+            return None
+        for job in self.queue:
+            if job.lane == SMALL or self.running[LARGE] < self.large_slots:
+                return job
+        return None
+
+    async def _dispatch(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            job = self._next_job()
+            while job is not None:
+                self.queue.remove(job)
+                self.running[job.lane] += 1
+                job.status = RUNNING
+                job.started_at = time.time()
+                asyncio.create_task(self._run(job))
+                job = self._next_job()
+
+    async def _run(self, job):
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            job.outputs = await loop.run_in_executor(executor, self.run_job, job.algorithm, job.parameters)
+            job.status = SUCCEEDED
+        except BrokenProcessPool as error:
+            # Um processo morreu (ex.: falta de memória): o pool é recriado para os próximos jobs
+            job.status = FAILED
+            job.error = f'worker process died: {error}'
+            if executor is self.executor:
+                self.executor = self.executor_factory(self.workers)
+        except Exception as error:
+            job.status = FAILED
+            job.error = f'{type(error).__name__}: {error}'
+        finally:
+            self.running[job.lane] -= 1
+            self._finish(job)
+            self._wakeup.set()
+
+
+def input_size(parameters):
+    """Total size in bytes of the existing files (or folders of tiles) named in the parameters."""
+    total = 0
+    values = list(parameters.values())
+    while values:
+        value = values.pop()
+        if isinstance(value, (list, tuple)):
+            values.extend(value)
+        elif isinstance(value, str):
+            path = value.split('|')[0]
+            if os.path.isfile(path):
+                total += os.path.getsize(path)
+            elif os.path.isdir(path):
+                total += sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    return total
+
+
+def process_pool(workers):
+    """Pool of ``workers`` spawned processes, each running ``initialize_worker`` once."""
+    return concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                                  initializer=initialize_worker)
+
+
+def initialize_worker():
+    """Starts a headless QGIS with the processing framework and this provider, once per worker process."""
+    global _qgis_application
+    from qgis.core import QgsApplication # type: ignore
+    _qgis_application = QgsApplication([], False)
+    _qgis_application.initQgis()
+    from processing.core.Processing import Processing # type: ignore
+    Processing.initialize()
+    from .tnc_carbon_calculator_provider import CarbonCalculatorProvider
+    QgsApplication.processingRegistry().addProvider(CarbonCalculatorProvider())
+
+
+def run_algorithm(algorithm, parameters):
+    """Runs one algorithm in the worker process and returns its outputs that are plain values (paths, numbers)."""
+    import processing # type: ignore
+    from qgis.core import QgsProcessingFeedback # type: ignore
+    results = processing.run(algorithm, parameters, feedback=QgsProcessingFeedback())
+    return {name: value for name, value in results.items() if value is None or isinstance(value, (str, int, float, bool))}
+
+
+class HttpHandler:
+    """Minimal HTTP/1.1 handler (one request per connection) over the ``JobService``.
+
+    Requests without the bearer ``token`` or whose ``Host`` (or ``Origin``,
+    when sent) is not localhost are refused before they are routed.
+    """
+
+    def __init__(self, service, token):
+        self.service = service
+        self.token = token
+
+    async def __call__(self, reader, writer):
+        try:
+            method, path, headers, body = await self.read_request(reader)
+            self.check_access(headers)
+            await self.route(method, path, headers, body, writer)
+        except ServiceError as error:
+            await self.respond(writer, error.status, {'error': str(error)})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as error:
+            await self.respond(writer, 500, {'error': f'{type(error).__name__}: {error}'})
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        head = await reader.readuntil(b'\r\n\r\n')
+        if len(head) > MAX_REQUEST_BYTES:
+            raise ServiceError(413, 'request headers too large')
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise ServiceError(400, 'malformed request line')
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0) or 0)
+        if length > MAX_REQUEST_BYTES:
+            raise ServiceError(413, 'request body too large')
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), unquote(target.split('?', 1)[0]), headers, body
+
+    def check_access(self, headers):
+        if not is_local_host(headers.get('host', '')):
+            raise ServiceError(403, 'the service only answers requests addressed to localhost')
+        origin = headers.get('origin')
+        if origin is not None and not is_local_host(origin.split('://', 1)[-1]):
+            raise ServiceError(403, f'requests from {origin} are not allowed')
+        scheme, _, token = headers.get('authorization', '').partition(' ')
+        expected = self.token.encode('utf-8')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip().encode('utf-8'), expected):
+            raise ServiceError(401, 'missing or wrong bearer token')
+
+    async def route(self, method, path, headers, body, writer):
+        parts = [part for part in path.split('/') if part]
+        if not parts or parts[0] != 'jobs':
+            raise ServiceError(404, f'no route for {path}')
+        if len(parts) == 1:
+            if method == 'GET':
+                return await self.respond(writer, 200, {'jobs': [job.as_dict() for job in self.service.jobs.values()]})
+            if method == 'POST':
+                if headers.get('content-type', '').split(';')[0].strip().lower() != 'application/json':
+                    raise ServiceError(415, 'the request body must be application/json')
+                try:
+                    request = json.loads(body or b'{}')
+                except ValueError as error:
+                    raise ServiceError(400, f'invalid JSON: {error}')
+                if not isinstance(request, dict):
+                    raise ServiceError(400, 'the request body must be a JSON object')
+                job = self.service.submit(request.get('algorithm'), request.get('parameters', {}))
+                return await self.respond(writer, 202, job.as_dict())
+        elif len(parts) == 2:
+            if method == 'GET':
+                return await self.respond(writer, 200, self.service.get(parts[1]).as_dict())
+            if method == 'DELETE':
+                return await self.respond(writer, 200, self.service.cancel(parts[1]).as_dict())
+        elif len(parts) == 4 and parts[2] == 'outputs' and method == 'GET':
+            return await self.send_output(writer, self.service.get(parts[1]), parts[3])
+        else:
+            raise ServiceError(404, f'no route for {path}')
+        raise ServiceError(405, f'{method} is not allowed on {path}')
+
+    async def send_output(self, writer, job, name):
+        if job.status != SUCCEEDED:
+            raise ServiceError(409, f'job {job.id} is {job.status}')
+        path = job.outputs.get(name)
+        if not isinstance(path, str) or not os.path.isfile(path):
+            raise ServiceError(404, f'output {name} is not a file')
+        writer.write(self.head(200, 'application/octet-stream', os.path.getsize(path),
+                               f'Content-Disposition: attachment; filename="{os.path.basename(path)}"\r\n'))
+        with open(path, 'rb') as output:
+            for chunk in iter(lambda: output.read(STREAM_CHUNK), b''):
+                writer.write(chunk)
+                await writer.drain()
+
+    async def respond(self, writer, status, payload):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        writer.write(self.head(status, 'application/json', len(body)) + body)
+        await writer.drain()
+
+    @staticmethod
+    def head(status, content_type, length, extra=''):
+        return (f'HTTP/1.1 {status} {HTTP_REASONS.get(status, "")}\r\nContent-Type: {content_type}\r\n'
+                f'Content-Length: {length}\r\n{extra}Connection: close\r\n\r\n').encode('latin-1')
+
+
+def is_local_host(host):
+    """Whether a ``Host`` header value (``name[:port]``) names the local host."""
+    host = host.strip().lower()
+    if host.startswith('['):
+        name = host[:host.find(']') + 1]
+    else:
+        name = host.split(':', 1)[0]
+    return name in LOCAL_HOSTS
+
+
+async def serve(service, token, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+    await service.start()
+    handler = HttpHandler(service, token)
+    if unix_socket:
+        server = await asyncio.start_unix_server(handler, path=unix_socket)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local job service for the TNC Carbon Calculator algorithms')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='address to listen on (default: localhost only)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix-socket', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='worker processes')
+    parser.add_argument('--large-slots', type=int,
+                        help='workers that large jobs may use (default: workers - 1); one more worker is started '
+                             'when this leaves none for small jobs')
+    parser.add_argument('--large-job-mb', type=float, default=DEFAULT_LARGE_JOB_BYTES / (1 << 20),
+                        help='input size from which a job is large')
+    parser.add_argument('--max-queued', type=int, default=DEFAULT_MAX_QUEUED, help='queued jobs before refusing new ones')
+    parser.add_argument('--keep-finished', type=int, default=DEFAULT_KEEP_FINISHED,
+                        help='finished jobs kept for GET /jobs (the most recent ones)')
+    parser.add_argument('--finished-ttl-hours', type=float, default=DEFAULT_FINISHED_TTL / 3600,
+                        help='hours a finished job is kept')
+    parser.add_argument('--token', default=os.environ.get(TOKEN_ENVIRONMENT),
+                        help=f'bearer token the clients must send (default: ${TOKEN_ENVIRONMENT}, or a generated one)')
+    args = parser.parse_args(argv)
+    token = args.token
+    if not token:
+        token = secrets.token_urlsafe(32)
+        print(f'{TOKEN_ENVIRONMENT}={token}', file=sys.stderr, flush=True)
+    service = JobService(args.workers, args.large_slots, args.max_queued, int(args.large_job_mb * (1 << 20)),
+                         keep_finished=args.keep_finished, finished_ttl=args.finished_ttl_hours * 3600)
+    try:
+        asyncio.run(serve(service, token, args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import numpy as np
+
+
+class LocalCanopyCover:
+    """Canopy cover rate in a moving window around each pixel, instead of one rate for the whole raster.
+
+    The window is a rectangle of about ``window_size`` (in the raster units)
+    on each side, clipped at the raster edges, and the rate is the share of
+    its valid pixels at or above the threshold. Each strip needs ``halo_y``
+    extra rows above and below (strips are full width, so no column halo is
+    needed), and the window sums come from summed-area tables of the canopy
+    and valid masks: four lookups per pixel, whatever the window size.
+    """
+
+    def __init__(self, threshold, window_size, pixel_width, pixel_height):
+        self.threshold = threshold
+        # Raio em pixels: a janela tem 2 * raio + 1 pixels de lado
+        self.halo_x = max(0, int(round((window_size / abs(pixel_width) - 1) / 2)))
+        self.halo_y = max(0, int(round((window_size / abs(pixel_height) - 1) / 2)))
+
+    def window_pixels(self):
+        return 2 * self.halo_x + 1, 2 * self.halo_y + 1
+
+    def rates(self, window, top, data):
+        """Returns ``(chm, nodata_mask, canopy_cover_rate)`` for the rows of ``window``.
+
+        ``data`` is the strip read from row ``top`` with at least ``halo_y``
+        rows of halo (see ``halo_reader``); the halo rows are dropped.
+        """
+        chm, nodata_mask = data
+        yoff, rows = window
+        start = yoff - top
+        valid = ~nodata_mask
+        canopy = box_sums((chm >= self.threshold) & valid, self.halo_x, self.halo_y, start, rows)
+        pixels = box_sums(valid, self.halo_x, self.halo_y, start, rows)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = np.where(pixels > 0, canopy / pixels, np.nan)
+        return chm[start:start + rows], nodata_mask[start:start + rows], rate
+
+
+def box_sums(values, halo_x, halo_y, row_start, rows):
+    """Sums of ``values`` in the ``(2 * halo_y + 1) x (2 * halo_x + 1)`` box around each pixel of the given rows.
+
+    Boxes are clipped at the array edges. The summed-area table has a zero
+    first row and column, so every box is ``S[y1, x1] - S[y0, x1] - S[y1, x0] + S[y0, x0]``.
+    """
+    height, width = values.shape
+    table = np.zeros((height + 1, width + 1), dtype=np.int64)
+    np.cumsum(np.cumsum(values, axis=0, dtype=np.int64), axis=1, out=table[1:, 1:])
+    y = np.arange(row_start, row_start + rows)
+    y0 = np.clip(y - halo_y, 0, height)[:, None]
+    y1 = np.clip(y + halo_y + 1, 0, height)[:, None]
+    x = np.arange(width)
+    x0 = np.clip(x - halo_x, 0, width)[None, :]
+    x1 = np.clip(x + halo_x + 1, 0, width)[None, :]
+    return table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
@@ -0,0 +1,259 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import ast
+import json
+import re
+
+import numpy as np
+
+try:
+    import tomllib # type: ignore
+except ImportError:
+    tomllib = None
+
+REGISTRY_VERSION = 1
+# Variáveis por pixel disponíveis nas equações: altura do dossel e taxa de cobertura de dossel
+MODEL_VARIABLES = ('chm', 'ccr')
+MODEL_FUNCTIONS = {
+    'exp': np.exp,
+    'log': np.log,
+    'log10': np.log10,
+    'sqrt': np.sqrt,
+    'abs': np.abs,
+    'minimum': np.minimum,
+    'maximum': np.maximum,
+    'where': np.where,
+}
+MODEL_ALGORITHMS = ('chm', 'dtm_dsm')
+MODEL_ID_PATTERN = re.compile(r'^[a-z][a-z0-9_]{0,39}$')
+# Maior expoente inteiro aceito em ``**``: potências como 10**400 estouram os floats
+MAX_INTEGER_EXPONENT = 16
+
+_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+              ast.Load)
+# Pontos usados para reconhecer equações lineares em chm e ccr
+_LINEAR_CHM = np.array([0.0, 1.0, 2.5, 10.0, 35.0])
+_LINEAR_CCR = np.array([0.0, 0.25, 0.5, 1.0])
+
+
+class CarbonModel:
+    """A carbon density equation (ton/ha) of ``chm`` and ``ccr``, compiled once into a vectorized kernel.
+
+    The equation is parsed with ``ast`` and only arithmetic, comparisons,
+    numbers, the declared coefficients and the functions of
+    ``MODEL_FUNCTIONS`` are accepted. Coefficients are folded in as
+    constants and the expression becomes the body of a
+    ``lambda chm, ccr: ...`` compiled at load time, so each window costs one
+    call of NumPy operations over whole arrays: no parsing and no Python
+    code per pixel. ``ccr`` is a scalar with the global canopy cover rate,
+    or an array with the local one.
+
+    ``linear_coefficients`` is ``(intercept, canopy_cover, height)`` when the
+    equation turns out to be ``a + b*ccr + c*chm`` (what the uncertainty and
+    the threshold sweep need), and None otherwise.
+    """
+
+    def __init__(self, model_id, name, equation, coefficients=None, algorithms=MODEL_ALGORITHMS, description=''):
+        if not isinstance(model_id, str) or not MODEL_ID_PATTERN.match(model_id):
+            raise ValueError(f'invalid model id {model_id!r} (lowercase letters, digits and _, starting with a letter)')
+        if not isinstance(equation, str) or not equation.strip():
+            raise ValueError(f'model {model_id}: missing "equation"')
+        self.id = model_id
+        self.name = str(name or model_id)
+        self.description = str(description or '')
+        self.equation = equation.strip()
+        self.coefficients = _coefficients(model_id, coefficients or {})
+        self.algorithms = tuple(algorithms)
+        unknown = set(self.algorithms) - set(MODEL_ALGORITHMS)
+        if unknown or not self.algorithms:
+            raise ValueError(f'model {model_id}: "algorithms" must be a non-empty subset of {list(MODEL_ALGORITHMS)}')
+
+        try:
+            tree = ast.parse(self.equation, mode='eval')
+        except SyntaxError as error:
+            raise ValueError(f'model {model_id}: invalid equation ({error.msg})')
+        names = _validate(model_id, tree.body, self.coefficients)
+        if 'chm' not in names:
+            raise ValueError(f'model {model_id}: the equation must use chm')
+        self.kernel = _compile(model_id, tree.body, self.coefficients)
+        self.linear_coefficients = self._linear_coefficients()
+
+    def signature(self):
+        """Text that changes whenever the equation or a coefficient changes."""
+        return json.dumps([self.equation, self.coefficients], sort_keys=True)
+
+    def _linear_coefficients(self):
+        chm, ccr = np.meshgrid(_LINEAR_CHM, _LINEAR_CCR)
+        with np.errstate(all='ignore'):
+            values = np.broadcast_to(np.asarray(self.kernel(chm, ccr), dtype=np.float64), chm.shape)
+        if not np.all(np.isfinite(values)):
+            return None
+        intercept = values[0, 0]
+        height = values[0, 1] - intercept
+        canopy_cover = (values[-1, 0] - intercept) / _LINEAR_CCR[-1]
+        linear = intercept + canopy_cover * ccr + height * chm
+        if not np.allclose(values, linear, rtol=1e-9, atol=1e-9):
+            return None
+        return float(intercept), float(canopy_cover), float(height)
+
+
+def _coefficients(model_id, coefficients):
+    if not isinstance(coefficients, dict):
+        raise ValueError(f'model {model_id}: "coefficients" must be a table of names and numbers')
+    values = {}
+    for name, value in coefficients.items():
+        if not isinstance(name, str) or not name.isidentifier() or name in MODEL_VARIABLES or name in MODEL_FUNCTIONS:
+            raise ValueError(f'model {model_id}: invalid coefficient name {name!r}')
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+            raise ValueError(f'model {model_id}: coefficient {name} must be a finite number')
+        values[name] = float(value)
+    return values
+
+
+def _validate(model_id, node, coefficients):
+    """Checks every node of the equation against the whitelist; returns the names it uses."""
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.BinOp) and isinstance(child.op, ast.Pow):
+            exponent = _integer_constant(child.right)
+            if exponent is not None and abs(exponent) > MAX_INTEGER_EXPONENT:
+                raise ValueError(f'model {model_id}: integer exponents above {MAX_INTEGER_EXPONENT} are not supported')
+            continue
+        if isinstance(child, (ast.BinOp, ast.UnaryOp)) or isinstance(child, _OPERATORS):
+            continue
+        if isinstance(child, ast.Compare):
+            if len(child.ops) != 1:
+                raise ValueError(f'model {model_id}: chained comparisons are not supported')
+            continue
+        if isinstance(child, ast.Constant) and isinstance(child.value, (int, float)) \
+                and not isinstance(child.value, bool):
+            if not _is_finite(child.value):
+                raise ValueError(f'model {model_id}: the number {child.value:.6g} is out of range')
+            continue
+        if isinstance(child, ast.Call):
+            if not isinstance(child.func, ast.Name) or child.func.id not in MODEL_FUNCTIONS or child.keywords \
+                    or any(isinstance(argument, ast.Starred) for argument in child.args):
+                raise ValueError(f'model {model_id}: only {", ".join(MODEL_FUNCTIONS)} may be called, '
+                                 'with positional arguments')
+            continue
+        if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load):
+            if child.id not in MODEL_VARIABLES and child.id not in coefficients and child.id not in MODEL_FUNCTIONS:
+                raise ValueError(f'model {model_id}: unknown name {child.id!r} in the equation')
+            names.add(child.id)
+            continue
+        raise ValueError(f'model {model_id}: {type(child).__name__} is not allowed in the equation')
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and child.id in MODEL_FUNCTIONS:
+            # Funções só podem aparecer como o alvo de uma chamada
+            if not any(isinstance(call, ast.Call) and call.func is child for call in ast.walk(node)):
+                raise ValueError(f'model {model_id}: {child.id} must be called')
+    return names
+
+
+def _integer_constant(node):
+    """Value of an integer literal (possibly signed), None for anything else."""
+    sign = 1
+    while isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        sign = -sign if isinstance(node.op, ast.USub) else sign
+        node = node.operand
+    if isinstance(node, ast.Constant) and isinstance(node.value, int) and not isinstance(node.value, bool):
+        return sign * node.value
+    return None
+
+
+def _is_finite(value):
+    try:
+        return bool(np.isfinite(float(value)))
+    except OverflowError:
+        return False
+
+
+class _FoldCoefficients(ast.NodeTransformer):
+
+    def __init__(self, coefficients):
+        self.coefficients = coefficients
+
+    def visit_Name(self, node):
+        if node.id in self.coefficients:
+            return ast.copy_location(ast.Constant(self.coefficients[node.id]), node)
+        return node
+
+    def visit_Constant(self, node):
+        # Números como float: expoentes calculados (10**(10**10)) estouram na hora em vez de virar inteiros gigantes
+        return ast.copy_location(ast.Constant(float(node.value)), node)
+
+
+def _compile(model_id, body, coefficients):
+    body = _FoldCoefficients(coefficients).visit(body)
+    arguments = ast.arguments(posonlyargs=[], args=[ast.arg(arg=name) for name in MODEL_VARIABLES], vararg=None,
+                              kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[])
+    function = ast.fix_missing_locations(ast.Expression(ast.Lambda(args=arguments, body=body)))
+    code = compile(function, f'<carbon model {model_id}>', 'eval')
+    # A árvore já foi validada: o namespace só tem as funções permitidas
+    return eval(code, {'__builtins__': {}, **MODEL_FUNCTIONS})
+
+
+def parse_registry(text, syntax='json'):
+    """Models declared in a registry document; returns ``(models, errors)``.
+
+    The document holds a ``models`` list (``[[models]]`` tables in TOML);
+    each entry has ``id``, ``equation`` and optionally ``name``,
+    ``description``, ``coefficients`` and ``algorithms``. Invalid entries
+    are reported in ``errors`` and left out, so one typo does not hide the
+    other models.
+    """
+    if syntax == 'toml':
+        if tomllib is None:
+            return [], ['TOML registries need Python 3.11 or newer (tomllib)']
+        try:
+            document = tomllib.loads(text)
+        except tomllib.TOMLDecodeError as error:
+            return [], [f'invalid TOML: {error}']
+    else:
+        try:
+            document = json.loads(text)
+        except ValueError as error:
+            return [], [f'invalid JSON: {error}']
+    if not isinstance(document, dict) or not isinstance(document.get('models'), list):
+        return [], ['the registry must have a "models" list']
+    try:
+        version = int(document.get('version', REGISTRY_VERSION))
+    except (TypeError, ValueError):
+        return [], [f'invalid registry version {document["version"]!r}']
+    if version > REGISTRY_VERSION:
+        return [], [f'unsupported registry version {version}']
+
+    models = []
+    errors = []
+    seen = set()
+    for entry in document['models']:
+        if not isinstance(entry, dict):
+            errors.append('each model must be a table')
+            continue
+        try:
+            model = CarbonModel(entry.get('id'), entry.get('name'), entry.get('equation'), entry.get('coefficients'),
+                                entry.get('algorithms', MODEL_ALGORITHMS), entry.get('description'))
+        except (TypeError, ValueError) as error:
+            errors.append(str(error))
+            continue
+        except Exception as error:
+            # Ex.: OverflowError ao avaliar a equação; um modelo não pode derrubar o carregamento dos outros
+            errors.append(f'model {entry.get("id")!r}: {type(error).__name__}: {error}')
+            continue
+        if model.id in seen:
+            errors.append(f'model {model.id}: duplicated id')
+            continue
+        seen.add(model.id)
+        models.append(model)
+    return models, errors
+
+
+def load_registry(path):
+    """``parse_registry`` of a ``.json`` or ``.toml`` file."""
+    with open(path, encoding='utf-8') as file:
+        text = file.read()
+    return parse_registry(text, 'toml' if path.lower().endswith('.toml') else 'json')
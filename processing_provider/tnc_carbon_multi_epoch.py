@@ -0,0 +1,331 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import csv
+
+import numpy as np
+
+from qgis.PyQt.QtCore import QCoreApplication # type: ignore
+from qgis.core import (QgsProcessingAlgorithm, # type: ignore
+                       QgsProcessing,
+                       QgsWkbTypes,
+                       QgsProcessingParameterVectorLayer,
+                       QgsProcessingParameterMultipleLayers,
+                       QgsProcessingParameterNumber,
+                       QgsProcessingParameterBoolean,
+                       QgsProcessingParameterString,
+                       QgsProcessingParameterFileDestination,
+                       QgsProcessingException)
+
+from osgeo import gdal, osr # type: ignore
+
+from .tnc_carbon_raster_pipeline import chm_reader, dtm_dsm_reader, raster_windows, run_pipeline
+from .tnc_carbon_zone_raster import rasterize_zones, zone_reader
+
+
+class EpochZoneStats:
+    """Per-epoch accumulators filled in a single pass over co-registered rasters.
+
+    For each epoch it keeps the valid and canopy pixel counts of the whole
+    raster (for the canopy cover rate, as in the single-epoch algorithms)
+    and, per zone, the valid pixel count and the CHM sum. The carbon models
+    are linear in the CHM, so the zone mean density follows from the mean
+    CHM and no per-pixel carbon raster is needed. With ``common_mask`` the
+    zone statistics only use pixels valid in every epoch, so the change is
+    not mixed with differences in coverage.
+    """
+
+    def __init__(self, epochs, zones, threshold, common_mask=True):
+        self.threshold = threshold
+        self.common_mask = common_mask
+        self.zones = zones
+        self.valid = np.zeros(epochs, dtype=np.int64)
+        self.canopy = np.zeros(epochs, dtype=np.int64)
+        self.counts = np.zeros((epochs, zones), dtype=np.int64)
+        self.sums = np.zeros((epochs, zones), dtype=np.float64)
+
+    def partial(self, zone_ids, epochs):
+        """Counts of one window; ``zone_ids`` is None when the whole raster is a single zone."""
+        valid = [~nodata_mask for _, nodata_mask in epochs]
+        common = np.logical_and.reduce(valid) if self.common_mask else None
+        in_zone = None if zone_ids is None else zone_ids >= 0
+        pixels, canopy, counts, sums = [], [], [], []
+        for (chm, _), epoch_valid in zip(epochs, valid):
+            pixels.append(int(np.count_nonzero(epoch_valid)))
+            canopy.append(int(np.count_nonzero((chm >= self.threshold) & epoch_valid)))
+            selected = common if common is not None else epoch_valid
+            if in_zone is not None:
+                selected = selected & in_zone
+            index = zone_ids[selected] if zone_ids is not None else np.zeros(np.count_nonzero(selected), dtype=np.int64)
+            counts.append(np.bincount(index, minlength=self.zones))
+            sums.append(np.bincount(index, weights=chm[selected].astype(np.float64), minlength=self.zones))
+        return pixels, canopy, np.array(counts), np.array(sums)
+
+    def add(self, partial):
+        pixels, canopy, counts, sums = partial
+        self.valid += pixels
+        self.canopy += canopy
+        self.counts += counts
+        self.sums += sums
+
+    def carbon(self, coefficients, pixel_area_m2):
+        """Returns ``(canopy_cover_rate, count, density, carbon_ton)``; the last three are epochs x zones."""
+        intercept, canopy_cover, height = coefficients
+        with np.errstate(divide='ignore', invalid='ignore'):
+            canopy_cover_rate = np.where(self.valid > 0, self.canopy / self.valid, np.nan)
+            mean_chm = np.where(self.counts > 0, self.sums / self.counts, np.nan)
+        density = intercept + canopy_cover * canopy_cover_rate[:, None] + height * mean_chm
+        count = np.where(self.counts > 0, self.counts, np.nan)
+        return canopy_cover_rate, count, density, density * count * pixel_area_m2 / 10000
+
+
+def epoch_change_columns(labels, count, density, carbon_ton, pixel_area_m2, with_total=True):
+    """Per-epoch and per-interval CSV columns, with a last row summing every zone when ``with_total``.
+
+    Intervals are the consecutive epochs and, with three or more epochs,
+    also the first to the last one.
+    """
+    total_count = np.nansum(count, axis=1)
+    total_carbon = np.nansum(carbon_ton, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total_density = np.where(total_count > 0, total_carbon / (total_count * pixel_area_m2 / 10000), np.nan)
+    count = np.column_stack([count, np.where(total_count > 0, total_count, np.nan)])
+    density = np.column_stack([density, total_density])
+    carbon_ton = np.column_stack([carbon_ton, np.where(total_count > 0, total_carbon, np.nan)])
+
+    columns = {}
+    for epoch, label in enumerate(labels):
+        columns[f'Area {label} (ha)'] = count[epoch] * pixel_area_m2 / 10000
+        columns[f'Carbon Density {label} (ton/ha)'] = density[epoch]
+        columns[f'Carbon {label} (ton)'] = carbon_ton[epoch]
+
+    intervals = [(epoch, epoch + 1) for epoch in range(len(labels) - 1)]
+    if len(labels) > 2:
+        intervals.append((0, len(labels) - 1))
+    for start, end in intervals:
+        interval = f'{labels[start]}-{labels[end]}'
+        columns[f'Carbon Density change {interval} (ton/ha)'] = density[end] - density[start]
+        columns[f'Carbon change {interval} (ton)'] = carbon_ton[end] - carbon_ton[start]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            columns[f'Carbon change {interval} (%)'] = np.where(
+                carbon_ton[start] != 0, (carbon_ton[end] - carbon_ton[start]) / np.abs(carbon_ton[start]) * 100, np.nan)
+    if not with_total:
+        return {name: values[:-1] for name, values in columns.items()}
+    return columns
+
+
+def write_epoch_csv(csv_path, ids, columns):
+    with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['ID'] + list(columns))
+        cells = []
+        for values in columns.values():
+            column = values.astype(object)
+            column[np.isnan(values)] = None
+            cells.append(column.tolist())
+        writer.writerows([feature_id] + list(row) for feature_id, row in zip(ids.tolist(), zip(*cells)))
+
+
+class TNC_Carbon_Multi_Epoch(QgsProcessingAlgorithm):
+    """Carbon per epoch and carbon change per polygon from a time-ordered stack of CHMs (or DTM/DSM pairs).
+
+    Every epoch is read window by window in the same pass, next to a zone
+    raster rasterized once, so the polygons are only burned a single time.
+    The biome (group and model coefficients) comes from ``biome_algorithm``,
+    one of the single-epoch CHM algorithms.
+    """
+    INPUT_CHMS = 'INPUT_CHMS'
+    INPUT_DTMS = 'INPUT_DTMS'
+    INPUT_DSMS = 'INPUT_DSMS'
+    INPUT_EPOCH_LABELS = 'INPUT_EPOCH_LABELS'
+    INPUT_POLYGON = 'INPUT_POLYGON'
+    INPUT_CANOPY_COVER_THRESHOLD = 'INPUT_CANOPY_COVER_THRESHOLD'
+    INPUT_COMMON_MASK = 'INPUT_COMMON_MASK'
+    OUTPUT_CSV = 'OUTPUT_CSV'
+
+    def __init__(self, biome_algorithm):
+        super().__init__()
+        self.biome_algorithm = biome_algorithm
+        self.biome = biome_algorithm()
+        self.MODEL_COEFFICIENTS = biome_algorithm.MODEL_COEFFICIENTS
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(
+            QgsProcessingParameterMultipleLayers(
+                self.INPUT_CHMS,
+                self.tr('Canopy height model rasters (CHM), oldest first'),
+                QgsProcessing.TypeRaster,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterMultipleLayers(
+                self.INPUT_DTMS,
+                self.tr('Digital terrain model rasters (DTM), oldest first'),
+                QgsProcessing.TypeRaster,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterMultipleLayers(
+                self.INPUT_DSMS,
+                self.tr('Digital surface model rasters (DSM), same order as the DTMs'),
+                QgsProcessing.TypeRaster,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterString(
+                self.INPUT_EPOCH_LABELS,
+                self.tr('Epoch labels, comma separated (default = layer names)'),
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterVectorLayer(
+                self.INPUT_POLYGON,
+                self.tr('Polygon layer'),
+                [QgsWkbTypes.PolygonGeometry],
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.INPUT_CANOPY_COVER_THRESHOLD,
+                self.tr('Canopy cover threshold (default = 2.0m)'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=2.0,
+                optional=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.INPUT_COMMON_MASK,
+                self.tr('Compare polygons only over pixels valid in every epoch'),
+                defaultValue=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_CSV,
+                self.tr('Output CSV file'),
+                'CSV files (*.csv)'
+            )
+        )
+
+    def processAlgorithm(self, parameters, context, feedback):
+        chm_layers = self.parameterAsLayerList(parameters, self.INPUT_CHMS, context)
+        dtm_layers = self.parameterAsLayerList(parameters, self.INPUT_DTMS, context)
+        dsm_layers = self.parameterAsLayerList(parameters, self.INPUT_DSMS, context)
+        polygon_layer = self.parameterAsVectorLayer(parameters, self.INPUT_POLYGON, context)
+        canopy_cover_threshold = self.parameterAsDouble(parameters, self.INPUT_CANOPY_COVER_THRESHOLD, context)
+        common_mask = self.parameterAsBoolean(parameters, self.INPUT_COMMON_MASK, context)
+        csv_path = self.parameterAsFileOutput(parameters, self.OUTPUT_CSV, context)
+
+        if chm_layers and (dtm_layers or dsm_layers):
+            raise QgsProcessingException(self.tr('Provide either CHM rasters or DTM/DSM pairs, not both'))
+        if len(dtm_layers) != len(dsm_layers):
+            raise QgsProcessingException(self.tr('The number of DTM and DSM rasters must be the same'))
+        layers = chm_layers or dtm_layers
+        if len(layers) < 2:
+            raise QgsProcessingException(self.tr('At least two epochs are required'))
+
+        labels = [label.strip() for label in
+                  self.parameterAsString(parameters, self.INPUT_EPOCH_LABELS, context).split(',') if label.strip()]
+        if not labels:
+            labels = [layer.name() for layer in layers]
+        if len(labels) != len(layers):
+            raise QgsProcessingException(
+                self.tr('Expected {} epoch labels, got {}').format(len(layers), len(labels)))
+
+        # Os datasets ficam abertos durante toda a passada; apenas a thread de leitura os acessa
+        datasets = [gdal.Open(layer.source()) for layer in list(chm_layers) + list(dtm_layers) + list(dsm_layers)]
+        reference_ds = datasets[0]
+        self.checkCoregistered(reference_ds, datasets, feedback)
+        if chm_layers:
+            readers = [chm_reader(dataset.GetRasterBand(1)) for dataset in datasets]
+        else:
+            epochs = len(dtm_layers)
+            readers = [dtm_dsm_reader(dtm_ds.GetRasterBand(1), dsm_ds.GetRasterBand(1))
+                       for dtm_ds, dsm_ds in zip(datasets[:epochs], datasets[epochs:])]
+
+        projection = reference_ds.GetProjection()
+        geotransform = reference_ds.GetGeoTransform()
+        linear_units_factor = osr.SpatialReference(wkt=projection).GetLinearUnits()
+        pixel_area_m2 = abs(geotransform[1] * geotransform[5]) * (linear_units_factor ** 2)
+
+        # Rasterização única dos polígonos, lida em janelas junto com as épocas
+        read_zones = None
+        if polygon_layer is not None:
+            zones_ds, ids = rasterize_zones(polygon_layer, reference_ds, context, feedback)
+            read_zones = zone_reader(zones_ds.GetRasterBand(1))
+        else:
+            ids = np.array([-1], dtype=np.int64)
+        if feedback.isCanceled():
+            return {}
+
+        stats = EpochZoneStats(len(layers), ids.size, canopy_cover_threshold, common_mask)
+
+        def read(window):
+            return (read_zones(window) if read_zones is not None else None), [reader(window) for reader in readers]
+
+        def compute(window, data):
+            zone_ids, epochs = data
+            return stats.partial(zone_ids, epochs)
+
+        feedback.pushInfo(f'Processando {len(layers)} épocas em uma única passada')
+        run_pipeline(raster_windows(reference_ds.GetRasterBand(1)), read, compute,
+                     lambda window, partial: stats.add(partial), feedback=feedback, progress=(0, 100))
+        if feedback.isCanceled():
+            return {}
+
+        canopy_cover_rate, count, density, carbon_ton = stats.carbon(self.MODEL_COEFFICIENTS, pixel_area_m2)
+        for label, rate in zip(labels, canopy_cover_rate):
+            feedback.pushInfo(f'Taxa de cobertura de dossel em {label}: {rate:.4f}')
+        if polygon_layer is not None:
+            for feature_id in ids[np.all(np.isnan(count), axis=0)]:
+                feedback.pushWarning(f"Feature {feature_id} não cobre nenhum pixel da camada")
+            ids = np.append(ids, -1)
+        # Sem polígonos o raster inteiro é a única zona, sem linha de total
+        columns = epoch_change_columns(labels, count, density, carbon_ton, pixel_area_m2,
+                                       with_total=polygon_layer is not None)
+        write_epoch_csv(csv_path, ids, columns)
+
+        return {self.OUTPUT_CSV: csv_path}
+
+    def checkCoregistered(self, reference_ds, datasets, feedback):
+        reference_srs = osr.SpatialReference(wkt=reference_ds.GetProjection())
+        reference_geotransform = np.array(reference_ds.GetGeoTransform())
+        for dataset in datasets[1:]:
+            if (dataset.RasterXSize, dataset.RasterYSize) != (reference_ds.RasterXSize, reference_ds.RasterYSize):
+                raise QgsProcessingException(
+                    self.tr('Raster {} does not have the same size as {}').format(
+                        dataset.GetDescription(), reference_ds.GetDescription()))
+            if not np.allclose(dataset.GetGeoTransform(), reference_geotransform, rtol=0,
+                               atol=1e-6 * abs(reference_geotransform[1])):
+                raise QgsProcessingException(
+                    self.tr('Raster {} is not aligned with {}').format(
+                        dataset.GetDescription(), reference_ds.GetDescription()))
+            if not reference_srs.IsSame(osr.SpatialReference(wkt=dataset.GetProjection())):
+                feedback.pushWarning(f'O sistema de coordenadas de {dataset.GetDescription()} difere da primeira época')
+
+    def name(self):
+        return f'{self.biome.groupId()}multiepoch'
+
+    def displayName(self):
+        return self.tr('Multi-epoch carbon change (CHM or DTM/DSM stack)')
+
+    def group(self):
+        return self.biome.group()
+
+    def groupId(self):
+        return self.biome.groupId()
+
+    def tr(self, string):
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        return TNC_Carbon_Multi_Epoch(self.biome_algorithm)
@@ -0,0 +1,495 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+# Este módulo não pode importar o QGIS: ele é carregado pelos processos filhos.
+
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .tnc_carbon_point_cloud_metrics import StreamingHeightMetrics
+from .tnc_carbon_point_cloud_io import (DEFAULT_CHUNK_SIZE, bbox_intersects, iter_las_chunks, iter_las_points_at,
+                                        las_point_count, las_point_ranges, single_threaded_laz, union_bbox)
+from .tnc_carbon_point_cloud_catalog import TileCatalog
+from .tnc_carbon_point_cloud_normalize import HeightNormalizer, ground_mask
+from .tnc_carbon_point_cloud_decimation import DensityThinner
+
+
+def accumulate_regions(path, regions, normalizer=None, target_density=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                       record_membership=False, unit_area=1.0, feedback=None):
+    """Reads ``path`` once and returns an ``(accumulator, thinner)`` pair per region.
+
+    With ``record_membership`` the file offsets of the points inside each
+    region are returned as well (``None`` otherwise), to build the index cache.
+    Thinning and the ground TIN (unless ``normalizer`` is already prepared)
+    each add a pass over the file. ``feedback`` receives the progress and
+    stops the scan when canceled.
+    """
+    accumulators = [StreamingHeightMetrics() for _ in regions]
+    thinners = [DensityThinner(target_density, region.bbox, unit_area) for region in regions]
+    membership = [[] for _ in regions] if record_membership else None
+    if not regions:
+        return [], membership
+    normalizer = normalizer or HeightNormalizer()
+    if not normalizer.is_prepared:
+        normalizer.prepare(iter_las_chunks(path, chunk_size), union_bbox(regions))
+    progress = None
+    if feedback is not None:
+        progress = _ScanProgress(feedback, las_point_count(path) * _passes(thinners))
+    _scan_file(path, regions, range(len(regions)), accumulators, thinners, normalizer, chunk_size, membership,
+               progress=progress)
+    if membership is not None:
+        membership = [np.concatenate(parts) if parts else np.empty(0, dtype=np.int64) for parts in membership]
+    return list(zip(accumulators, thinners)), membership
+
+
+def accumulate_catalog_regions(catalog, regions, normalizer=None, target_density=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                               unit_area=1.0, feedback=None):
+    """Same as :func:`accumulate_regions` over a :class:`TileCatalog`.
+
+    Only the tiles whose header bounds intersect a region are opened, and each
+    tile is scanned only for the regions that touch it. The accumulators are
+    shared between tiles, so polygons that straddle tile edges are seamless.
+    """
+    accumulators = [StreamingHeightMetrics() for _ in regions]
+    thinners = [DensityThinner(target_density, region.bbox, unit_area) for region in regions]
+    if not regions:
+        return [], None
+    normalizer = normalizer or HeightNormalizer()
+    bbox = union_bbox(regions)
+    if not normalizer.is_prepared:
+        normalizer.prepare(catalog.iter_chunks(bbox, chunk_size), bbox)
+    tiles = catalog_parts(catalog, regions)
+    progress = None
+    if feedback is not None:
+        progress = _ScanProgress(feedback, sum(points for _, _, points in tiles) * _passes(thinners))
+    if any(thinner.needs_count_pass for thinner in thinners):
+        for path, touching, _ in tiles:
+            _count_file(path, regions, touching, thinners, normalizer, chunk_size, progress=progress)
+    for path, touching, _ in tiles:
+        _scan_file(path, regions, touching, accumulators, thinners, normalizer, chunk_size, counted=True,
+                   progress=progress)
+    return list(zip(accumulators, thinners)), None
+
+
+def catalog_parts(catalog, regions):
+    """``(path, positions, point_count)`` of every tile of ``catalog`` touching a region, with the regions it touches."""
+    parts = []
+    for tile in catalog.tiles:
+        touching = [position for position, region in enumerate(regions) if bbox_intersects(tile['bounds'], region.bbox)]
+        if touching:
+            parts.append((tile['path'], touching, tile['point_count']))
+    return parts
+
+
+def _region_points(path, regions, positions, normalizer, chunk_size, start=0, stop=None, progress=None):
+    """Yields ``(position, chunk, heights, members, offsets)`` for each chunk of ``path`` and each region in it.
+
+    ``members`` are the indices in ``chunk`` of the points inside the region
+    and ``offsets`` their offsets in the file. Only the points from ``start``
+    to ``stop`` are read.
+    """
+    xmin, ymin, xmax, ymax = union_bbox([regions[position] for position in positions])
+    offset = start
+    for chunk in iter_las_chunks(path, chunk_size, start=start, stop=stop):
+        if progress is not None:
+            if progress.canceled:
+                return
+            progress.advance(chunk['x'].size)
+        x, y = chunk['x'], chunk['y']
+        chunk_offset = offset
+        offset += x.size
+        near = np.flatnonzero((x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax))
+        if near.size == 0:
+            continue
+        chunk = {key: values[near] for key, values in chunk.items()}
+        heights = normalizer.normalize(chunk)
+        # Pontos ordenados por x: cada polígono testa só a faixa de x do seu bbox, não o bloco inteiro
+        order = np.argsort(chunk['x'], kind='stable')
+        sorted_x = chunk['x'][order]
+        for position in positions:
+            region = regions[position]
+            first = np.searchsorted(sorted_x, region.bbox[0], side='left')
+            last = np.searchsorted(sorted_x, region.bbox[2], side='right')
+            if first == last:
+                continue
+            candidates = np.sort(order[first:last])
+            members = candidates[region.contains(chunk['x'][candidates], chunk['y'][candidates])]
+            if members.size:
+                yield position, chunk, heights, members, chunk_offset + near[members]
+
+
+def _count_file(path, regions, positions, thinners, normalizer, chunk_size, start=0, stop=None, progress=None):
+    # Primeira passada da decimação: pontos válidos (após o filtro de altura) por célula
+    for position, chunk, heights, members, _ in _region_points(path, regions, positions, normalizer, chunk_size,
+                                                               start, stop, progress):
+        valid = members[np.isfinite(heights[members])]
+        thinners[position].count(chunk['x'][valid], chunk['y'][valid])
+
+
+def _scan_file(path, regions, positions, accumulators, thinners, normalizer, chunk_size, membership=None,
+               counted=False, start=0, stop=None, progress=None):
+    if not counted and any(thinners[position].needs_count_pass for position in positions):
+        _count_file(path, regions, positions, thinners, normalizer, chunk_size, start, stop, progress)
+    for position, chunk, heights, members, offsets in _region_points(path, regions, positions, normalizer, chunk_size,
+                                                                     start, stop, progress):
+        if membership is not None:
+            membership[position].append(offsets)
+        valid = members[np.isfinite(heights[members])]
+        keep = thinners[position].thin(chunk['x'][valid], chunk['y'][valid], chunk['z'][valid])
+        accumulators[position].update(heights[valid[keep]])
+
+
+def accumulate_indexed_regions(path, index, positions, regions, normalizer=None, target_density=None,
+                               chunk_size=DEFAULT_CHUNK_SIZE, unit_area=1.0, feedback=None):
+    """Same as :func:`accumulate_regions`, reading only the points listed in a membership index.
+
+    The offsets of the whole batch are merged and read in one ordered pass,
+    so points shared by the batch are decoded once and no polygon test runs.
+    A ground TIN is built from the ground points recorded in the index (see
+    :func:`accumulate_regions_batched`), so it matches the one of the run that
+    wrote the index; ``normalizer`` must come prepared when the index has none.
+    """
+    accumulators = [StreamingHeightMetrics() for _ in regions]
+    thinners = [DensityThinner(target_density, region.bbox, unit_area) for region in regions]
+    if not regions:
+        return [], None
+    normalizer = normalizer or HeightNormalizer()
+    if not normalizer.is_prepared:
+        if not index.has_ground():
+            raise ValueError('The membership index has no ground points; prepare the normalizer first')
+        normalizer.prepare(iter_las_points_at(path, index.ground_indices(), chunk_size))
+    parts = [index.region_indices(position) for position in positions]
+    offsets = np.concatenate(parts)
+    labels = np.repeat(np.arange(len(parts)), [part.size for part in parts])
+    order = np.argsort(offsets, kind='stable')
+    offsets = offsets[order]
+    labels = labels[order]
+    progress = _ScanProgress(feedback, offsets.size * _passes(thinners)) if feedback is not None else None
+
+    def labelled_points():
+        cursor = 0
+        for chunk in iter_las_points_at(path, offsets, chunk_size):
+            if progress is not None:
+                if progress.canceled:
+                    return
+                progress.advance(chunk['x'].size)
+            # Os pontos chegam na mesma ordem de offsets, então os rótulos são lidos em sequência
+            chunk_labels = labels[cursor:cursor + chunk['x'].size]
+            cursor += chunk['x'].size
+            heights = normalizer.normalize(chunk)
+            for label in np.unique(chunk_labels):
+                members = np.flatnonzero((chunk_labels == label) & np.isfinite(heights))
+                yield label, chunk, heights, members
+
+    if any(thinner.needs_count_pass for thinner in thinners):
+        for label, chunk, _, members in labelled_points():
+            thinners[label].count(chunk['x'][members], chunk['y'][members])
+    for label, chunk, heights, members in labelled_points():
+        keep = thinners[label].thin(chunk['x'][members], chunk['y'][members], chunk['z'][members])
+        accumulators[label].update(heights[members[keep]])
+    return list(zip(accumulators, thinners)), None
+
+
+class _ScanProgress:
+    """Share of the points read by a sequential scan, reported to a QGIS feedback."""
+
+    def __init__(self, feedback, total):
+        self.feedback = feedback
+        self.total = max(total, 1)
+        self.read = 0
+
+    @property
+    def canceled(self):
+        return self.feedback.isCanceled()
+
+    def advance(self, points):
+        self.read += points
+        self.feedback.setProgress(min(100.0, 100 * self.read / self.total))
+
+
+def _passes(thinners):
+    return 2 if any(thinner.needs_count_pass for thinner in thinners) else 1
+
+
+def spatial_batches(regions, batch_count):
+    """Splits region indices into ``batch_count`` spatially compact groups.
+
+    Regions are ordered along a Z-order (Morton) curve of their bbox centres,
+    so each worker gets neighbouring polygons and scans a small area.
+    """
+    if not regions:
+        return []
+    boxes = np.array([region.bbox for region in regions], dtype=np.float64)
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    qx = _quantize(cx)
+    qy = _quantize(cy)
+    order = np.argsort(_interleave_bits(qx) | (_interleave_bits(qy) << 1), kind='stable')
+    batch_count = max(1, min(batch_count, len(regions)))
+    return [batch.tolist() for batch in np.array_split(order, batch_count)]
+
+
+def count_part(path, start, stop, regions, positions, normalizer, target_density, unit_area, chunk_size):
+    """First pass of a part (a point range of ``path``): thinning counts of the ``positions`` regions seen in it."""
+    thinners = {position: DensityThinner(target_density, regions[position].bbox, unit_area) for position in positions}
+    _count_file(path, regions, positions, thinners, normalizer, chunk_size, start, stop)
+    return {position: thinner for position, thinner in thinners.items() if thinner.enabled}
+
+
+def scan_part(path, start, stop, regions, positions, thinners, normalizer, chunk_size, record_membership=False):
+    """Second pass of a part: ``{position: (accumulator, thinner, offsets)}`` of the regions with points in it.
+
+    ``thinners`` already hold the counts of the whole source; the returned
+    thinners only carry the point totals of this part.
+    """
+    accumulators = {position: StreamingHeightMetrics() for position in positions}
+    membership = {position: [] for position in positions} if record_membership else None
+    _scan_file(path, regions, positions, accumulators, thinners, normalizer, chunk_size, membership, True, start, stop)
+    output = {}
+    for position in positions:
+        offsets = None
+        if membership is not None:
+            parts = membership[position]
+            offsets = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        if thinners[position].original_count or (offsets is not None and offsets.size):
+            output[position] = (accumulators[position], thinners[position], offsets)
+    return output
+
+
+def accumulate_regions_batched(source, regions, workers=1, normalizer=None, target_density=None, feedback=None,
+                               chunk_size=DEFAULT_CHUNK_SIZE, index=None, unit_area=1.0):
+    """Computes the metrics of every region, in a process pool when ``workers > 1``.
+
+    ``source`` is a LAS/LAZ path or a :class:`TileCatalog`. With one worker the
+    source is scanned once for all the regions (only the intersecting tiles
+    for a catalog), or only the indexed points are read when ``index`` (a
+    :class:`MembershipIndex`, single files only) is valid. When ``index`` is
+    given but stale, the scan records the membership and rewrites it.
+
+    With several workers the source itself is split, so every point is still
+    decoded once: a file into ranges of points (:func:`las_point_ranges`), a
+    catalog into its tiles. Each part returns partial accumulators that are
+    merged here, and thinning runs a parallel counting pass whose merged
+    counts are sent to the second pass. A valid index is read in spatial
+    batches of regions.
+
+    The ground TIN is built here, once, from the ground points within
+    ``TIN_MARGIN`` of all the regions. The index records the offsets of those
+    points, so a run reading the index builds the same TIN as the run that
+    wrote it (an index written without them gets them on the first TIN run).
+
+    The results are returned in the same order as ``regions``, or ``None``
+    when ``feedback`` is canceled.
+    """
+    path = source
+    if isinstance(source, TileCatalog):
+        index = None
+    use_index = index is not None and index.is_valid()
+    record = index is not None and not use_index
+    normalizer = normalizer or HeightNormalizer()
+    ground = None
+    if normalizer.needs_ground_pass and regions:
+        ground = _prepare_ground(source, regions, normalizer, index if use_index else None, record, chunk_size)
+        if feedback is not None and feedback.isCanceled():
+            return None
+        if use_index and ground is not None:
+            index.save_ground(ground)
+    if workers <= 1 or use_index:
+        results, membership = _accumulate_region_batches(source, regions, workers, normalizer, target_density,
+                                                         feedback, chunk_size, index if use_index else None,
+                                                         record, unit_area)
+    else:
+        results, membership = _accumulate_source_parts(source, regions, workers, normalizer, target_density,
+                                                       feedback, chunk_size, record, unit_area)
+    if results is None:
+        return None
+    if record and all(indices is not None for indices in membership):
+        index.save(membership, las_point_count(path), ground)
+    return results
+
+
+def _prepare_ground(source, regions, normalizer, index, record, chunk_size):
+    # Monta o TIN de solo de todas as regiões; devolve os offsets dos pontos de solo quando o índice precisa deles
+    bbox = union_bbox(regions)
+    if isinstance(source, TileCatalog):
+        normalizer.prepare(source.iter_chunks(bbox, chunk_size), bbox)
+        return None
+    if index is not None and index.has_ground():
+        normalizer.prepare(iter_las_points_at(source, index.ground_indices(), chunk_size))
+        return None
+    if index is None and not record:
+        normalizer.prepare(iter_las_chunks(source, chunk_size), bbox)
+        return None
+    ground = []
+
+    def recorded(chunks):
+        offset = 0
+        for chunk in chunks:
+            ground.append(offset + np.flatnonzero(ground_mask(chunk, bbox)))
+            offset += chunk['x'].size
+            yield chunk
+
+    normalizer.prepare(recorded(iter_las_chunks(source, chunk_size)), bbox)
+    return np.concatenate(ground) if ground else np.empty(0, dtype=np.int64)
+
+
+def _accumulate_region_batches(source, regions, workers, normalizer, target_density, feedback, chunk_size, index,
+                               record, unit_area):
+    # Lotes de polígonos: um único lote em sequência, ou lotes espaciais lidos pelo índice em paralelo
+    batches = spatial_batches(regions, workers * 2) if workers > 1 else [list(range(len(regions)))]
+    results = [None] * len(regions)
+    membership = [None] * len(regions)
+    # Só o caminho sequencial recebe o feedback; nos processos filhos ele não existe
+    local_feedback = feedback if workers <= 1 else None
+
+    def job(batch):
+        subset = [regions[i] for i in batch]
+        if isinstance(source, TileCatalog):
+            return accumulate_catalog_regions, (source, subset, normalizer, target_density, chunk_size, unit_area,
+                                                local_feedback)
+        if index is not None:
+            return accumulate_indexed_regions, (source, index, batch, subset, normalizer, target_density, chunk_size,
+                                                unit_area, local_feedback)
+        return accumulate_regions, (source, subset, normalizer, target_density, chunk_size, record, unit_area,
+                                    local_feedback)
+
+    def collect(batch, output):
+        batch_results, batch_membership = output
+        for position, result in zip(batch, batch_results):
+            results[position] = result
+        for position, indices in zip(batch, batch_membership or []):
+            membership[position] = indices
+
+    if workers <= 1:
+        for batch in batches:
+            function, arguments = job(batch)
+            collect(batch, function(*arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(),
+                                 initializer=single_threaded_laz) as executor:
+            futures = {}
+            for batch in batches:
+                function, arguments = job(batch)
+                futures[executor.submit(function, *arguments)] = batch
+            for done, future in enumerate(as_completed(futures), 1):
+                if feedback is not None and feedback.isCanceled():
+                    _cancel(futures)
+                    return None, None
+                collect(futures[future], future.result())
+                if feedback is not None:
+                    feedback.setProgress(100 * done / len(futures))
+    if feedback is not None and feedback.isCanceled():
+        return None, None
+    return results, membership
+
+
+def _accumulate_source_parts(source, regions, workers, normalizer, target_density, feedback, chunk_size, record,
+                             unit_area):
+    # Partes da fonte: faixas de pontos de um arquivo ou tiles de um catálogo, cada uma decodificada uma só vez
+    accumulators = [StreamingHeightMetrics() for _ in regions]
+    thinners = [DensityThinner(target_density, region.bbox, unit_area) for region in regions]
+    if not regions:
+        return [], []
+    if isinstance(source, TileCatalog):
+        parts = [(path, 0, None, touching) for path, touching, _ in catalog_parts(source, regions)]
+    else:
+        every = list(range(len(regions)))
+        parts = [(source, start, stop, every) for start, stop in las_point_ranges(source, workers * 2)]
+    membership = [[None] * len(parts) for _ in regions] if record else None
+    passes = _passes(thinners)
+
+    totals = [DensityThinner() for _ in regions]
+    # O normalizador já chega preparado: os processos leem os tiles do TIN gravados em disco
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(),
+                             initializer=single_threaded_laz) as executor:
+        if passes == 2:
+            jobs = [(path, start, stop, regions, positions, normalizer, target_density, unit_area, chunk_size)
+                    for path, start, stop, positions in parts]
+            for _, counted in _run_parts(executor, count_part, jobs, feedback, 0, passes):
+                for position, thinner in counted.items():
+                    thinners[position].merge_counts(thinner)
+            if feedback is not None and feedback.isCanceled():
+                return None, None
+        jobs = [(path, start, stop, regions, positions, {position: thinners[position] for position in positions},
+                 normalizer, chunk_size, record) for path, start, stop, positions in parts]
+        for number, scanned in _run_parts(executor, scan_part, jobs, feedback, passes - 1, passes):
+            for position, (accumulator, thinner, offsets) in scanned.items():
+                accumulators[position].merge(accumulator)
+                totals[position].merge(thinner)
+                if membership is not None:
+                    membership[position][number] = offsets
+        if feedback is not None and feedback.isCanceled():
+            return None, None
+
+    for thinner, total in zip(thinners, totals):
+        thinner.original_count, thinner.kept_count = total.original_count, total.kept_count
+    if membership is not None:
+        # As faixas estão em ordem de offset, então a concatenação mantém os offsets ordenados
+        membership = [np.concatenate([offsets for offsets in parts if offsets is not None] or
+                                     [np.empty(0, dtype=np.int64)]) for parts in membership]
+    return list(zip(accumulators, thinners)), membership
+
+
+def _run_parts(executor, function, jobs, feedback, done_passes, passes):
+    # Entrega (número do job, resultado) na ordem de término; para ao cancelar
+    futures = {executor.submit(function, *arguments): number for number, arguments in enumerate(jobs)}
+    for done, future in enumerate(as_completed(futures), 1):
+        if feedback is not None and feedback.isCanceled():
+            _cancel(futures)
+            return
+        yield futures[future], future.result()
+        if feedback is not None:
+            feedback.setProgress(100 * (done_passes + done / len(futures)) / passes)
+
+
+def _cancel(futures):
+    for pending in futures:
+        pending.cancel()
+
+
+def pool_context():
+    context = multiprocessing.get_context('spawn')
+    # Dentro do QGIS, sys.executable aponta para o executável do QGIS e não para o Python
+    context.set_executable(python_executable())
+    return context
+
+
+def python_executable():
+    name = os.path.basename(sys.executable).lower()
+    if name.startswith('python'):
+        return sys.executable
+    candidates = [
+        os.path.join(sys.exec_prefix, 'python.exe'),
+        os.path.join(sys.exec_prefix, 'bin', 'python3'),
+        os.path.join(sys.exec_prefix, 'bin', 'python'),
+    ]
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return sys.executable
+
+
+def _quantize(values):
+    finite = np.isfinite(values)
+    if not finite.any():
+        return np.zeros(values.shape, dtype=np.uint64)
+    low, high = values[finite].min(), values[finite].max()
+    values = np.where(finite, values, low)
+    span = high - low if high > low else 1.0
+    return ((values - low) / span * 0xFFFF).astype(np.uint64)
+
+
+def _interleave_bits(values):
+    values = values & np.uint64(0xFFFF)
+    values = (values | (values << np.uint64(8))) & np.uint64(0x00FF00FF)
+    values = (values | (values << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+    values = (values | (values << np.uint64(2))) & np.uint64(0x33333333)
+    values = (values | (values << np.uint64(1))) & np.uint64(0x55555555)
+    return values
@@ -0,0 +1,119 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+# Este módulo não pode importar o QGIS: ele é carregado pelos processos filhos.
+
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+
+from .tnc_carbon_point_cloud_io import DEFAULT_CHUNK_SIZE, LAS_EXTENSIONS, bbox_intersects, iter_las_chunks, laspy
+
+CATALOG_INDEX_NAME = 'tnccc_tile_index.json'
+CATALOG_INDEX_VERSION = 1
+
+
+class TileCatalog:
+    """Folder of LAS/LAZ tiles with a cached index of their header bounds.
+
+    Headers are read once and stored in ``tnccc_tile_index.json`` inside the
+    folder (or in the temp dir when the folder is read-only). Later runs only
+    re-read the headers of tiles whose size or modification time changed.
+    """
+
+    def __init__(self, folder):
+        self.folder = os.path.abspath(folder)
+        self.tiles = []
+        self.crs_wkt = None
+
+    @classmethod
+    def open(cls, folder):
+        catalog = cls(folder)
+        catalog._load()
+        return catalog
+
+    @property
+    def extent(self):
+        if not self.tiles:
+            return None
+        bounds = [tile['bounds'] for tile in self.tiles]
+        return (min(b[0] for b in bounds), min(b[1] for b in bounds),
+                max(b[2] for b in bounds), max(b[3] for b in bounds))
+
+    @property
+    def point_count(self):
+        return sum(tile['point_count'] for tile in self.tiles)
+
+    def tiles_for(self, bbox):
+        """Paths of the tiles whose header bounds intersect ``bbox``."""
+        return [tile['path'] for tile in self.tiles if bbox_intersects(tile['bounds'], bbox)]
+
+    def iter_chunks(self, bbox=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        paths = self.tiles_for(bbox) if bbox is not None else [tile['path'] for tile in self.tiles]
+        return itertools.chain.from_iterable(iter_las_chunks(path, chunk_size) for path in paths)
+
+    def _index_path(self):
+        if os.access(self.folder, os.W_OK):
+            return os.path.join(self.folder, CATALOG_INDEX_NAME)
+        key = hashlib.sha1(self.folder.encode('utf-8')).hexdigest()[:20]
+        return os.path.join(tempfile.gettempdir(), f'tnccc_tile_index_{key}.json')
+
+    def _load(self):
+        cached = {}
+        index_path = self._index_path()
+        try:
+            with open(index_path, encoding='utf-8') as file:
+                data = json.load(file)
+            if data.get('version') == CATALOG_INDEX_VERSION:
+                cached = {tile['name']: tile for tile in data.get('tiles', [])}
+                self.crs_wkt = data.get('crs_wkt')
+        except (OSError, ValueError):
+            pass
+
+        changed = False
+        for name in sorted(os.listdir(self.folder)):
+            if not name.lower().endswith(LAS_EXTENSIONS):
+                continue
+            path = os.path.join(self.folder, name)
+            stat = os.stat(path)
+            tile = cached.get(name)
+            if tile is None or tile['size'] != stat.st_size or tile['mtime_ns'] != stat.st_mtime_ns:
+                tile = self._read_header(name, path, stat)
+                changed = True
+            tile['path'] = path
+            self.tiles.append(tile)
+        if len(self.tiles) != len(cached):
+            changed = True
+
+        if changed:
+            try:
+                with open(index_path, 'w', encoding='utf-8') as file:
+                    json.dump({
+                        'version': CATALOG_INDEX_VERSION,
+                        'crs_wkt': self.crs_wkt,
+                        'tiles': [{key: value for key, value in tile.items() if key != 'path'} for tile in self.tiles],
+                    }, file)
+            except OSError:
+                pass
+
+    def _read_header(self, name, path, stat):
+        with laspy.open(path) as reader:
+            header = reader.header
+            if self.crs_wkt is None:
+                try:
+                    crs = header.parse_crs()
+                    self.crs_wkt = crs.to_wkt() if crs is not None else None
+                except Exception:
+                    self.crs_wkt = None
+            return {
+                'name': name,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'bounds': [float(header.mins[0]), float(header.mins[1]), float(header.maxs[0]), float(header.maxs[1])],
+                'point_count': int(header.point_count),
+            }
@@ -0,0 +1,148 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+# Este módulo não pode importar o QGIS: ele é carregado pelos processos filhos.
+
+import math
+
+import numpy as np
+
+from .tnc_carbon_point_cloud_io import PointGrid
+
+# Área mínima (em m²) de uma célula de decimação
+MIN_CELL_AREA = 1.0
+# Número máximo de células da grade de decimação; acima disso as células crescem
+MAX_THINNING_CELLS = 1 << 22
+# Células contadas guardadas antes de serem consolidadas
+_CONSOLIDATE_CELLS = 1 << 16
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+class DensityThinner:
+    """Per-cell random thinning of a point stream to a target density, independent of the reading order.
+
+    The area of interest (``bbox``, in the cloud CRS) is split into square
+    cells of at least 1 m² holding ``target_density`` points per m² on
+    average (larger cells for densities below 1 pt/m², and larger still when
+    the bbox would need more than ``MAX_THINNING_CELLS`` cells).
+    ``unit_area`` is the area in m² of one square CRS unit, so clouds in feet
+    or in degrees get cells and densities in metres.
+
+    Thinning takes two passes over the same points: :meth:`count` counts the
+    points of each cell, then :meth:`thin` keeps each point with probability
+    ``cap / count`` of its cell, where ``cap = target_density * cell area``
+    may be fractional. The expected number of points kept per cell is
+    ``min(count, cap)``. The draw is a hash of the point coordinates, so a
+    point is kept or dropped whatever the order, chunking or process that
+    sees it, and the counts (:meth:`merge_counts`) and the totals
+    (:meth:`merge`) of several workers can be merged. Counts are kept only
+    for occupied cells.
+
+    Feed both passes with the points that reach the metrics (after the
+    height filter), so the effective density reports what was used. With
+    ``target_density`` empty or zero nothing is removed, no counting pass is
+    needed and the thinner only counts the points, so ``original_count`` and
+    ``kept_count`` are always available for the report.
+    """
+
+    def __init__(self, target_density=None, bbox=None, unit_area=1.0):
+        self.unit_area = float(unit_area or 1.0)
+        self.original_count = 0
+        self.kept_count = 0
+        self.enabled = bool(target_density) and bbox is not None and bool(np.all(np.isfinite(bbox)))
+        if not self.enabled:
+            return
+        cell_area = max(MIN_CELL_AREA, 1.0 / target_density) / self.unit_area
+        cell_size = math.sqrt(cell_area)
+        cells = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1]) / cell_area
+        if cells > MAX_THINNING_CELLS:
+            cell_size *= math.sqrt(cells / MAX_THINNING_CELLS)
+        self.cap = target_density * cell_size * cell_size * self.unit_area
+        self.grid = PointGrid(bbox[0], bbox[1], bbox[2], bbox[3], cell_size)
+        self._cells = np.empty(0, dtype=np.int64)
+        self._counts = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._pending_size = 0
+
+    @property
+    def needs_count_pass(self):
+        return self.enabled
+
+    def count(self, x, y):
+        """First pass: counts the points of each cell."""
+        if not self.enabled or x.size == 0:
+            return
+        cells, counts = np.unique(self.grid.cell_index(x, y), return_counts=True)
+        self._add_counts(cells, counts)
+
+    def merge_counts(self, other):
+        if other.enabled:
+            other._consolidate()
+            self._add_counts(other._cells, other._counts)
+
+    def thin(self, x, y, z):
+        """Second pass: returns the mask of the points of this chunk that are kept."""
+        n = x.size
+        self.original_count += n
+        if not self.enabled or n == 0:
+            self.kept_count += n
+            return np.ones(n, dtype=bool)
+
+        self._consolidate()
+        cells = self.grid.cell_index(x, y)
+        position = np.minimum(np.searchsorted(self._cells, cells), max(self._cells.size - 1, 0))
+        counted = self._cells[position] == cells if self._cells.size else np.zeros(n, dtype=bool)
+        counts = np.where(counted, self._counts[position] if self._cells.size else 0, 0)
+        # Pontos de células não contadas são mantidos (a primeira passada não os viu)
+        keep = ~counted | (uniform_hash(x, y, z) * counts < self.cap)
+        self.kept_count += int(keep.sum())
+        return keep
+
+    def merge(self, other):
+        """Adds the point totals of a thinner that saw other points of the same area."""
+        self.original_count += other.original_count
+        self.kept_count += other.kept_count
+
+    def effective_density(self, area):
+        """Points kept per m², for an ``area`` in square CRS units."""
+        if not area:
+            return None
+        return self.kept_count / (area * self.unit_area)
+
+    def _add_counts(self, cells, counts):
+        self._pending.append((cells, counts))
+        self._pending_size += cells.size
+        if self._pending_size > max(self._cells.size, _CONSOLIDATE_CELLS):
+            self._consolidate()
+
+    def _consolidate(self):
+        if not self._pending:
+            return
+        cells = np.concatenate([self._cells] + [cells for cells, _ in self._pending])
+        counts = np.concatenate([self._counts] + [counts for _, counts in self._pending])
+        self._cells, inverse = np.unique(cells, return_inverse=True)
+        self._counts = np.bincount(inverse.ravel(), weights=counts, minlength=self._cells.size).astype(np.int64)
+        self._pending = []
+        self._pending_size = 0
+
+
+def uniform_hash(x, y, z):
+    """Deterministic pseudo-random number in [0, 1) per point, from the bits of its coordinates."""
+    h = _bits(x) * _GOLDEN
+    h ^= _bits(y) + _GOLDEN + (h << np.uint64(6)) + (h >> np.uint64(2))
+    h ^= _bits(z) + _GOLDEN + (h << np.uint64(6)) + (h >> np.uint64(2))
+    # Finalizador do splitmix64
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+    return (h >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def _bits(values):
+    return np.ascontiguousarray(values, dtype=np.float64).view(np.uint64)
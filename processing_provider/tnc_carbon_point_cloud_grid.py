@@ -0,0 +1,158 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from osgeo import gdal # type: ignore
+
+from .tnc_carbon_point_cloud_metrics import acd_als
+from .tnc_carbon_point_cloud_io import PointGrid
+
+GRID_NODATA = -9999.0
+# Pontos por faixa de linhas do raster: limita a memória do cálculo (12 B por ponto, mais a ordenação)
+GRID_STRIP_POINTS = 20_000_000
+
+_SPILL_DTYPE = np.dtype([('cell', '<i8'), ('height', '<f4')])
+
+
+def strip_rows_for(grid, point_count, strip_points=GRID_STRIP_POINTS):
+    """Rows per strip so that a strip holds about ``strip_points`` points (evenly spread) and at most as many cells."""
+    rows = max(1, strip_points // grid.cols)
+    if point_count:
+        rows = min(rows, max(1, strip_points * grid.rows // point_count))
+    return int(min(grid.rows, rows))
+
+
+def grid_strips(chunks, normalizer, grid, thinner=None, strip_rows=None, feedback=None):
+    """Yields ``(first_row, rows, metrics)`` for consecutive strips of rows of ``grid``.
+
+    ``chunks()`` iterates over the points; it is called twice when the
+    thinner needs its counting pass. The cell and height of every valid point
+    kept by ``thinner`` are spilled to one temporary file per strip, then the
+    strips are loaded one at a time, so memory holds a single strip of points
+    (``strip_rows`` rows, all of them by default) instead of the whole cloud.
+    Nothing is yielded when ``feedback`` is canceled.
+    """
+    strip_rows = strip_rows or grid.rows
+    strip_cells = strip_rows * grid.cols
+    strips = -(-grid.rows // strip_rows)
+    if thinner is not None and thinner.needs_count_pass:
+        for chunk in chunks():
+            if feedback is not None and feedback.isCanceled():
+                return
+            valid = np.isfinite(normalizer.normalize(chunk))
+            thinner.count(chunk['x'][valid], chunk['y'][valid])
+
+    folder = tempfile.mkdtemp(prefix='tnccc-grid-')
+    try:
+        paths = [os.path.join(folder, f'{strip}.bin') for strip in range(strips)]
+        for chunk in chunks():
+            if feedback is not None and feedback.isCanceled():
+                return
+            h = normalizer.normalize(chunk)
+            valid = np.isfinite(h)
+            if thinner is not None:
+                valid[valid] = thinner.thin(chunk['x'][valid], chunk['y'][valid], chunk['z'][valid])
+            records = np.empty(int(valid.sum()), dtype=_SPILL_DTYPE)
+            records['cell'] = grid.cell_index(chunk['x'][valid], chunk['y'][valid])
+            records['height'] = h[valid]
+            records = records[np.argsort(records['cell'] // strip_cells, kind='stable')]
+            strip_of = records['cell'] // strip_cells
+            edges = np.searchsorted(strip_of, np.arange(strips + 1))
+            for strip in np.flatnonzero(np.diff(edges)):
+                with open(paths[strip], 'ab') as file:
+                    records[edges[strip]:edges[strip + 1]].tofile(file)
+
+        for strip in range(strips):
+            if feedback is not None and feedback.isCanceled():
+                return
+            first_row = strip * strip_rows
+            rows = min(strip_rows, grid.rows - first_row)
+            if os.path.exists(paths[strip]):
+                records = np.fromfile(paths[strip], dtype=_SPILL_DTYPE)
+                os.remove(paths[strip])
+            else:
+                records = np.empty(0, dtype=_SPILL_DTYPE)
+            yield first_row, rows, grid_metrics(records['cell'] - first_row * grid.cols, records['height'],
+                                                rows * grid.cols)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def grid_metrics(cells, heights, n_cells):
+    """Per-cell height metrics and ACD with a single lexsort and no per-cell loop.
+
+    Percentiles use the same linear interpolation as ``np.percentile`` and the
+    kurtosis the same estimator as ``scipy.stats.kurtosis``. Cells without
+    points are NaN.
+    """
+    result = {name: np.full(n_cells, np.nan) for name in ('hm', 'h5', 'h10', 'h100', 'hiq', 'kh', 'ACD', 'sgm')}
+    result['cnt'] = np.zeros(n_cells, dtype=np.int64)
+    if cells.size == 0:
+        return result
+
+    # Ordena por célula e, dentro de cada célula, por altura
+    order = np.lexsort((heights, cells))
+    c = cells[order]
+    h = heights[order].astype(np.float64)
+    starts = np.flatnonzero(np.r_[True, c[1:] != c[:-1]])
+    counts = np.diff(np.r_[starts, c.size])
+    ids = c[starts]
+
+    mean = np.add.reduceat(h, starts) / counts
+    delta = h - np.repeat(mean, counts)
+    delta2 = delta * delta
+    m2 = np.add.reduceat(delta2, starts)
+    m4 = np.add.reduceat(delta2 * delta2, starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kurtosis = np.abs(counts * m4 / (m2 * m2) - 3.0)
+
+    def percentile(q):
+        position = (counts - 1) * (q / 100.0)
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, counts - 1)
+        fraction = position - low
+        return h[starts + low] + fraction * (h[starts + high] - h[starts + low])
+
+    h5 = percentile(5)
+    h10 = percentile(10)
+    hiq = percentile(75) - percentile(25)
+    h100 = h[starts + counts - 1]
+    acd, sigma = acd_als(mean, kurtosis, h5, h10, hiq, h100)
+
+    for name, values in (('hm', mean), ('h5', h5), ('h10', h10), ('h100', h100), ('hiq', hiq),
+                         ('kh', kurtosis), ('ACD', acd), ('sgm', sigma)):
+        result[name][ids] = values
+    result['cnt'][ids] = counts
+    return result
+
+
+def write_grid_raster(path, grid, strips, band_names, crs_wkt):
+    """Writes a Float32 GeoTIFF with one band per metric of ``band_names`` (``(description, metric)`` pairs).
+
+    ``strips`` yields ``(first_row, rows, metrics)`` as :func:`grid_strips`
+    does; each strip is written as soon as it is computed.
+    """
+    driver = gdal.GetDriverByName('GTiff')
+    out_ds = driver.Create(path, grid.cols, grid.rows, len(band_names), gdal.GDT_Float32,
+                           ['COMPRESS=DEFLATE', 'TILED=YES', 'BIGTIFF=IF_SAFER'])
+    out_ds.SetGeoTransform(grid.geotransform)
+    out_ds.SetProjection(crs_wkt)
+    for index, (description, _) in enumerate(band_names, 1):
+        out_band = out_ds.GetRasterBand(index)
+        out_band.SetDescription(description)
+        out_band.SetNoDataValue(GRID_NODATA)
+        out_band.Fill(GRID_NODATA)
+    for first_row, rows, metrics in strips:
+        for index, (_, name) in enumerate(band_names, 1):
+            values = metrics[name]
+            values = np.where(np.isfinite(values), values, GRID_NODATA).reshape(rows, grid.cols)
+            out_ds.GetRasterBand(index).WriteArray(values.astype(np.float32), 0, first_row)
+    out_ds.FlushCache()
+    out_ds = None
@@ -0,0 +1,135 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+# Este módulo não pode importar o QGIS: ele é carregado pelos processos filhos.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+INDEX_VERSION = 2
+INDEX_SUFFIX = '.tnccc-index'
+
+
+def file_fingerprint(path):
+    """Cheap content fingerprint: path, size, modification time and the file header."""
+    stat = os.stat(path)
+    digest = hashlib.sha1()
+    digest.update(os.path.abspath(path).encode('utf-8'))
+    digest.update(f'{stat.st_size}:{stat.st_mtime_ns}'.encode('ascii'))
+    with open(path, 'rb') as file:
+        digest.update(file.read(4096))
+    return digest.hexdigest()
+
+
+def regions_fingerprint(ids, regions):
+    """Fingerprint of the polygon geometries (already in the cloud CRS) and their IDs."""
+    digest = hashlib.sha1()
+    for feature_id, region in zip(ids, regions):
+        digest.update(repr(feature_id).encode('utf-8'))
+        for ring in region.rings:
+            digest.update(np.ascontiguousarray(ring, dtype=np.float64).tobytes())
+        digest.update(b'|')
+    return digest.hexdigest()
+
+
+class MembershipIndex:
+    """Point offsets per polygon in CSR form, persisted as a sidecar directory.
+
+    ``indptr`` has one entry per polygon plus one, and
+    ``indices[indptr[i]:indptr[i + 1]]`` are the sorted offsets (in file
+    order) of the points inside polygon ``i``. The arrays are stored as plain
+    ``.npy`` files so workers can memory-map them and read only their slice.
+
+    The sidecar is keyed by the polygon fingerprint and records the cloud
+    fingerprint, so editing either input invalidates it. It may also hold
+    ``ground.npy``, the sorted offsets of the ground points that support the
+    TIN of the polygons, so that later runs rebuild exactly the same TIN.
+    """
+
+    def __init__(self, cloud_path, cloud_fingerprint, polygons_fingerprint):
+        self.cloud_fingerprint = cloud_fingerprint
+        self.polygons_fingerprint = polygons_fingerprint
+        self.path = os.path.join(self._root(cloud_path, cloud_fingerprint), polygons_fingerprint[:20])
+
+    @staticmethod
+    def _root(cloud_path, cloud_fingerprint):
+        # Ao lado da nuvem quando possível, senão na pasta temporária do sistema
+        directory = os.path.dirname(os.path.abspath(cloud_path))
+        if os.access(directory, os.W_OK):
+            return cloud_path + INDEX_SUFFIX
+        return os.path.join(tempfile.gettempdir(), 'tnccc-index', cloud_fingerprint[:20])
+
+    def is_valid(self):
+        meta = self._meta()
+        return meta.get('version') == INDEX_VERSION \
+            and meta.get('cloud') == self.cloud_fingerprint \
+            and meta.get('polygons') == self.polygons_fingerprint
+
+    def save(self, region_indices, point_count, ground_indices=None):
+        dtype = _offset_dtype(point_count)
+        counts = np.array([indices.size for indices in region_indices], dtype=np.int64)
+        indptr = np.zeros(counts.size + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        indices = np.concatenate(region_indices).astype(dtype) if region_indices else np.empty(0, dtype=dtype)
+
+        # Grava em uma pasta temporária e troca no final, para nunca deixar um índice pela metade
+        staging = self.path + '.tmp'
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        np.save(os.path.join(staging, 'indptr.npy'), indptr)
+        np.save(os.path.join(staging, 'indices.npy'), indices)
+        if ground_indices is not None:
+            np.save(os.path.join(staging, 'ground.npy'), np.asarray(ground_indices).astype(dtype))
+        with open(os.path.join(staging, 'meta.json'), 'w', encoding='utf-8') as file:
+            json.dump({
+                'version': INDEX_VERSION,
+                'cloud': self.cloud_fingerprint,
+                'polygons': self.polygons_fingerprint,
+                'regions': int(counts.size),
+                'points': int(indices.size),
+                'point_count': int(point_count),
+                'ground': ground_indices is not None,
+            }, file)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(staging, self.path)
+
+    def has_ground(self):
+        return self._meta().get('ground', False) and os.path.isfile(os.path.join(self.path, 'ground.npy'))
+
+    def ground_indices(self):
+        return np.load(os.path.join(self.path, 'ground.npy')).astype(np.int64)
+
+    def save_ground(self, ground_indices):
+        """Adds the ground offsets to a valid index written without them."""
+        meta = self._meta()
+        staging = os.path.join(self.path, 'ground.tmp.npy')
+        np.save(staging, np.asarray(ground_indices).astype(_offset_dtype(meta.get('point_count', 0))))
+        os.replace(staging, os.path.join(self.path, 'ground.npy'))
+        meta['ground'] = True
+        with open(os.path.join(self.path, 'meta.json.tmp'), 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        os.replace(os.path.join(self.path, 'meta.json.tmp'), os.path.join(self.path, 'meta.json'))
+
+    def _meta(self):
+        try:
+            with open(os.path.join(self.path, 'meta.json'), encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def region_indices(self, position):
+        indptr = np.load(os.path.join(self.path, 'indptr.npy'), mmap_mode='r')
+        indices = np.load(os.path.join(self.path, 'indices.npy'), mmap_mode='r')
+        return np.asarray(indices[indptr[position]:indptr[position + 1]], dtype=np.int64)
+
+
+def _offset_dtype(point_count):
+    return np.uint32 if point_count < np.iinfo(np.uint32).max else np.uint64
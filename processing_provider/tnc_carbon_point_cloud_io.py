@@ -0,0 +1,308 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import math
+import os
+import queue
+import struct
+import threading
+
+import numpy as np
+
+try:
+    import laspy # type: ignore
+except ImportError:
+    laspy = None
+
+# Número de pontos lidos por bloco
+DEFAULT_CHUNK_SIZE = 2_000_000
+
+# Distância máxima (em pontos) entre dois pontos lidos pelo índice sem reposicionar o leitor
+MAX_INDEX_GAP = 50_000
+
+# Número de blocos decodificados que podem aguardar na fila de leitura
+DEFAULT_QUEUE_DEPTH = 2
+
+# Tamanho padrão (em pontos) dos blocos de compressão do LAZ, usado quando o arquivo não informa o seu
+LAZ_CHUNK_POINTS = 50_000
+
+# VLR do LASzip: o tamanho dos blocos é um uint32 no byte 12 do seu conteúdo
+LASZIP_VLR_USER_ID = 'laszip encoded'
+LASZIP_VLR_RECORD_ID = 22204
+LASZIP_CHUNK_SIZE_OFFSET = 12
+
+# Tamanho de bloco que indica blocos de tamanho variável
+VARIABLE_CHUNK_SIZE = 0xFFFFFFFF
+
+_END = object()
+
+# Desligado nos processos filhos: cada um já ocupa um núcleo, e o LazrsParallel abriria uma thread por núcleo
+_parallel_laz = True
+
+LAS_EXTENSIONS = ('.las', '.laz')
+
+
+def can_stream(path):
+    """Whether ``path`` can be read chunk by chunk without going through PDAL."""
+    return laspy is not None and isinstance(path, str) and path.lower().endswith(LAS_EXTENSIONS) \
+        and os.path.isfile(path)
+
+
+def iter_las_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, queue_depth=DEFAULT_QUEUE_DEPTH, start=0, stop=None):
+    """Yields the points of a LAS/LAZ file as dicts of NumPy arrays.
+
+    Chunks are decoded by a reader thread into a queue of ``queue_depth``
+    chunks, so decompression overlaps with the metrics computed by the caller
+    and at most ``queue_depth + 2`` chunks are alive at a time. LAZ files are
+    decoded with the multi-threaded, chunk-table aware lazrs backend when it
+    is installed. ``start`` and ``stop`` restrict the reading to a range of
+    point offsets (see :func:`las_point_ranges`); only that range is decoded.
+    """
+    return prefetch(_read_las_chunks(path, chunk_size, start, stop), queue_depth)
+
+
+def _read_las_chunks(path, chunk_size, start=0, stop=None):
+    with laspy.open(path, laz_backend=laz_backend()) as reader:
+        total = int(reader.header.point_count)
+        stop = total if stop is None else min(stop, total)
+        if start > 0:
+            reader.seek(start)
+        position = start
+        while position < stop:
+            count = min(chunk_size, stop - position)
+            points = reader.read_points(count)
+            position += count
+            yield {
+                'x': np.asarray(points.x, dtype=np.float64),
+                'y': np.asarray(points.y, dtype=np.float64),
+                'z': np.asarray(points.z, dtype=np.float64),
+                'classification': np.asarray(points.classification, dtype=np.uint8),
+            }
+
+
+def iter_las_points_at(path, indices, chunk_size=DEFAULT_CHUNK_SIZE, queue_depth=DEFAULT_QUEUE_DEPTH):
+    """Yields only the points at the sorted file offsets ``indices``.
+
+    Offsets are grouped into spans; the reader seeks to the start of each span
+    (through the LAZ chunk table for compressed files) and skips the gaps.
+    """
+    return prefetch(_read_las_points_at(path, np.asarray(indices, dtype=np.int64), chunk_size), queue_depth)
+
+
+def _read_las_points_at(path, indices, chunk_size):
+    if indices.size == 0:
+        return
+    # Um novo span começa quando o próximo ponto está longe demais para valer a pena ler o intervalo
+    breaks = np.flatnonzero(np.diff(indices) > MAX_INDEX_GAP) + 1
+    with laspy.open(path, laz_backend=laz_backend()) as reader:
+        for span in np.split(indices, breaks):
+            start = int(span[0])
+            stop = int(span[-1]) + 1
+            reader.seek(start)
+            position = start
+            while position < stop:
+                count = min(chunk_size, stop - position)
+                points = reader.read_points(count)
+                wanted = span[(span >= position) & (span < position + count)] - position
+                position += count
+                if wanted.size == 0:
+                    continue
+                yield {
+                    'x': np.asarray(points.x, dtype=np.float64)[wanted],
+                    'y': np.asarray(points.y, dtype=np.float64)[wanted],
+                    'z': np.asarray(points.z, dtype=np.float64)[wanted],
+                    'classification': np.asarray(points.classification, dtype=np.uint8)[wanted],
+                }
+
+
+def las_point_count(path):
+    with laspy.open(path) as reader:
+        return int(reader.header.point_count)
+
+
+def las_point_ranges(path, parts):
+    """Splits the points of ``path`` into at most ``parts`` ``(start, stop)`` offset ranges.
+
+    Range edges fall on LAZ chunk boundaries (see :func:`las_chunk_edges`), so
+    no compressed chunk is decoded by two readers.
+    """
+    edges = las_chunk_edges(path)
+    blocks = edges.size - 1
+    if blocks <= 0:
+        return []
+    edges = edges[np.unique(np.linspace(0, blocks, max(1, min(parts, blocks)) + 1).round().astype(np.int64))]
+    return [(int(start), int(stop)) for start, stop in zip(edges[:-1], edges[1:])]
+
+
+def las_chunk_edges(path):
+    """Point offsets where the compressed chunks of ``path`` start, followed by the point count.
+
+    The chunk size comes from the laszip VLR. Uncompressed files are split
+    every ``LAZ_CHUNK_POINTS`` points; files with variable-size chunks are
+    kept whole.
+    """
+    with open(path, 'rb') as source:
+        header = laspy.LasHeader.read_from(source)
+    total = int(header.point_count)
+    record = _laszip_record(header)
+    chunk_size = None
+    if record is not None and len(record) >= LASZIP_CHUNK_SIZE_OFFSET + 4:
+        chunk_size = struct.unpack_from('<I', record, LASZIP_CHUNK_SIZE_OFFSET)[0]
+    if chunk_size == VARIABLE_CHUNK_SIZE:
+        # O lazrs não reposiciona o leitor corretamente em blocos de tamanho variável (a posição cai alguns
+        # pontos adiante), então o arquivo não é dividido mesmo com a tabela de blocos
+        chunk_size = total
+    step = chunk_size or LAZ_CHUNK_POINTS
+    starts = np.arange(step, total, step, dtype=np.int64)
+    return np.concatenate([[0], starts, [total]]).astype(np.int64) if total > 0 else np.zeros(1, dtype=np.int64)
+
+
+def _laszip_record(header):
+    for vlr in header.vlrs:
+        if vlr.user_id == LASZIP_VLR_USER_ID and vlr.record_id == LASZIP_VLR_RECORD_ID:
+            return bytes(vlr.record_data)
+    return None
+
+
+def laz_backend():
+    """Prefers lazrs in parallel mode (one LAZ chunk per core) when available.
+
+    After :func:`single_threaded_laz` (in the worker processes) the parallel
+    mode is skipped, so ``workers`` processes do not each start a thread per
+    core.
+    """
+    candidates = (laspy.LazBackend.LazrsParallel, laspy.LazBackend.Lazrs, laspy.LazBackend.Laszip)
+    if not _parallel_laz:
+        candidates = candidates[1:]
+    backends = tuple(backend for backend in candidates if backend.is_available())
+    return backends or None
+
+
+def single_threaded_laz():
+    """Process pool initializer: decodes LAZ with one thread in this process."""
+    global _parallel_laz
+    _parallel_laz = False
+
+
+def prefetch(iterable, depth=DEFAULT_QUEUE_DEPTH):
+    """Consumes ``iterable`` in a background thread through a bounded queue."""
+    buffer = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        buffer.put((item, None), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            buffer.put((_END, None))
+        except BaseException as error:
+            buffer.put((_END, error))
+        finally:
+            # Fecha o gerador nesta mesma thread, liberando o arquivo aberto por ele
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name='tnccc-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Libera a thread de leitura se o consumidor parar antes do fim
+        stop.set()
+        while thread.is_alive():
+            try:
+                buffer.get_nowait()
+            except queue.Empty:
+                thread.join(0.1)
+
+
+class PolygonRegion:
+    """Polygon (in the point cloud CRS) used to select points without QGIS.
+
+    ``rings`` holds every ring of every part as an ``(n, 2)`` array; point
+    membership uses the even-odd rule, so holes need no special handling.
+    """
+
+    def __init__(self, rings, area=None):
+        self.rings = [np.asarray(ring, dtype=np.float64) for ring in rings if len(ring) >= 3]
+        self.area = area
+        if self.rings:
+            stacked = np.vstack(self.rings)
+            self.bbox = (stacked[:, 0].min(), stacked[:, 1].min(), stacked[:, 0].max(), stacked[:, 1].max())
+        else:
+            self.bbox = (np.inf, np.inf, -np.inf, -np.inf)
+
+    def bbox_mask(self, x, y):
+        xmin, ymin, xmax, ymax = self.bbox
+        return (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+
+    def contains(self, x, y):
+        inside = np.zeros(x.shape, dtype=bool)
+        candidates = np.flatnonzero(self.bbox_mask(x, y))
+        if candidates.size == 0:
+            return inside
+        px = x[candidates]
+        py = y[candidates]
+        hit = np.zeros(candidates.size, dtype=bool)
+        # Ray casting vetorizado: um laço por aresta, nunca por ponto
+        for ring in self.rings:
+            x1, y1 = ring[:, 0], ring[:, 1]
+            x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+            for ax, ay, bx, by in zip(x1, y1, x2, y2):
+                if ay == by:
+                    continue
+                crosses = (ay > py) != (by > py)
+                hit ^= crosses & (px < ax + (py - ay) * (bx - ax) / (by - ay))
+        inside[candidates] = hit
+        return inside
+
+
+class PointGrid:
+    """North-up grid of square cells snapped to multiples of ``cell_size``."""
+
+    def __init__(self, xmin, ymin, xmax, ymax, cell_size):
+        self.cell_size = float(cell_size)
+        self.x0 = math.floor(xmin / cell_size) * cell_size
+        self.y0 = math.ceil(ymax / cell_size) * cell_size
+        self.cols = max(1, int(math.ceil((xmax - self.x0) / cell_size)))
+        self.rows = max(1, int(math.ceil((self.y0 - ymin) / cell_size)))
+
+    @property
+    def size(self):
+        return self.rows * self.cols
+
+    @property
+    def geotransform(self):
+        return (self.x0, self.cell_size, 0.0, self.y0, 0.0, -self.cell_size)
+
+    def cell_index(self, x, y):
+        col = np.floor((x - self.x0) / self.cell_size).astype(np.int64)
+        row = np.floor((self.y0 - y) / self.cell_size).astype(np.int64)
+        np.clip(col, 0, self.cols - 1, out=col)
+        np.clip(row, 0, self.rows - 1, out=row)
+        return row * self.cols + col
+
+
+def union_bbox(regions):
+    boxes = np.array([region.bbox for region in regions], dtype=np.float64)
+    return boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max()
+
+
+def bbox_intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
@@ -0,0 +1,217 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import math
+
+import numpy as np
+
+# Largura padrão das classes do histograma de alturas (em metros)
+DEFAULT_BIN_WIDTH = 0.01
+# Número máximo de classes do histograma (8 MB); acima disso a largura das classes dobra
+MAX_HISTOGRAM_BINS = 1 << 20
+
+
+class StreamingHeightMetrics:
+    """Bounded-memory accumulator for the point cloud height metrics.
+
+    Heights are fed in chunks through :meth:`update` and never kept. The mean
+    and the kurtosis come from exact central moments (merged with the pairwise
+    formulas of Pébay, 2008), the minimum and the maximum are tracked exactly,
+    and the percentiles are read from a fixed-width histogram that only grows
+    to cover the observed height range.
+
+    A percentile interpolates, as ``np.percentile`` does, between the heights
+    of rank ``floor(rank)`` and ``ceil(rank)``. Each of them is located in
+    the histogram and placed inside its bin assuming the points of the bin
+    are evenly spread (the lowest and highest ranks are the exact minimum and
+    maximum), so its absolute error is below ``bin_width``: 1 cm for p5, p10,
+    p25 and p75 with the default 0.01 m bins, and 2 cm for the interquartile
+    range.
+
+    The histogram never holds more than ``max_bins`` bins: when the height
+    range needs more (a stray point kilometres away), the bin width doubles
+    and neighbouring bins are merged, which doubles the error bound as well.
+    Memory is therefore bounded by ``max_bins`` and independent of the point
+    count.
+
+    Accumulators built with the same ``bin_width`` can be merged with
+    :meth:`merge`, e.g. when several chunks or workers see the same polygon.
+    """
+
+    def __init__(self, bin_width=DEFAULT_BIN_WIDTH, max_bins=MAX_HISTOGRAM_BINS):
+        self.base_bin_width = float(bin_width)
+        self.bin_width = float(bin_width)
+        self.max_bins = max(2, int(max_bins))
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.m4 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._first_bin = 0
+        self._histogram = np.zeros(0, dtype=np.int64)
+
+    def update(self, heights):
+        heights = np.asarray(heights, dtype=np.float64).ravel()
+        heights = heights[np.isfinite(heights)]
+        n = heights.size
+        if n == 0:
+            return
+
+        mean = heights.mean()
+        delta = heights - mean
+        delta2 = delta * delta
+        self._merge_moments(n, mean, delta2.sum(), (delta2 * delta).sum(), (delta2 * delta2).sum())
+        self.min = min(self.min, float(heights.min()))
+        self.max = max(self.max, float(heights.max()))
+
+        # Alarga as classes antes de contar, para nunca alocar mais que max_bins
+        while True:
+            bins = np.floor(heights / self.bin_width).astype(np.int64)
+            first, last = int(bins.min()), int(bins.max())
+            if self._span(first, last) <= self.max_bins:
+                break
+            self._coarsen()
+        self._add_histogram(first, np.bincount(bins - first))
+
+    def merge(self, other):
+        if other.base_bin_width != self.base_bin_width:
+            raise ValueError('Cannot merge height metrics with different bin widths')
+        if other.count == 0:
+            return
+        self._merge_moments(other.count, other.mean, other.m2, other.m3, other.m4)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        first, counts, width = other._first_bin, other._histogram, other.bin_width
+        while True:
+            while self.bin_width < width:
+                self._coarsen()
+            while width < self.bin_width:
+                first, counts = _coarsen_bins(first, counts)
+                width *= 2
+            if self._span(first, first + counts.size - 1) <= self.max_bins:
+                break
+            self._coarsen()
+        self._add_histogram(first, counts)
+
+    def percentile(self, q):
+        """Linear-interpolation percentile (as ``np.percentile``), see the class error bound."""
+        if self.count == 0:
+            return None
+        rank = q / 100.0 * (self.count - 1)
+        low = math.floor(rank)
+        cumulative = np.cumsum(self._histogram)
+        low_value = self._order_statistic(low, cumulative)
+        if rank == low:
+            return low_value
+        high_value = self._order_statistic(low + 1, cumulative)
+        return float(low_value + (rank - low) * (high_value - low_value))
+
+    def _order_statistic(self, rank, cumulative):
+        # Altura de posição ``rank`` (a partir de 0): classe pelo histograma acumulado, posição dentro dela
+        # supondo os pontos da classe igualmente espaçados
+        if rank <= 0:
+            return float(self.min)
+        if rank >= self.count - 1:
+            return float(self.max)
+        index = int(np.searchsorted(cumulative, rank, side='right'))
+        before = cumulative[index - 1] if index > 0 else 0
+        value = (self._first_bin + index + (rank - before + 0.5) / self._histogram[index]) * self.bin_width
+        return float(min(max(value, self.min), self.max))
+
+    def kurtosis(self):
+        """Fisher kurtosis with the biased estimator (``scipy.stats.kurtosis`` default)."""
+        if self.count == 0 or self.m2 == 0:
+            return None
+        return float(self.count * self.m4 / (self.m2 * self.m2) - 3.0)
+
+    def metrics(self):
+        if self.count == 0:
+            return None
+        h25 = self.percentile(25)
+        h75 = self.percentile(75)
+        kurtosis = self.kurtosis()
+        return {
+            'hm': float(self.mean),
+            'h5': self.percentile(5),
+            'h10': self.percentile(10),
+            'h25': h25,
+            'h75': h75,
+            'h100': float(self.max),
+            'hiq': float(h75 - h25),
+            'kh': abs(kurtosis) if kurtosis is not None else None,
+            'cnt': int(self.count),
+        }
+
+    def _merge_moments(self, n_b, mean_b, m2_b, m3_b, m4_b):
+        n_a = self.count
+        if n_a == 0:
+            self.count, self.mean, self.m2, self.m3, self.m4 = int(n_b), float(mean_b), float(m2_b), float(m3_b), float(m4_b)
+            return
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        delta_n = delta / n
+        m2 = self.m2 + m2_b + delta * delta_n * n_a * n_b
+        m3 = (self.m3 + m3_b
+              + delta * delta_n * delta_n * n_a * n_b * (n_a - n_b)
+              + 3.0 * delta_n * (n_a * m2_b - n_b * self.m2))
+        m4 = (self.m4 + m4_b
+              + delta * delta_n ** 3 * n_a * n_b * (n_a * n_a - n_a * n_b + n_b * n_b)
+              + 6.0 * delta_n * delta_n * (n_a * n_a * m2_b + n_b * n_b * self.m2)
+              + 4.0 * delta_n * (n_a * m3_b - n_b * self.m3))
+        self.count = n
+        self.mean = self.mean + delta_n * n_b
+        self.m2, self.m3, self.m4 = m2, m3, m4
+
+    def _span(self, first, last):
+        if self._histogram.size == 0:
+            return last - first + 1
+        return max(last, self._first_bin + self._histogram.size - 1) - min(first, self._first_bin) + 1
+
+    def _coarsen(self):
+        self._first_bin, self._histogram = _coarsen_bins(self._first_bin, self._histogram)
+        self.bin_width *= 2
+
+    def _add_histogram(self, first, counts):
+        if counts.size == 0:
+            return
+        if self._histogram.size == 0:
+            self._first_bin = first
+            self._histogram = counts.astype(np.int64)
+            return
+        start = min(self._first_bin, first)
+        end = max(self._first_bin + self._histogram.size, first + counts.size)
+        if start != self._first_bin or end != self._first_bin + self._histogram.size:
+            grown = np.zeros(end - start, dtype=np.int64)
+            offset = self._first_bin - start
+            grown[offset:offset + self._histogram.size] = self._histogram
+            self._first_bin = start
+            self._histogram = grown
+        offset = first - self._first_bin
+        self._histogram[offset:offset + counts.size] += counts
+
+
+def _coarsen_bins(first, counts):
+    """Merges pairs of bins: bin ``b`` of width ``w`` is bin ``b // 2`` of width ``2w``."""
+    if counts.size == 0:
+        return first // 2, counts
+    shift = first % 2
+    padded = np.zeros(shift + counts.size + (shift + counts.size) % 2, dtype=np.int64)
+    padded[shift:shift + counts.size] = counts
+    return first // 2, padded.reshape(-1, 2).sum(axis=1)
+
+
+def acd_als(hm, kh, h5, h10, hiq, h100):
+    """Amazon ALS carbon equation; accepts scalars or NumPy arrays.
+
+    Returns ``(ACD, sigma)``.
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        acd = 0.2 * np.power(hm, 2.02) * np.power(kh, 0.66) * np.power(h5, 0.11) \
+            * np.power(h10, -0.32) * np.power(hiq, 0.5) * np.power(h100, -0.82)
+        sigma = 0.66 * np.power(acd, 0.71) # Desvio padrão
+    return acd, sigma
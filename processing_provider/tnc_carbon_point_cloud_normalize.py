@@ -0,0 +1,323 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+# Este módulo não pode importar o QGIS: ele é carregado pelos processos filhos.
+
+import collections
+import os
+import shutil
+import tempfile
+import weakref
+
+import numpy as np
+
+# Classe ASPRS de pontos de solo
+GROUND_CLASS = 2
+
+# Margem (em unidades do SRC da nuvem) ao redor da área de interesse e de cada tile do TIN
+TIN_MARGIN = 10.0
+# Lado (em unidades do SRC da nuvem) dos tiles do TIN de solo
+TIN_TILE_SIZE = 100.0
+# Número de tiles triangulados mantidos em memória
+TIN_CACHE_TILES = 32
+# Pontos de solo guardados em memória antes de serem gravados nos arquivos dos tiles
+TIN_FLUSH_POINTS = 2_000_000
+
+
+class HeightNormalizer:
+    """Turns point elevations into heights above ground, fully vectorized.
+
+    The ground comes from a DTM raster sampled bilinearly at every point
+    (``dtm_path``, in the CRS of the cloud) or from a tiled TIN of the
+    ground-class points (``ground_tin``); with neither, the raw elevations are
+    kept. Heights below ``min_height`` and points without ground (outside the
+    DTM, on DTM nodata or in a TIN tile without ground points) are returned as
+    NaN, which the metrics accumulators skip.
+    """
+
+    def __init__(self, min_height=None, dtm_path=None, ground_tin=False):
+        self.min_height = min_height
+        self.dtm = DtmSampler(dtm_path) if dtm_path else None
+        self.ground_tin = ground_tin and self.dtm is None
+        self._tin = None
+
+    @property
+    def needs_ground_pass(self):
+        return self.ground_tin
+
+    @property
+    def is_prepared(self):
+        """Whether :meth:`normalize` can run: no ground TIN is used, or it was built by :meth:`prepare`."""
+        return not self.ground_tin or self._tin is not None
+
+    def prepare(self, chunks, bbox=None):
+        """Builds the ground TIN from the class 2 points of ``chunks`` (within ``TIN_MARGIN`` of ``bbox``)."""
+        if not self.ground_tin:
+            return
+        tin = TiledGroundTin()
+        for chunk in chunks:
+            keep = ground_mask(chunk, bbox)
+            tin.add(chunk['x'][keep], chunk['y'][keep], chunk['z'][keep])
+        tin.finish()
+        self._tin = tin
+
+    def normalize(self, chunk):
+        x, y, z = chunk['x'], chunk['y'], chunk['z']
+        if self.dtm is not None:
+            heights = z - self.dtm.sample(x, y)
+        elif self.ground_tin:
+            if self._tin is None:
+                raise RuntimeError('HeightNormalizer.prepare() must run before normalize() with a ground TIN')
+            heights = z - self._tin.sample(x, y)
+        else:
+            heights = np.array(z, dtype=np.float64)
+        if self.min_height is not None:
+            with np.errstate(invalid='ignore'):
+                heights[heights < self.min_height] = np.nan
+        return heights
+
+
+def ground_mask(chunk, bbox=None):
+    """Mask of the ground points of ``chunk`` that support a TIN over ``bbox`` (all of them without ``bbox``)."""
+    keep = chunk['classification'] == GROUND_CLASS
+    if bbox is not None:
+        x, y = chunk['x'], chunk['y']
+        keep &= (x >= bbox[0] - TIN_MARGIN) & (x <= bbox[2] + TIN_MARGIN) \
+            & (y >= bbox[1] - TIN_MARGIN) & (y <= bbox[3] + TIN_MARGIN)
+    return keep
+
+
+class DtmSampler:
+    """Bilinear DTM lookup reading only the raster window around the points."""
+
+    def __init__(self, path):
+        self.path = path
+        self._ds = None
+        self._window = None
+
+    def __getstate__(self):
+        # O dataset GDAL não é serializável; cada processo abre o seu
+        return {'path': self.path, '_ds': None, '_window': None}
+
+    def sample(self, x, y):
+        """Ground elevation at each point; NaN outside the raster and on nodata."""
+        if x.size == 0:
+            return np.empty(0, dtype=np.float64)
+        if self._ds is None:
+            from osgeo import gdal # type: ignore
+            self._ds = gdal.Open(self.path)
+            band = self._ds.GetRasterBand(1)
+            self._nodata = band.GetNoDataValue()
+            self._geotransform = self._ds.GetGeoTransform()
+
+        gt = self._geotransform
+        col = (x - gt[0]) / gt[1] - 0.5
+        row = (y - gt[3]) / gt[5] - 0.5
+        # Pontos fora do raster não têm terreno (antes recebiam o valor da borda)
+        inside = (col >= -0.5) & (col <= self._ds.RasterXSize - 0.5) \
+            & (row >= -0.5) & (row <= self._ds.RasterYSize - 0.5)
+        ground = np.full(x.shape, np.nan)
+        if not inside.any():
+            return ground
+        col = col[inside]
+        row = row[inside]
+        col0 = np.floor(col).astype(np.int64)
+        row0 = np.floor(row).astype(np.int64)
+
+        window = self._read_window(int(col0.min()), int(row0.min()), int(col0.max()) + 2, int(row0.max()) + 2)
+        values, w_col, w_row = window
+        c = np.clip(col0 - w_col, 0, values.shape[1] - 1)
+        r = np.clip(row0 - w_row, 0, values.shape[0] - 1)
+        c1 = np.clip(c + 1, 0, values.shape[1] - 1)
+        r1 = np.clip(r + 1, 0, values.shape[0] - 1)
+        fc = np.clip(col - col0, 0.0, 1.0)
+        fr = np.clip(row - row0, 0.0, 1.0)
+        top = values[r, c] * (1 - fc) + values[r, c1] * fc
+        bottom = values[r1, c] * (1 - fc) + values[r1, c1] * fc
+        ground[inside] = top * (1 - fr) + bottom * fr
+        return ground
+
+    def _read_window(self, col_start, row_start, col_end, row_end):
+        # Reaproveita a última janela lida quando ela cobre os pontos pedidos
+        if self._window is not None:
+            values, w_col, w_row = self._window
+            if w_col <= col_start and w_row <= row_start \
+                    and col_end <= w_col + values.shape[1] and row_end <= w_row + values.shape[0]:
+                return self._window
+        col_start = max(col_start, 0)
+        row_start = max(row_start, 0)
+        col_end = min(max(col_end, col_start + 1), self._ds.RasterXSize)
+        row_end = min(max(row_end, row_start + 1), self._ds.RasterYSize)
+        if col_start >= col_end or row_start >= row_end:
+            values = np.full((1, 1), np.nan)
+        else:
+            values = self._ds.GetRasterBand(1).ReadAsArray(
+                col_start, row_start, col_end - col_start, row_end - row_start).astype(np.float64)
+            if self._nodata is not None:
+                values[values == self._nodata] = np.nan
+        self._window = (values, col_start, row_start)
+        return self._window
+
+
+def ground_tiles(bboxes, tile_size=TIN_TILE_SIZE):
+    """TIN tiles (``(n, 2)`` array of tile columns and rows) needed to sample heights inside ``bboxes``.
+
+    These are the tiles under the boxes plus the ring around them, whose
+    ground :class:`TiledGroundTin` copies into the margins of the sampled
+    tiles; inside ``bboxes`` a TIN of these tiles alone matches the TIN of
+    the whole cloud.
+    """
+    tiles = []
+    for xmin, ymin, xmax, ymax in bboxes:
+        cols = np.arange(np.floor(xmin / tile_size) - 1, np.floor(xmax / tile_size) + 2, dtype=np.int64)
+        rows = np.arange(np.floor(ymin / tile_size) - 1, np.floor(ymax / tile_size) + 2, dtype=np.int64)
+        tiles.append(np.stack(np.meshgrid(cols, rows), axis=-1).reshape(-1, 2))
+    if not tiles:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(tiles), axis=0)
+
+
+def in_tiles(x, y, tiles, tile_size=TIN_TILE_SIZE):
+    """Mask of the points falling in one of ``tiles`` (see :func:`ground_tiles`)."""
+    keys = _tile_keys(np.floor(x / tile_size).astype(np.int64), np.floor(y / tile_size).astype(np.int64))
+    return np.isin(keys, _tile_keys(tiles[:, 0], tiles[:, 1]))
+
+
+def _tile_keys(cols, rows):
+    return (cols << 32) ^ (rows & 0xFFFFFFFF)
+
+
+class TiledGroundTin:
+    """Ground TIN split into square tiles kept on disk, so its memory does not grow with the cloud.
+
+    :meth:`add` appends the ground points to one file per ``tile_size`` tile,
+    also copying the points within ``margin`` of a tile edge into the
+    neighbouring tile, so triangles stay continuous across edges. A tile is
+    triangulated only when heights are sampled in it, and at most
+    ``cache_tiles`` triangulations are kept (least recently used first out).
+    Tiles are aligned to multiples of ``tile_size``, so the same ground
+    points always give the same TIN. The files are removed with the object;
+    copies sent to worker processes only read them.
+
+    The tiles go to disk because one triangulation of the ground of a large
+    cloud (tens of millions of points) does not fit in memory, and the points
+    of a tile are spread over the whole file (LAS/LAZ is not sorted in
+    space), so they cannot be triangulated as they arrive. This is also why
+    the TIN needs its own pass over the ground points before the heights. The
+    files let the worker processes share the same TIN without pickling it.
+    """
+
+    def __init__(self, tile_size=TIN_TILE_SIZE, margin=TIN_MARGIN, cache_tiles=TIN_CACHE_TILES):
+        self.tile_size = float(tile_size)
+        self.margin = float(margin)
+        self.cache_tiles = max(1, int(cache_tiles))
+        self.folder = tempfile.mkdtemp(prefix='tnccc-tin-')
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.folder, True)
+        self._pending = collections.defaultdict(list)
+        self._pending_points = 0
+        self._cache = collections.OrderedDict()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_cleanup'] = None
+        state['_pending'] = collections.defaultdict(list)
+        state['_pending_points'] = 0
+        state['_cache'] = collections.OrderedDict()
+        return state
+
+    def add(self, x, y, z):
+        if x.size == 0:
+            return
+        points = np.column_stack((x, y, z))
+        tx = np.floor(x / self.tile_size).astype(np.int64)
+        ty = np.floor(y / self.tile_size).astype(np.int64)
+        near = {
+            -1: (x - tx * self.tile_size < self.margin, y - ty * self.tile_size < self.margin),
+            1: ((tx + 1) * self.tile_size - x <= self.margin, (ty + 1) * self.tile_size - y <= self.margin),
+        }
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keep = np.ones(x.size, dtype=bool)
+                if dx:
+                    keep &= near[dx][0]
+                if dy:
+                    keep &= near[dy][1]
+                if keep.any():
+                    self._append(tx[keep] + dx, ty[keep] + dy, points[keep])
+        if self._pending_points >= TIN_FLUSH_POINTS:
+            self.finish()
+
+    def _append(self, tx, ty, points):
+        order = np.lexsort((ty, tx))
+        tx, ty, points = tx[order], ty[order], points[order]
+        starts = np.flatnonzero(np.r_[True, (tx[1:] != tx[:-1]) | (ty[1:] != ty[:-1])])
+        for start, stop in zip(starts, np.r_[starts[1:], tx.size]):
+            self._pending[(int(tx[start]), int(ty[start]))].append(points[start:stop])
+        self._pending_points += points.shape[0]
+
+    def finish(self):
+        """Writes the points still in memory to the tile files."""
+        for tile, parts in self._pending.items():
+            with open(self._tile_path(tile), 'ab') as file:
+                np.concatenate(parts).astype(np.float64).tofile(file)
+        self._pending.clear()
+        self._pending_points = 0
+        self._cache.clear()
+
+    def sample(self, x, y):
+        ground = np.full(x.shape, np.nan)
+        if x.size == 0:
+            return ground
+        tx = np.floor(x / self.tile_size).astype(np.int64)
+        ty = np.floor(y / self.tile_size).astype(np.int64)
+        order = np.lexsort((ty, tx))
+        starts = np.flatnonzero(np.r_[True, (tx[order][1:] != tx[order][:-1]) | (ty[order][1:] != ty[order][:-1])])
+        for start, stop in zip(starts, np.r_[starts[1:], x.size]):
+            members = order[start:stop]
+            tin = self._tile((int(tx[members[0]]), int(ty[members[0]])))
+            if tin is not None:
+                ground[members] = tin.sample(x[members], y[members])
+        return ground
+
+    def _tile(self, tile):
+        if tile in self._cache:
+            self._cache.move_to_end(tile)
+            return self._cache[tile]
+        path = self._tile_path(tile)
+        tin = None
+        if os.path.isfile(path):
+            points = np.fromfile(path, dtype=np.float64).reshape(-1, 3)
+            tin = GroundTin(points[:, 0], points[:, 1], points[:, 2])
+        self._cache[tile] = tin
+        if len(self._cache) > self.cache_tiles:
+            self._cache.popitem(last=False)
+        return tin
+
+    def _tile_path(self, tile):
+        return os.path.join(self.folder, f'{tile[0]}_{tile[1]}.bin')
+
+
+class GroundTin:
+    """Linear interpolation over a Delaunay triangulation of ground points."""
+
+    def __init__(self, x, y, z):
+        self._interpolator = None
+        self._nearest = None
+        if x.size >= 3:
+            from scipy.interpolate import LinearNDInterpolator, NearestNDInterpolator # type: ignore
+            points = np.column_stack((x, y))
+            self._interpolator = LinearNDInterpolator(points, z)
+            self._nearest = NearestNDInterpolator(points, z)
+
+    def sample(self, x, y):
+        if self._interpolator is None:
+            return np.full(x.shape, np.nan)
+        ground = self._interpolator(x, y)
+        # Fora do fecho convexo do solo usa o ponto de solo mais próximo
+        outside = np.isnan(ground)
+        if outside.any():
+            ground[outside] = self._nearest(x[outside], y[outside])
+        return ground
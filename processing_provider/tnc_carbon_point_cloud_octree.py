@@ -0,0 +1,161 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+from qgis.core import (QgsGeometry, # type: ignore
+                       QgsPointCloudAttribute,
+                       QgsPointCloudAttributeCollection,
+                       QgsPointCloudRequest)
+
+import numpy as np
+
+from .tnc_carbon_point_cloud_normalize import GROUND_CLASS, TIN_TILE_SIZE, in_tiles
+
+# Atributos lidos de cada nó da octree
+QUERY_ATTRIBUTES = ('X', 'Y', 'Z', 'Classification')
+
+_NUMPY_TYPES = {
+    QgsPointCloudAttribute.Char: np.int8,
+    QgsPointCloudAttribute.UChar: np.uint8,
+    QgsPointCloudAttribute.Short: np.int16,
+    QgsPointCloudAttribute.UShort: np.uint16,
+    QgsPointCloudAttribute.Int32: np.int32,
+    QgsPointCloudAttribute.UInt32: np.uint32,
+    QgsPointCloudAttribute.Int64: np.int64,
+    QgsPointCloudAttribute.UInt64: np.uint64,
+    QgsPointCloudAttribute.Float: np.float32,
+    QgsPointCloudAttribute.Double: np.float64,
+}
+
+
+# Provedores do QGIS cujo formato já é uma octree no próprio arquivo
+OCTREE_PROVIDERS = ('copc', 'ept')
+
+
+def is_octree_source(cloud_layer):
+    """Whether the layer is natively hierarchical (COPC/EPT).
+
+    QGIS also builds an octree for plain local LAS/LAZ files, so having an
+    index alone does not tell them apart.
+    """
+    provider = cloud_layer.dataProvider()
+    name = provider.name().lower() if provider is not None else ''
+    source = cloud_layer.source().lower()
+    return name in OCTREE_PROVIDERS or source.endswith(('.copc.laz', 'ept.json'))
+
+
+def octree_index(cloud_layer):
+    """Returns the hierarchical index of a COPC/EPT (or already indexed) layer, or None."""
+    provider = cloud_layer.dataProvider()
+    if provider is None or not hasattr(provider, 'index'):
+        return None
+    index = provider.index()
+    if index is None or not index.isValid():
+        return None
+    return index
+
+
+class OctreeQuery:
+    """Fetches the points inside a polygon from a QGIS point cloud index.
+
+    Only nodes whose extent intersects the polygon are read, subtrees outside
+    it are pruned, and the point-in-polygon test runs only on nodes that cross
+    the polygon boundary; nodes fully inside are taken whole.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.request = QgsPointCloudRequest()
+        collection = QgsPointCloudAttributeCollection()
+        for attribute in index.attributes().attributes():
+            if attribute.name() in QUERY_ATTRIBUTES:
+                collection.push_back(attribute)
+        self.request.setAttributes(collection)
+
+    def iter_chunks(self, geometry, region):
+        """Yields the points inside ``geometry`` (in the cloud CRS) node by node."""
+        engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+        engine.prepareGeometry()
+        stack = [self._root()]
+        while stack:
+            node = stack.pop()
+            extent = QgsGeometry.fromRect(self._extent(node))
+            if not engine.intersects(extent.constGet()):
+                continue
+            stack.extend(self._children(node))
+
+            block = self.index.nodeData(node, self.request)
+            if block is None or block.pointCount() == 0:
+                continue
+            chunk = decode_block(block)
+            if not engine.contains(extent.constGet()):
+                inside = region.contains(chunk['x'], chunk['y'])
+                chunk = {key: values[inside] for key, values in chunk.items()}
+            if chunk['x'].size:
+                yield chunk
+
+    def iter_ground_chunks(self, tiles, tile_size=TIN_TILE_SIZE):
+        """Yields the ground points in ``tiles`` (see ``ground_tiles``), reading each node once for every polygon."""
+        stack = [self._root()]
+        while stack:
+            node = stack.pop()
+            extent = self._extent(node)
+            cols = np.floor(np.array([extent.xMinimum(), extent.xMaximum()]) / tile_size)
+            rows = np.floor(np.array([extent.yMinimum(), extent.yMaximum()]) / tile_size)
+            if not ((tiles[:, 0] >= cols[0]) & (tiles[:, 0] <= cols[1])
+                    & (tiles[:, 1] >= rows[0]) & (tiles[:, 1] <= rows[1])).any():
+                continue
+            stack.extend(self._children(node))
+
+            block = self.index.nodeData(node, self.request)
+            if block is None or block.pointCount() == 0:
+                continue
+            chunk = decode_block(block)
+            keep = (chunk['classification'] == GROUND_CLASS) & in_tiles(chunk['x'], chunk['y'], tiles, tile_size)
+            if keep.any():
+                yield {key: values[keep] for key, values in chunk.items()}
+
+    # Compatibilidade entre a API antiga (IndexedPointCloudNode) e a nova (QgsPointCloudNodeId) do QGIS
+    def _root(self):
+        return self.index.root()
+
+    def _children(self, node):
+        if hasattr(self.index, 'nodeChildren'):
+            return self.index.nodeChildren(node)
+        return self.index.getNode(node).children()
+
+    def _extent(self, node):
+        if hasattr(self.index, 'nodeMapExtent'):
+            return self.index.nodeMapExtent(node)
+        return self.index.getNode(node).bounds().toRectangle()
+
+
+def decode_block(block):
+    """Converts a ``QgsPointCloudBlock`` into a dict of NumPy arrays."""
+    attributes = block.attributes()
+    names, formats, offsets = [], [], []
+    offset = 0
+    for attribute in attributes.attributes():
+        names.append(attribute.name())
+        formats.append(_NUMPY_TYPES[attribute.type()])
+        offsets.append(offset)
+        offset += attribute.size()
+    dtype = np.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                      'itemsize': attributes.pointRecordSize()})
+    records = np.frombuffer(bytes(block.data()), dtype=dtype, count=block.pointCount())
+
+    scale = block.scale()
+    shift = block.offset()
+    # X, Y e Z vêm como inteiros escalados, como no formato LAS
+    chunk = {
+        'x': records['X'] * scale.x() + shift.x(),
+        'y': records['Y'] * scale.y() + shift.y(),
+        'z': records['Z'] * scale.z() + shift.z(),
+    }
+    if 'Classification' in names:
+        chunk['classification'] = records['Classification'].astype(np.uint8)
+    else:
+        chunk['classification'] = np.zeros(records.size, dtype=np.uint8)
+    return chunk
@@ -0,0 +1,114 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import math
+import struct
+
+import numpy as np
+from osgeo import gdal # type: ignore
+
+from .tnc_carbon_table_outputs import write_geopackage
+
+AGGREGATE_NODATA = -9999.0
+DEFAULT_CELL_SIZE_M = 100.0 # 1 ha
+
+
+class CellAggregator:
+    """Reduces the per-pixel carbon density (ton/ha) into coarse grid cells.
+
+    The grid starts at the raster origin and each pixel goes to the cell
+    holding its center, so the cell size does not need to be a multiple of
+    the pixel size. ``partial`` runs on one strip of rows (in the compute
+    threads) and returns the sums of the rows of cells it touches; ``add``
+    folds them into the totals (in the writer thread). Nodata pixels are left
+    out, so each cell also knows its valid area.
+    """
+
+    def __init__(self, geotransform, xsize, ysize, cell_size):
+        pixel_width = abs(geotransform[1])
+        self.pixel_height = abs(geotransform[5])
+        self.cell_size = cell_size
+        self.cols = max(1, math.ceil(xsize * pixel_width / cell_size))
+        self.rows = max(1, math.ceil(ysize * self.pixel_height / cell_size))
+        self.geotransform = (geotransform[0], cell_size, 0.0, geotransform[3], 0.0, -cell_size)
+        # Célula de cada coluna de pixels, calculada uma única vez
+        self.column_cells = np.minimum(((np.arange(xsize) + 0.5) * pixel_width // cell_size).astype(np.int64), self.cols - 1)
+        self.sums = np.zeros(self.rows * self.cols, dtype=np.float64)
+        self.counts = np.zeros(self.rows * self.cols, dtype=np.int64)
+
+    def partial(self, yoff, values, valid):
+        rows = values.shape[0]
+        row_cells = np.minimum(((np.arange(yoff, yoff + rows) + 0.5) * self.pixel_height // self.cell_size).astype(np.int64),
+                               self.rows - 1)
+        first = int(row_cells[0])
+        size = (int(row_cells[-1]) - first + 1) * self.cols
+        index = ((row_cells - first)[:, None] * self.cols + self.column_cells[None, :])[valid]
+        sums = np.bincount(index, weights=values[valid].astype(np.float64), minlength=size)
+        counts = np.bincount(index, minlength=size)
+        return first * self.cols, sums, counts
+
+    def add(self, partial):
+        offset, sums, counts = partial
+        self.sums[offset:offset + sums.size] += sums
+        self.counts[offset:offset + counts.size] += counts
+
+    def state(self):
+        """Accumulated cell sums as arrays, for a checkpoint journal (see ``restore``)."""
+        return {'cell_sums': self.sums, 'cell_counts': self.counts}
+
+    def restore(self, state):
+        self.sums = np.array(state['cell_sums'], dtype=np.float64)
+        self.counts = np.array(state['cell_counts'], dtype=np.int64)
+
+    def carbon_columns(self, pixel_area_m2):
+        """Mean density (ton/ha), carbon (ton) and valid area (ha) per cell; NaN where empty."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            density = np.where(self.counts > 0, self.sums / self.counts, np.nan)
+        area_ha = self.counts * pixel_area_m2 / 10000
+        carbon_ton = np.where(self.counts > 0, self.sums * pixel_area_m2 / 10000, np.nan)
+        return density, carbon_ton, area_ha
+
+    def cell_polygon_wkb(self, cell):
+        row, col = divmod(int(cell), self.cols)
+        x0 = self.geotransform[0] + col * self.cell_size
+        y0 = self.geotransform[3] - row * self.cell_size
+        x1, y1 = x0 + self.cell_size, y0 - self.cell_size
+        # WKB de um polígono com um anel de 5 vértices em sentido anti-horário (little endian)
+        return struct.pack('<BIII10d', 1, 3, 1, 5, x0, y1, x1, y1, x1, y0, x0, y0, x0, y1)
+
+
+def write_aggregate_raster(path, aggregator, pixel_area_m2, projection):
+    density, carbon_ton, area_ha = aggregator.carbon_columns(pixel_area_m2)
+    driver = gdal.GetDriverByName('GTiff')
+    out_ds = driver.Create(path, aggregator.cols, aggregator.rows, 3, gdal.GDT_Float32, ['COMPRESS=DEFLATE'])
+    out_ds.SetGeoTransform(aggregator.geotransform)
+    out_ds.SetProjection(projection)
+    for number, (description, values) in enumerate([
+        ('Carbon Density (ton/ha)', density),
+        ('Carbon (ton)', carbon_ton),
+        ('Valid area (ha)', area_ha),
+    ], 1):
+        band = out_ds.GetRasterBand(number)
+        band.SetDescription(description)
+        band.SetNoDataValue(AGGREGATE_NODATA)
+        band.WriteArray(np.where(np.isnan(values), AGGREGATE_NODATA, values)
+                        .reshape(aggregator.rows, aggregator.cols).astype(np.float32))
+    out_ds.FlushCache()
+    out_ds = None
+
+
+def write_aggregate_vector(path, aggregator, pixel_area_m2, projection):
+    """GeoPackage with one square polygon per cell that has valid pixels."""
+    density, carbon_ton, area_ha = aggregator.carbon_columns(pixel_area_m2)
+    cells = np.flatnonzero(aggregator.counts > 0)
+    columns = {
+        'cell': cells,
+        'Carbon Density (ton/ha)': density[cells],
+        'Carbon (ton)': carbon_ton[cells],
+        'Valid area (ha)': area_ha[cells],
+    }
+    geometries = [aggregator.cell_polygon_wkb(cell) for cell in cells]
+    write_geopackage(path, 'carbon_grid', columns, geometries, projection)
@@ -0,0 +1,610 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+from qgis.PyQt.QtCore import QCoreApplication # type: ignore
+from qgis.core import (QgsProcessingAlgorithm, # type: ignore
+                       QgsWkbTypes,
+                       QgsRasterLayer,
+                       QgsProcessingParameterVectorLayer,
+                       QgsProcessingParameterRasterLayer,
+                       QgsProcessingParameterNumber,
+                       QgsProcessingParameterBoolean,
+                       QgsProcessingParameterField,
+                       QgsProcessingParameterFile,
+                       QgsProcessingParameterString,
+                       QgsProcessingParameterRasterDestination,
+                       QgsProcessingParameterFileDestination,
+                       QgsProcessingParameterDefinition,
+                       QgsProcessingException)
+
+from osgeo import gdal, osr # type: ignore
+
+from .tnc_carbon_zonal_results import (ZonalResults, add_uncertainty, attribute_field_names, polygon_zonal_results,
+                                       record_zonal_run, write_zonal_csv, write_zonal_tables)
+from .tnc_carbon_uncertainty import DEFAULT_CONFIDENCE, DEFAULT_PLOT_AREA_HA, LinearModelUncertainty, parse_covariance
+from .tnc_carbon_table_outputs import parquet_available
+from .tnc_carbon_raster_aggregate import (DEFAULT_CELL_SIZE_M, CellAggregator, write_aggregate_raster,
+                                          write_aggregate_vector)
+from .tnc_carbon_chm_histogram import ChmHistogram, parse_thresholds, write_sweep_csv
+from .tnc_carbon_zone_raster import rasterize_zones, zone_reader
+from .tnc_carbon_local_canopy import LocalCanopyCover
+from .tnc_carbon_tree_detection import DEFAULT_MIN_TREE_HEIGHT, TreeDetector, tree_columns, tree_zones, write_tree_points
+from .tnc_carbon_raster_pipeline import (MODEL_PASS, chm_reader, count_canopy_cover, dtm_dsm_reader, raster_windows,
+                                         write_model_raster)
+from .tnc_carbon_checkpoint import open_checkpoint, resumable_output
+from .tnc_carbon_execution_plan import plan_raster_run
+
+
+class TNC_Carbon_Raster_Algorithm(QgsProcessingAlgorithm):
+    """Carbon of a canopy height raster with the linear model ``MODEL_COEFFICIENTS`` of a biome.
+
+    Holds the parameters, the two windowed passes and every output shared by
+    the biome algorithms. The subclasses below declare and open the height
+    input (``initInputs``/``openInputs``); the biome classes only set the
+    coefficients, the name and the group.
+    """
+    INPUT_POLYGON = 'INPUT_POLYGON'
+    INPUT_CANOPY_COVER_THRESHOLD = 'INPUT_CANOPY_COVER_THRESHOLD'
+    INPUT_LOCAL_CANOPY_WINDOW = 'INPUT_LOCAL_CANOPY_WINDOW'
+    INPUT_DETECT_TREES = 'INPUT_DETECT_TREES'
+    INPUT_MIN_TREE_HEIGHT = 'INPUT_MIN_TREE_HEIGHT'
+    INPUT_INCLUDE_ATTRIBUTES = 'INPUT_INCLUDE_ATTRIBUTES'
+    INPUT_ATTRIBUTE_FIELDS = 'INPUT_ATTRIBUTE_FIELDS'
+    INPUT_REGISTRY = 'INPUT_REGISTRY'
+    INPUT_REGISTRY_CAMPAIGN = 'INPUT_REGISTRY_CAMPAIGN'
+    INPUT_REGISTRY_KEY_FIELD = 'INPUT_REGISTRY_KEY_FIELD'
+    INPUT_AGGREGATE_CELL_SIZE = 'INPUT_AGGREGATE_CELL_SIZE'
+    INPUT_COEFFICIENT_COVARIANCE = 'INPUT_COEFFICIENT_COVARIANCE'
+    INPUT_RESIDUAL_SE = 'INPUT_RESIDUAL_SE'
+    INPUT_RESIDUAL_PLOT_AREA = 'INPUT_RESIDUAL_PLOT_AREA'
+    INPUT_CONFIDENCE_LEVEL = 'INPUT_CONFIDENCE_LEVEL'
+    INPUT_MONTE_CARLO_ITERATIONS = 'INPUT_MONTE_CARLO_ITERATIONS'
+    INPUT_THRESHOLD_SWEEP = 'INPUT_THRESHOLD_SWEEP'
+    INPUT_CHECKPOINT = 'INPUT_CHECKPOINT'
+    INPUT_MEMORY_BUDGET = 'INPUT_MEMORY_BUDGET'
+    OUTPUT_RASTER = 'OUTPUT_RASTER'
+    OUTPUT_AGGREGATE = 'OUTPUT_AGGREGATE'
+    OUTPUT_AGGREGATE_VECTOR = 'OUTPUT_AGGREGATE_VECTOR'
+    OUTPUT_CSV = 'OUTPUT_CSV'
+    OUTPUT_GPKG = 'OUTPUT_GPKG'
+    OUTPUT_PARQUET = 'OUTPUT_PARQUET'
+    OUTPUT_HISTOGRAM = 'OUTPUT_HISTOGRAM'
+    OUTPUT_SWEEP_CSV = 'OUTPUT_SWEEP_CSV'
+    OUTPUT_TREES = 'OUTPUT_TREES'
+
+    # Intercepto, taxa de cobertura de dossel e CHM, definidos em cada bioma
+    MODEL_COEFFICIENTS = None
+
+    def initAlgorithm(self, config=None):
+        self.initInputs()
+        self.addParameter(
+            QgsProcessingParameterVectorLayer(
+                self.INPUT_POLYGON,
+                self.tr('Polygon layer'),
+                [QgsWkbTypes.PolygonGeometry],
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.INPUT_CANOPY_COVER_THRESHOLD, 
+                self.tr('Canopy cover threshold (default = 2.0m)'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=2.0,
+                optional=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.INPUT_LOCAL_CANOPY_WINDOW,
+                self.tr('Local canopy cover window in meters (0 = one rate for the whole raster)'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=0.0,
+                minValue=0.0,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.INPUT_DETECT_TREES,
+                self.tr('Detect individual trees (tree count and heights per polygon)'),
+                defaultValue=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.INPUT_MIN_TREE_HEIGHT,
+                self.tr('Minimum tree height (default = 2.0m)'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=DEFAULT_MIN_TREE_HEIGHT,
+                minValue=0.0,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.INPUT_INCLUDE_ATTRIBUTES,
+                self.tr('Include polygon attributes in the CSV'),
+                defaultValue=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.INPUT_ATTRIBUTE_FIELDS,
+                self.tr('Only these attributes'),
+                parentLayerParameterName=self.INPUT_POLYGON,
+                allowMultiple=True,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterRasterDestination(
+                self.OUTPUT_RASTER, 
+                self.tr('Output raster layer'),
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.INPUT_AGGREGATE_CELL_SIZE,
+                self.tr('Aggregated grid cell size in meters (default = 100m, 1 ha)'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=DEFAULT_CELL_SIZE_M,
+                minValue=0.0,
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterRasterDestination(
+                self.OUTPUT_AGGREGATE,
+                self.tr('Output aggregated carbon grid'),
+                optional=True,
+                createByDefault=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_AGGREGATE_VECTOR,
+                self.tr('Output aggregated carbon grid (polygons)'),
+                'GeoPackage files (*.gpkg)',
+                optional=True,
+                createByDefault=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_CSV,
+                self.tr('Output CSV file'),
+                'CSV files (*.csv)'
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_GPKG,
+                self.tr('Output GeoPackage with the carbon columns per polygon'),
+                'GeoPackage files (*.gpkg)',
+                optional=True,
+                createByDefault=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_PARQUET,
+                self.tr('Output GeoParquet file with the carbon columns per polygon'),
+                'Parquet files (*.parquet)',
+                optional=True,
+                createByDefault=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_HISTOGRAM,
+                self.tr('Output CHM histogram for threshold sweeps'),
+                'NumPy archives (*.npz)',
+                optional=True,
+                createByDefault=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterString(
+                self.INPUT_THRESHOLD_SWEEP,
+                self.tr('Canopy cover thresholds to sweep, comma separated (e.g. 1, 1.5, 2, 3, 5)'),
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_SWEEP_CSV,
+                self.tr('Output CSV with the carbon for each swept threshold'),
+                'CSV files (*.csv)',
+                optional=True,
+                createByDefault=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_TREES,
+                self.tr('Output tree tops (points)'),
+                'GeoPackage files (*.gpkg)',
+                optional=True,
+                createByDefault=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.INPUT_REGISTRY,
+                self.tr('Results registry (SQLite database, created if missing)'),
+                behavior=QgsProcessingParameterFile.File,
+                fileFilter='SQLite databases (*.sqlite *.db)',
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterString(
+                self.INPUT_REGISTRY_CAMPAIGN,
+                self.tr('Campaign label for the registry'),
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.INPUT_REGISTRY_KEY_FIELD,
+                self.tr('Polygon key field for the registry (e.g. property ID)'),
+                parentLayerParameterName=self.INPUT_POLYGON,
+                optional=True
+            )
+        )
+        for parameter in [
+            QgsProcessingParameterString(
+                self.INPUT_COEFFICIENT_COVARIANCE,
+                self.tr('Model coefficient covariance (6 or 9 values; intercept, canopy cover, CHM)'),
+                optional=True
+            ),
+            QgsProcessingParameterNumber(
+                self.INPUT_RESIDUAL_SE,
+                self.tr('Model residual standard error (ton/ha)'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=0.0,
+                minValue=0.0,
+                optional=True
+            ),
+            QgsProcessingParameterNumber(
+                self.INPUT_RESIDUAL_PLOT_AREA,
+                self.tr('Plot area of the model residuals (ha)'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=DEFAULT_PLOT_AREA_HA,
+                minValue=0.0,
+                optional=True
+            ),
+            QgsProcessingParameterNumber(
+                self.INPUT_CONFIDENCE_LEVEL,
+                self.tr('Confidence level (%)'),
+                type=QgsProcessingParameterNumber.Double,
+                defaultValue=DEFAULT_CONFIDENCE,
+                minValue=50.0,
+                maxValue=99.9,
+                optional=True
+            ),
+            QgsProcessingParameterNumber(
+                self.INPUT_MONTE_CARLO_ITERATIONS,
+                self.tr('Monte Carlo iterations (0 = analytical propagation)'),
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=0,
+                minValue=0,
+                optional=True
+            ),
+            QgsProcessingParameterBoolean(
+                self.INPUT_CHECKPOINT,
+                self.tr('Checkpoint the progress next to the output raster (a rerun resumes an interrupted run)'),
+                defaultValue=False
+            ),
+            QgsProcessingParameterNumber(
+                self.INPUT_MEMORY_BUDGET,
+                self.tr('Memory budget in MB (0 = half of the free memory)'),
+                type=QgsProcessingParameterNumber.Integer,
+                defaultValue=0,
+                minValue=0,
+                optional=True
+            ),
+        ]:
+            parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+            self.addParameter(parameter)
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # Receber camada de entrada e o caminho para a camada de saída
+        canopy_cover_threshold = self.parameterAsDouble(parameters, self.INPUT_CANOPY_COVER_THRESHOLD, context)
+        local_window_size = self.parameterAsDouble(parameters, self.INPUT_LOCAL_CANOPY_WINDOW, context)
+
+        polygon_layer = self.parameterAsVectorLayer(parameters, self.INPUT_POLYGON, context)
+        output_path = self.parameterAsOutputLayer(parameters, self.OUTPUT_RASTER, context)
+        csv_path = self.parameterAsFileOutput(parameters, self.OUTPUT_CSV, context)
+        include_attributes = self.parameterAsBoolean(parameters, self.INPUT_INCLUDE_ATTRIBUTES, context)
+        selected_fields = self.parameterAsFields(parameters, self.INPUT_ATTRIBUTE_FIELDS, context)
+        gpkg_path = self.parameterAsFileOutput(parameters, self.OUTPUT_GPKG, context)
+        parquet_path = self.parameterAsFileOutput(parameters, self.OUTPUT_PARQUET, context)
+        if parquet_path and not parquet_available():
+            raise QgsProcessingException(self.tr('Parquet output requires the pyarrow package'))
+        registry_path = self.parameterAsFile(parameters, self.INPUT_REGISTRY, context)
+        aggregate_path = self.parameterAsOutputLayer(parameters, self.OUTPUT_AGGREGATE, context)
+        uncertainty = self.modelUncertainty(parameters, context)
+        aggregate_vector_path = self.parameterAsFileOutput(parameters, self.OUTPUT_AGGREGATE_VECTOR, context)
+        histogram_path = self.parameterAsFileOutput(parameters, self.OUTPUT_HISTOGRAM, context)
+        sweep_path = self.parameterAsFileOutput(parameters, self.OUTPUT_SWEEP_CSV, context)
+        sweep_thresholds = self.sweepThresholds(parameters, context) if sweep_path else []
+        trees_path = self.parameterAsFileOutput(parameters, self.OUTPUT_TREES, context)
+        checkpoint = None
+        if self.parameterAsBoolean(parameters, self.INPUT_CHECKPOINT, context):
+            # Diário ao lado do raster de saída: rodar de novo com os mesmos parâmetros retoma de onde parou
+            checkpoint = open_checkpoint(self, parameters, context, output_path, feedback)
+
+        # Leitura, cálculo e escrita em janelas, com leitura antecipada e escrita em segundo plano
+        datasets, bands, read_chm, sources = self.openInputs(parameters, context)
+        reference_ds = datasets[0]
+        projection = reference_ds.GetProjection()
+        geotransform = reference_ds.GetGeoTransform()
+        pixel_width = abs(geotransform[1])
+        pixel_height = abs(geotransform[5])
+
+        linear_units_factor = osr.SpatialReference(wkt=projection).GetLinearUnits()
+        pixel_area_native = pixel_height * pixel_width
+
+        pixel_area_m2 = pixel_area_native * (linear_units_factor ** 2)
+        nodata_value = bands[0].GetNoDataValue()
+
+        trees = self.treeDetector(parameters, context, pixel_width * linear_units_factor,
+                                  pixel_height * linear_units_factor)
+        local_canopy = None
+        if local_window_size > 0:
+            # Taxa de cobertura de dossel em janela móvel ao redor de cada pixel, no lugar da taxa global
+            local_canopy = LocalCanopyCover(canopy_cover_threshold, local_window_size / linear_units_factor,
+                                            pixel_width, pixel_height)
+            feedback.pushInfo("Cobertura de dossel local em janelas de {} x {} pixels".format(*local_canopy.window_pixels()))
+            if uncertainty.enabled:
+                feedback.pushWarning("A incerteza do modelo usa a taxa de cobertura de dossel global")
+
+        # Plano a partir dos metadados, antes de ler qualquer pixel: motor, tamanho das janelas e threads
+        plan = plan_raster_run(bands, self.parameterAsDouble(parameters, self.INPUT_MEMORY_BUDGET, context),
+                               polygon_layer.featureCount() if polygon_layer is not None else 0,
+                               bool(histogram_path or sweep_path), local_canopy, trees)
+        plan.report(feedback)
+        windows = raster_windows(bands[0], rows=plan.window_rows)
+
+        # Rasterização única dos polígonos, compartilhada pelo histograma e pelas árvores
+        zones_ds = zone_ids = read_zones = histogram = None
+        if polygon_layer is not None and (histogram_path or sweep_path or trees is not None):
+            zones_ds, zone_ids = rasterize_zones(polygon_layer, reference_ds, context, feedback)
+        if histogram_path or sweep_path:
+            # Histograma do CHM preenchido na mesma passada da cobertura de dossel, por polígono quando houver
+            if zones_ds is not None:
+                read_zones = zone_reader(zones_ds.GetRasterBand(1))
+            histogram = ChmHistogram(zone_ids)
+
+        total_coverage, canopy_coverage = count_canopy_cover(read_chm, windows, canopy_cover_threshold, feedback=feedback,
+                                                             histogram=histogram, read_zones=read_zones,
+                                                             checkpoint=checkpoint, workers=plan.workers,
+                                                             queue_depth=plan.queue_depth)
+        if feedback.isCanceled():
+            return {}
+        canopy_cover_rate = canopy_coverage / total_coverage
+        if histogram_path:
+            histogram.save(histogram_path, pixel_area_m2)
+        if sweep_path:
+            write_sweep_csv(sweep_path, histogram.sweep(sweep_thresholds, self.MODEL_COEFFICIENTS, pixel_area_m2))
+
+        aggregator = None
+        if aggregate_path or aggregate_vector_path:
+            # Grade grossa reduzida na mesma passada que grava o raster de saída
+            cell_size_m = self.parameterAsDouble(parameters, self.INPUT_AGGREGATE_CELL_SIZE, context) or DEFAULT_CELL_SIZE_M
+            aggregator = CellAggregator(geotransform, reference_ds.RasterXSize, reference_ds.RasterYSize,
+                                        cell_size_m / linear_units_factor)
+
+        # Ao retomar, a passada do modelo continua no raster já gravado em parte
+        out_ds = resumable_output(checkpoint, MODEL_PASS, output_path)
+        if out_ds is None:
+            driver = gdal.GetDriverByName('GTiff')
+            out_ds = driver.Create(
+                output_path,
+                reference_ds.RasterXSize,
+                reference_ds.RasterYSize,
+                1,
+                gdal.GDT_Float32
+            )
+        out_ds.SetGeoTransform(geotransform)
+        out_ds.SetProjection(projection)
+        out_band = out_ds.GetRasterBand(1)
+        if nodata_value is not None:
+            out_band.SetNoDataValue(nodata_value)
+        model_complete = write_model_raster(read_chm, windows,
+                                            lambda chm, rate=canopy_cover_rate: self.applyModel(chm, rate),
+                                            out_band, nodata_value, aggregator, feedback=feedback,
+                                            local_canopy=local_canopy, trees=trees, checkpoint=checkpoint,
+                                            workers=plan.workers, queue_depth=plan.queue_depth)
+        out_band.FlushCache()
+        out_ds.FlushCache()
+        out_ds = None
+        if feedback.isCanceled() or not model_complete:
+            # Raster gravado só em parte: nada de estatísticas, agregados ou registro sobre ele, e o diário fica
+            return {}
+
+        if aggregate_path:
+            write_aggregate_raster(aggregate_path, aggregator, pixel_area_m2, projection)
+        if aggregate_vector_path:
+            write_aggregate_vector(aggregate_vector_path, aggregator, pixel_area_m2, projection)
+
+        if polygon_layer is None:
+            zonal_results = self.processTotalZonalStats(total_coverage, output_path)
+        else:
+            zonal_results = self.processPolygonZonalStats(polygon_layer, output_path, context, feedback)
+
+        if uncertainty.enabled:
+            iterations = self.parameterAsInt(parameters, self.INPUT_MONTE_CARLO_ITERATIONS, context)
+            zonal_results = add_uncertainty(zonal_results, uncertainty, canopy_cover_rate, pixel_area_m2, iterations,
+                                            with_total=polygon_layer is not None)
+
+        if trees is not None:
+            self.addTreeResults(trees, zonal_results, zones_ds, zone_ids, pixel_area_m2, trees_path, geotransform,
+                                projection, feedback)
+
+        attribute_fields = attribute_field_names(polygon_layer, include_attributes, selected_fields)
+        write_zonal_csv(csv_path, zonal_results, pixel_area_m2, polygon_layer, attribute_fields, feedback=feedback)
+
+        if registry_path:
+            inputs = dict(sources)
+            inputs[self.INPUT_POLYGON] = polygon_layer.source() if polygon_layer is not None else None
+            run_id = record_zonal_run(
+                registry_path, self.name(), self.groupId(), parameters, inputs, zonal_results, pixel_area_m2,
+                polygon_layer,
+                self.parameterAsString(parameters, self.INPUT_REGISTRY_KEY_FIELD, context) or None,
+                self.parameterAsString(parameters, self.INPUT_REGISTRY_CAMPAIGN, context) or None
+            )
+            feedback.pushInfo(f"Execução {run_id} registrada em {registry_path}")
+
+        outputs = {
+            self.OUTPUT_RASTER: output_path,
+            self.OUTPUT_CSV: csv_path
+        }
+        if aggregate_path:
+            outputs[self.OUTPUT_AGGREGATE] = aggregate_path
+        if aggregate_vector_path:
+            outputs[self.OUTPUT_AGGREGATE_VECTOR] = aggregate_vector_path
+        if histogram_path:
+            outputs[self.OUTPUT_HISTOGRAM] = histogram_path
+        if sweep_path:
+            outputs[self.OUTPUT_SWEEP_CSV] = sweep_path
+        if trees_path:
+            outputs[self.OUTPUT_TREES] = trees_path
+        if gpkg_path or parquet_path:
+            write_zonal_tables(zonal_results, pixel_area_m2, polygon_layer, attribute_fields, gpkg_path, parquet_path)
+            if gpkg_path:
+                outputs[self.OUTPUT_GPKG] = gpkg_path
+            if parquet_path:
+                outputs[self.OUTPUT_PARQUET] = parquet_path
+        if checkpoint is not None and model_complete:
+            # Só uma passada completa libera o diário; sem ele a próxima execução não retoma
+            checkpoint.remove()
+        return outputs
+
+    def applyModel(self, chm, canopy_cover_rate):
+        intercept, canopy_cover, height = self.MODEL_COEFFICIENTS
+        return intercept + canopy_cover * canopy_cover_rate + height * chm
+
+    def modelUncertainty(self, parameters, context):
+        try:
+            covariance = parse_covariance(self.parameterAsString(parameters, self.INPUT_COEFFICIENT_COVARIANCE, context))
+        except ValueError as error:
+            raise QgsProcessingException(self.tr('Invalid coefficient covariance: {}').format(error))
+        return LinearModelUncertainty(
+            self.MODEL_COEFFICIENTS,
+            covariance,
+            self.parameterAsDouble(parameters, self.INPUT_RESIDUAL_SE, context),
+            self.parameterAsDouble(parameters, self.INPUT_RESIDUAL_PLOT_AREA, context),
+            self.parameterAsDouble(parameters, self.INPUT_CONFIDENCE_LEVEL, context)
+        )
+
+    def sweepThresholds(self, parameters, context):
+        try:
+            thresholds = parse_thresholds(self.parameterAsString(parameters, self.INPUT_THRESHOLD_SWEEP, context))
+        except ValueError as error:
+            raise QgsProcessingException(self.tr('Invalid canopy cover thresholds: {}').format(error))
+        if not thresholds:
+            raise QgsProcessingException(self.tr('The threshold sweep needs at least one threshold'))
+        return thresholds
+
+    def treeDetector(self, parameters, context, pixel_width_m, pixel_height_m):
+        """Tree top detector of the run, or None when neither the detection nor the tree output was asked for."""
+        if not (self.parameterAsBoolean(parameters, self.INPUT_DETECT_TREES, context)
+                or self.parameterAsFileOutput(parameters, self.OUTPUT_TREES, context)):
+            return None
+        min_tree_height = self.parameterAsDouble(parameters, self.INPUT_MIN_TREE_HEIGHT, context)
+        return TreeDetector(min_tree_height, pixel_width_m, pixel_height_m)
+
+    def addTreeResults(self, trees, zonal_results, zones_ds, zone_ids, pixel_area_m2, trees_path, geotransform,
+                       projection, feedback):
+        """Adds the tree columns to ``zonal_results`` and writes the tree tops to ``trees_path`` when given."""
+        # Cada topo conta para o polígono do seu pixel, na mesma rasterização usada pelo histograma
+        tree_rows, tree_cols, tree_heights = trees.tops()
+        feedback.pushInfo(f"{tree_rows.size} árvores detectadas")
+        tree_zone = tree_zones(tree_rows, tree_cols, zones_ds.GetRasterBand(1)) if zones_ds is not None else None
+        zonal_results.extra.update(tree_columns(zonal_results.ids, zone_ids, tree_zone, tree_heights,
+                                                zonal_results.count * pixel_area_m2 / 10000))
+        if trees_path:
+            write_tree_points(trees_path, tree_rows, tree_cols, tree_heights, trees, geotransform, projection,
+                              zone_ids, tree_zone)
+
+    def processPolygonZonalStats(self, polygon_layer, output_path, context, feedback):
+        input_raster_layer = QgsRasterLayer(output_path, "processed_chm")
+        if not input_raster_layer.isValid():
+            feedback.reportError("Não foi possível criar raster")
+
+        zonal_results = polygon_zonal_results(polygon_layer, input_raster_layer, context, feedback)
+        for feature_id in zonal_results.uncovered_ids():
+            feedback.pushWarning(f"Feature {feature_id} não cobre nenhum pixel da camada")
+        return zonal_results
+
+    def processTotalZonalStats(self, count, output_path):
+        out_ds = gdal.Open(output_path)
+        out_band = out_ds.GetRasterBand(1)
+        _, _, mean, _ = out_band.GetStatistics(0, 1)
+        return ZonalResults([-1], [count], [mean])
+
+    def tr(self, string):
+        return QCoreApplication.translate('Processing', string)
+
+
+class TNC_Carbon_CHM_Algorithm(TNC_Carbon_Raster_Algorithm):
+    """Biome algorithm reading the heights from a CHM raster."""
+    INPUT_RASTER = 'INPUT_RASTER'
+
+    def initInputs(self):
+        self.addParameter(
+            QgsProcessingParameterRasterLayer(
+                self.INPUT_RASTER,
+                self.tr('Canopy height model raster layer (CHM)')
+            )
+        )
+
+    def openInputs(self, parameters, context):
+        """Returns ``(datasets, bands, read_chm, sources)``: the CHM dataset and band, their reader and the path."""
+        raster_layer = self.parameterAsRasterLayer(parameters, self.INPUT_RASTER, context)
+        chm_ds = gdal.Open(raster_layer.source())
+        chm_band = chm_ds.GetRasterBand(1)
+        return [chm_ds], [chm_band], chm_reader(chm_band), {self.INPUT_RASTER: raster_layer.source()}
+
+    def displayName(self):
+        return self.tr('Canopy Height Model (CHM)')
+
+
+class TNC_Carbon_DTM_DSM_Algorithm(TNC_Carbon_Raster_Algorithm):
+    """Biome algorithm computing the heights as ``|DSM - DTM|``; the DTM is the reference grid."""
+    INPUT_RASTER_DTM = 'INPUT_RASTER_DTM'
+    INPUT_RASTER_DSM = 'INPUT_RASTER_DSM'
+
+    def initInputs(self):
+        self.addParameter(
+            QgsProcessingParameterRasterLayer(
+                self.INPUT_RASTER_DTM,
+                self.tr('Digital terrain model raster layer (DTM)')
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterRasterLayer(
+                self.INPUT_RASTER_DSM,
+                self.tr('Digital surface model raster layer (DSM)')
+            )
+        )
+
+    def openInputs(self, parameters, context):
+        """Returns ``(datasets, bands, read_chm, sources)`` for the DTM and DSM pair, the DTM first."""
+        raster_layer_dtm = self.parameterAsRasterLayer(parameters, self.INPUT_RASTER_DTM, context)
+        raster_layer_dsm = self.parameterAsRasterLayer(parameters, self.INPUT_RASTER_DSM, context)
+        dtm_ds = gdal.Open(raster_layer_dtm.source())
+        dsm_ds = gdal.Open(raster_layer_dsm.source())
+        dtm_band = dtm_ds.GetRasterBand(1)
+        dsm_band = dsm_ds.GetRasterBand(1)
+        sources = {self.INPUT_RASTER_DTM: raster_layer_dtm.source(), self.INPUT_RASTER_DSM: raster_layer_dsm.source()}
+        return [dtm_ds, dsm_ds], [dtm_band, dsm_band], dtm_dsm_reader(dtm_band, dsm_band), sources
+
+    def displayName(self):
+        return self.tr('Digital Terrain Model + Digital Surface Model (DTM + DSM)')
@@ -0,0 +1,302 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import collections
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .tnc_carbon_point_cloud_io import prefetch
+
+# Pixels por janela (~16 MB em float32) e profundidade das filas entre os estágios
+DEFAULT_WINDOW_PIXELS = 1 << 22
+DEFAULT_QUEUE_DEPTH = 4
+DEFAULT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+# Nomes das passadas no diário de checkpoint, na ordem em que rodam
+CANOPY_PASS = 'canopy'
+MODEL_PASS = 'model'
+
+_END = object()
+
+
+def raster_windows(band, window_pixels=DEFAULT_WINDOW_PIXELS, rows=None):
+    """Full-width row strips ``(yoff, rows)`` aligned to the band's block height.
+
+    ``rows`` fixes the strip height instead (see ``ExecutionPlan``), which
+    may be below the block height when the memory budget requires it.
+    """
+    xsize, ysize = band.XSize, band.YSize
+    if rows is None:
+        rows = window_rows(window_pixels, xsize, ysize, band.GetBlockSize()[1])
+    rows = max(1, rows)
+    return [(yoff, min(rows, ysize - yoff)) for yoff in range(0, ysize, rows)]
+
+
+def window_rows(window_pixels, xsize, ysize, block_rows):
+    """Rows per strip: about ``window_pixels`` pixels, rounded to whole blocks."""
+    block_rows = max(1, block_rows)
+    if block_rows >= ysize:
+        # Raster em uma única faixa: alinhar aos blocos faria do raster inteiro uma só janela
+        block_rows = 1
+    return max(block_rows, (window_pixels // max(1, xsize)) // block_rows * block_rows)
+
+
+def chm_reader(chm_band):
+    """Window reader for a CHM band: returns ``(chm, nodata_mask)``."""
+    nodata_value = chm_band.GetNoDataValue()
+
+    def read(window):
+        yoff, rows = window
+        chm = chm_band.ReadAsArray(0, yoff, chm_band.XSize, rows).astype(np.float32)
+        return chm, _nodata_mask(chm, nodata_value)
+    return read
+
+
+def dtm_dsm_reader(dtm_band, dsm_band):
+    """Window reader computing the CHM as ``|DSM - DTM|``; the DTM nodata marks invalid pixels."""
+    nodata_value = dtm_band.GetNoDataValue()
+
+    def read(window):
+        yoff, rows = window
+        dtm = dtm_band.ReadAsArray(0, yoff, dtm_band.XSize, rows).astype(np.float32)
+        dsm = dsm_band.ReadAsArray(0, yoff, dtm_band.XSize, rows).astype(np.float32)
+        # O CHM é sempre positivo, então a ordem das entradas não importa
+        return np.abs(dsm - dtm), _nodata_mask(dtm, nodata_value)
+    return read
+
+
+def count_canopy_cover(read, windows, threshold, workers=DEFAULT_WORKERS, feedback=None, progress=(0, 50),
+                       histogram=None, read_zones=None, checkpoint=None, queue_depth=DEFAULT_QUEUE_DEPTH):
+    """First pass: returns ``(valid_pixels, canopy_pixels)`` over the whole raster.
+
+    With a ``histogram`` (see ``ChmHistogram``) the CHM heights are also
+    binned in the same pass, per zone when ``read_zones`` is given. With a
+    ``checkpoint`` (see ``RasterCheckpoint``) the pass resumes after the
+    rows it records, with the counts restored.
+    """
+    totals = [0, 0]
+    done, state = checkpoint.resume(CANOPY_PASS, [histogram]) if checkpoint is not None else (0, None)
+    start = done
+    if state is not None:
+        totals = [int(value) for value in state['canopy_totals']]
+        if histogram is not None:
+            histogram.restore(state)
+    if read_zones is not None:
+        read_chm = read
+
+        def read(window):
+            return read_chm(window), read_zones(window)
+
+    def count(window, data):
+        zone_ids = None
+        if read_zones is not None:
+            data, zone_ids = data
+        chm, nodata_mask = data
+        valid = ~nodata_mask
+        partial = histogram.partial(zone_ids, chm, valid) if histogram is not None else None
+        return int(np.count_nonzero(valid)), int(np.count_nonzero((chm >= threshold) & valid)), partial
+
+    def add(window, counts):
+        nonlocal done
+        totals[0] += counts[0]
+        totals[1] += counts[1]
+        if counts[2] is not None:
+            histogram.add(counts[2])
+        done = window[0] + window[1]
+        if checkpoint is not None:
+            checkpoint.update(CANOPY_PASS, done, canopy_state)
+
+    def canopy_state():
+        state = {'canopy_totals': np.array(totals, dtype=np.int64)}
+        if histogram is not None:
+            state.update(histogram.state())
+        return state
+
+    run_pipeline(remaining_windows(windows, start), read, count, add, workers, queue_depth, feedback=feedback,
+                 progress=progress)
+    if checkpoint is not None and done > start:
+        checkpoint.update(CANOPY_PASS, done, canopy_state, force=True)
+    return totals[0], totals[1]
+
+
+def write_model_raster(read, windows, model, out_band, nodata_value, aggregator=None, workers=DEFAULT_WORKERS,
+                       feedback=None, progress=(50, 100), local_canopy=None, trees=None, checkpoint=None,
+                       queue_depth=DEFAULT_QUEUE_DEPTH):
+    """Second pass: applies ``model(chm)`` window by window and writes the result to ``out_band``.
+
+    With an ``aggregator`` (see ``CellAggregator``) the windows are also
+    reduced into coarse cells in the same pass. With ``local_canopy`` (see
+    ``LocalCanopyCover``) the model is called as ``model(chm, canopy_cover_rate)``
+    with the per-pixel rate, and with ``trees`` (see ``TreeDetector``) the tree
+    tops are found in the same pass. Both need neighbouring rows, so the
+    strips are then read with the largest halo of the two.
+
+    With a ``checkpoint`` the pass resumes after the rows it records
+    (``out_band`` must then be the raster written so far, see
+    ``resumable_output``), with the aggregator and the tree tops restored.
+    Returns whether every row was written (False when canceled).
+    """
+    ysize = out_band.YSize
+    done, state = checkpoint.resume(MODEL_PASS, [aggregator, trees]) if checkpoint is not None else (0, None)
+    start = done
+    if state is not None:
+        if aggregator is not None:
+            aggregator.restore(state)
+        if trees is not None:
+            trees.restore(state)
+    halo = max([stage.halo_y for stage in (local_canopy, trees) if stage is not None], default=0)
+    if halo:
+        read = halo_reader(read, halo, ysize)
+
+    def compute(window, data):
+        top = halo_extent(window, halo, ysize)[0]
+        found = trees.detect(window, top, data) if trees is not None else None
+        if local_canopy is not None:
+            chm, nodata_mask, canopy_cover_rate = local_canopy.rates(window, top, data)
+            result = np.asarray(model(chm, canopy_cover_rate), dtype=np.float32)
+        else:
+            start = window[0] - top
+            chm, nodata_mask = (values[start:start + window[1]] for values in data)
+            result = np.asarray(model(chm), dtype=np.float32)
+        partial = None
+        if aggregator is not None:
+            partial = aggregator.partial(window[0], result, ~nodata_mask & np.isfinite(result))
+        if nodata_value is not None:
+            result[nodata_mask] = nodata_value
+        return result, partial, found
+
+    def write(window, computed):
+        nonlocal done
+        result, partial, found = computed
+        out_band.WriteArray(result, 0, window[0])
+        if partial is not None:
+            aggregator.add(partial)
+        if found is not None:
+            trees.add(found)
+        done = window[0] + window[1]
+        if checkpoint is not None:
+            checkpoint.update(MODEL_PASS, done, model_state)
+
+    def model_state():
+        # As janelas contadas no diário precisam estar no arquivo antes dele
+        out_band.GetDataset().FlushCache()
+        state = {}
+        if aggregator is not None:
+            state.update(aggregator.state())
+        if trees is not None:
+            state.update(trees.state())
+        return state
+
+    run_pipeline(remaining_windows(windows, start), read, compute, write, workers, queue_depth, feedback=feedback,
+                 progress=progress)
+    if checkpoint is not None and done > start:
+        checkpoint.update(MODEL_PASS, done, model_state, force=True)
+    return done >= ysize
+
+
+def remaining_windows(windows, rows_done):
+    """Windows still to run after the first ``rows_done`` rows; the one holding that row is cut to start there.
+
+    A resumed pass may use windows of another size than the interrupted one
+    (e.g. a new execution plan), so progress is kept in rows.
+    """
+    remaining = []
+    for yoff, rows in windows:
+        if yoff + rows > rows_done:
+            start = max(yoff, rows_done)
+            remaining.append((start, yoff + rows - start))
+    return remaining
+
+
+def halo_extent(window, halo, ysize):
+    """First and last (exclusive) rows of ``window`` extended by ``halo`` rows on each side, clipped to the raster."""
+    yoff, rows = window
+    return max(0, yoff - halo), min(ysize, yoff + rows + halo)
+
+
+def halo_reader(read, halo, ysize):
+    """Wraps a window reader so each strip comes with ``halo`` extra rows above and below."""
+    def read_with_halo(window):
+        top, bottom = halo_extent(window, halo, ysize)
+        return read((top, bottom - top))
+    return read_with_halo
+
+
+def run_pipeline(windows, read, compute, write, workers=DEFAULT_WORKERS, queue_depth=DEFAULT_QUEUE_DEPTH,
+                 feedback=None, progress=None):
+    """Three-stage pipeline over raster windows.
+
+    ``read(window)`` runs in a read-ahead thread, ``compute(window, data)``
+    in a pool of ``workers`` threads and ``write(window, result)`` in a
+    write-behind thread, in window order. The queues between the stages are
+    bounded, so at most about ``queue_depth + workers + queue_depth`` windows
+    are held in memory at once. GDAL and NumPy release the GIL during I/O and
+    array operations, so the stages overlap.
+
+    Each GDAL dataset is only touched by one stage (reads by the reader,
+    writes by the writer). Errors in any stage are raised in the caller.
+    """
+    windows = list(windows)
+    write_queue = queue.Queue(maxsize=max(1, queue_depth))
+    writer_errors = []
+
+    def drain():
+        while True:
+            item = write_queue.get()
+            if item is _END:
+                return
+            if writer_errors:
+                continue
+            try:
+                write(*item)
+            except BaseException as error:
+                writer_errors.append(error)
+
+    writer = threading.Thread(target=drain, name='tnccc-writer', daemon=True)
+    writer.start()
+    pending = collections.deque()
+    done = 0
+
+    def flush_oldest():
+        nonlocal done
+        window, future = pending.popleft()
+        write_queue.put((window, future.result()))
+        done += 1
+        if feedback is not None and progress is not None:
+            start, end = progress
+            feedback.setProgress(start + (end - start) * done / max(len(windows), 1))
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='tnccc-compute') as pool:
+            try:
+                for window, data in prefetch(((window, read(window)) for window in windows), queue_depth):
+                    if writer_errors or (feedback is not None and feedback.isCanceled()):
+                        break
+                    pending.append((window, pool.submit(compute, window, data)))
+                    # Mantém no máximo uma janela em espera por thread de cálculo
+                    while len(pending) > workers:
+                        flush_oldest()
+                while pending and not writer_errors and not (feedback is not None and feedback.isCanceled()):
+                    flush_oldest()
+            finally:
+                for _, future in pending:
+                    future.cancel()
+    finally:
+        write_queue.put(_END)
+        writer.join()
+    if writer_errors:
+        raise writer_errors[0]
+
+
+def _nodata_mask(values, nodata_value):
+    if nodata_value is None:
+        return np.zeros(values.shape, dtype=bool)
+    if np.isnan(nodata_value):
+        return np.isnan(values)
+    return values == nodata_value
@@ -0,0 +1,128 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+
+from .tnc_carbon_point_cloud_index_cache import file_fingerprint
+
+REGISTRY_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    algorithm TEXT NOT NULL,
+    biome TEXT,
+    campaign TEXT,
+    parameters TEXT
+);
+CREATE TABLE IF NOT EXISTS run_inputs (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    source TEXT,
+    fingerprint TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    zone_id INTEGER NOT NULL,
+    zone_key TEXT,
+    sample_count INTEGER,
+    carbon_density_ton_ha REAL,
+    carbon_density_kg_m2 REAL,
+    carbon_ton REAL,
+    carbon_kg REAL,
+    metrics TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_campaign ON runs(campaign, started_at);
+CREATE INDEX IF NOT EXISTS runs_biome ON runs(biome, started_at);
+CREATE INDEX IF NOT EXISTS run_inputs_run ON run_inputs(run_id);
+CREATE INDEX IF NOT EXISTS run_inputs_fingerprint ON run_inputs(fingerprint);
+CREATE UNIQUE INDEX IF NOT EXISTS results_run_zone ON results(run_id, zone_id);
+CREATE INDEX IF NOT EXISTS results_zone_key ON results(zone_key, run_id);
+CREATE VIEW IF NOT EXISTS zone_history AS
+    SELECT runs.run_id, runs.started_at, runs.campaign, runs.biome, runs.algorithm,
+           results.zone_id, results.zone_key, results.sample_count,
+           results.carbon_density_ton_ha, results.carbon_density_kg_m2, results.carbon_ton, results.carbon_kg
+    FROM results JOIN runs ON runs.run_id = results.run_id;
+"""
+
+INSERT_RUN = 'INSERT INTO runs (started_at, algorithm, biome, campaign, parameters) VALUES (?, ?, ?, ?, ?)'
+INSERT_INPUT = 'INSERT INTO run_inputs (run_id, name, source, fingerprint) VALUES (?, ?, ?, ?)'
+INSERT_RESULT = ('INSERT INTO results (run_id, zone_id, zone_key, sample_count, carbon_density_ton_ha, '
+                 'carbon_density_kg_m2, carbon_ton, carbon_kg, metrics) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+
+class RunRegistry:
+    """Local SQLite store with the history of every run and its per-polygon results.
+
+    Each run appends one row to ``runs`` (algorithm, biome, campaign label and
+    the processing parameters as JSON), its input sources with a fingerprint
+    in ``run_inputs``, and one row per polygon in ``results``. The
+    ``zone_history`` view joins results and runs, so "carbon of a property
+    across campaigns" is a single indexed query on ``zone_key``.
+
+    It is a plain SQLite file, so it opens directly in the QGIS DB Manager.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version < REGISTRY_VERSION:
+            with self.connection:
+                self.connection.executescript(SCHEMA)
+                self.connection.execute(f'PRAGMA user_version = {REGISTRY_VERSION}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def record_run(self, algorithm, biome, parameters, inputs, rows, campaign=None):
+        """Appends a run in a single transaction and returns its ``run_id``.
+
+        ``inputs`` maps parameter names to source paths; ``rows`` yields
+        ``(zone_id, zone_key, sample_count, ton_ha, kg_m2, ton, kg, metrics)``
+        tuples, where ``metrics`` is a dict of extra columns (or None).
+        """
+        started_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+        with self.connection:
+            cursor = self.connection.execute(INSERT_RUN, (
+                started_at, algorithm, biome, campaign or None, json.dumps(parameters, default=str, sort_keys=True)))
+            run_id = cursor.lastrowid
+            self.connection.executemany(INSERT_INPUT, (
+                (run_id, name, source, input_fingerprint(source)) for name, source in inputs.items()))
+            self.connection.executemany(INSERT_RESULT, (
+                (run_id, zone_id, None if zone_key is None else str(zone_key), sample_count,
+                 ton_ha, kg_m2, ton, kg, json.dumps(metrics, default=str) if metrics else None)
+                for zone_id, zone_key, sample_count, ton_ha, kg_m2, ton, kg, metrics in rows))
+        return run_id
+
+
+def input_fingerprint(source):
+    """Fingerprint of a file, or of the file listing of a folder of tiles; None when not on disk."""
+    if not source:
+        return None
+    # Fontes OGR podem trazer opções depois do caminho (ex.: "arquivo.gpkg|layername=...")
+    path = source.split('|')[0]
+    if os.path.isfile(path):
+        return file_fingerprint(path)
+    if os.path.isdir(path):
+        digest = hashlib.sha1(os.path.abspath(path).encode('utf-8'))
+        for name in sorted(os.listdir(path)):
+            stat = os.stat(os.path.join(path, name))
+            digest.update(f'{name}:{stat.st_size}:{stat.st_mtime_ns}'.encode('utf-8'))
+        return digest.hexdigest()
+    return None
@@ -0,0 +1,164 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import json
+import os
+
+import numpy as np
+from osgeo import ogr, osr # type: ignore
+
+try:
+    import pyarrow # type: ignore
+    import pyarrow.parquet # type: ignore
+except ImportError:
+    pyarrow = None
+
+GEOPARQUET_VERSION = '1.0.0'
+GEOMETRY_COLUMN = 'geometry'
+
+# Nomes dos tipos de geometria segundo a especificação GeoParquet
+GEOPARQUET_TYPES = {
+    ogr.wkbPolygon: 'Polygon',
+    ogr.wkbMultiPolygon: 'MultiPolygon',
+    ogr.wkbPolygon25D: 'Polygon Z',
+    ogr.wkbMultiPolygon25D: 'MultiPolygon Z',
+}
+
+
+def parquet_available():
+    return pyarrow is not None
+
+
+def rows_to_columns(rows):
+    """Turns a list of row dicts (all with the same keys) into a dict of columns."""
+    if not rows:
+        return {}
+    return {name: [row.get(name) for row in rows] for name in rows[0].keys()}
+
+
+def write_geopackage(path, layer_name, columns, geometries=None, crs_wkt=None):
+    """Writes the columns (and optional WKB geometries) as a GeoPackage layer in one transaction."""
+    driver = ogr.GetDriverByName('GPKG')
+    if os.path.exists(path):
+        driver.DeleteDataSource(path)
+    ds = driver.CreateDataSource(path)
+    geometries = _ogr_geometries(geometries)
+    srs = None
+    if crs_wkt:
+        srs = osr.SpatialReference(wkt=crs_wkt)
+        srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    geometry_type = _layer_geometry_type(geometries) if geometries is not None else ogr.wkbNone
+    layer = ds.CreateLayer(layer_name, srs, geometry_type)
+
+    values = {name: _as_list(column) for name, column in columns.items()}
+    kinds = {name: _field_kind(column) for name, column in values.items()}
+    for name, kind in kinds.items():
+        layer.CreateField(ogr.FieldDefn(name, {'integer': ogr.OFTInteger64, 'real': ogr.OFTReal}.get(kind, ogr.OFTString)))
+    definition = layer.GetLayerDefn()
+    # Índice de cada campo resolvido uma vez, fora do laço das feições
+    field_indices = [(definition.GetFieldIndex(name), values[name], kinds[name]) for name in values]
+
+    layer.StartTransaction()
+    for row in range(_row_count(values, geometries)):
+        feature = ogr.Feature(definition)
+        for index, column, kind in field_indices:
+            value = column[row]
+            if value is None:
+                feature.SetFieldNull(index)
+            elif kind == 'string':
+                feature.SetField(index, str(value))
+            else:
+                feature.SetField(index, value)
+        if geometries is not None and geometries[row] is not None:
+            feature.SetGeometry(geometries[row])
+        layer.CreateFeature(feature)
+    layer.CommitTransaction()
+    ds = None
+
+
+def write_parquet(path, columns, geometries=None, crs_wkt=None):
+    """Writes the columns to Parquet; with geometries the file follows GeoParquet (WKB encoding)."""
+    arrays = {}
+    for name, column in columns.items():
+        values = _as_list(column)
+        kind = _field_kind(values)
+        if kind == 'string':
+            values = [None if value is None else str(value) for value in values]
+        arrays[name] = pyarrow.array(values, type={'integer': pyarrow.int64(), 'real': pyarrow.float64()}.get(kind, pyarrow.string()))
+
+    metadata = None
+    geometries = _ogr_geometries(geometries)
+    if geometries is not None:
+        arrays[GEOMETRY_COLUMN] = pyarrow.array(
+            [None if geometry is None else bytes(geometry.ExportToIsoWkb()) for geometry in geometries],
+            type=pyarrow.binary())
+        metadata = {b'geo': json.dumps(_geoparquet_metadata(geometries, crs_wkt)).encode('utf-8')}
+
+    table = pyarrow.table(arrays)
+    if metadata is not None:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    pyarrow.parquet.write_table(table, path, compression='zstd')
+
+
+def _geoparquet_metadata(geometries, crs_wkt):
+    valid = [geometry for geometry in geometries if geometry is not None]
+    types = sorted({GEOPARQUET_TYPES[geometry.GetGeometryType()] for geometry in valid
+                    if geometry.GetGeometryType() in GEOPARQUET_TYPES})
+    column = {'encoding': 'WKB', 'geometry_types': types}
+    if valid:
+        envelopes = np.array([geometry.GetEnvelope() for geometry in valid])
+        column['bbox'] = [float(envelopes[:, 0].min()), float(envelopes[:, 2].min()),
+                          float(envelopes[:, 1].max()), float(envelopes[:, 3].max())]
+    if crs_wkt:
+        try:
+            column['crs'] = json.loads(osr.SpatialReference(wkt=crs_wkt).ExportToPROJJSON())
+        except (AttributeError, RuntimeError, ValueError):
+            # GDAL sem suporte a PROJJSON: o SRC fica indefinido no arquivo
+            pass
+    return {'version': GEOPARQUET_VERSION, 'primary_column': GEOMETRY_COLUMN, 'columns': {GEOMETRY_COLUMN: column}}
+
+
+def _ogr_geometries(geometries):
+    if geometries is None:
+        return None
+    return [None if wkb is None else ogr.CreateGeometryFromWkb(bytes(wkb)) for wkb in geometries]
+
+
+def _layer_geometry_type(geometries):
+    types = {geometry.GetGeometryType() for geometry in geometries if geometry is not None}
+    return types.pop() if len(types) == 1 else ogr.wkbUnknown
+
+
+def _row_count(values, geometries):
+    if values:
+        return len(next(iter(values.values())))
+    return len(geometries) if geometries is not None else 0
+
+
+def _as_list(column):
+    # Arrays numpy viram listas Python, com NaN tratado como valor nulo
+    if isinstance(column, np.ndarray):
+        if column.dtype.kind == 'f':
+            cells = column.astype(object)
+            cells[np.isnan(column)] = None
+            return cells.tolist()
+        return column.tolist()
+    values = [value.item() if isinstance(value, np.generic) else value for value in column]
+    return [None if isinstance(value, float) and value != value else value for value in values]
+
+
+def _field_kind(values):
+    kind = None
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float, np.integer, np.floating)):
+            return 'string'
+        if isinstance(value, (float, np.floating)):
+            kind = 'real'
+        elif kind is None:
+            kind = 'integer'
+    return kind or 'real'
@@ -0,0 +1,93 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+from qgis.PyQt.QtCore import QCoreApplication # type: ignore
+from qgis.core import (QgsProcessingAlgorithm, # type: ignore
+                       QgsProcessingParameterFile,
+                       QgsProcessingParameterString,
+                       QgsProcessingParameterFileDestination,
+                       QgsProcessingException)
+
+from .tnc_carbon_chm_histogram import ChmHistogram, parse_thresholds, write_sweep_csv
+
+
+class TNC_Carbon_Threshold_Sweep(QgsProcessingAlgorithm):
+    """Carbon for a list of canopy-cover thresholds from a CHM histogram sidecar, without reading the rasters.
+
+    The histogram does not depend on the biome, so a sidecar written by any
+    raster algorithm can be swept with the coefficients of ``biome_algorithm``.
+    """
+    INPUT_HISTOGRAM = 'INPUT_HISTOGRAM'
+    INPUT_THRESHOLD_SWEEP = 'INPUT_THRESHOLD_SWEEP'
+    OUTPUT_CSV = 'OUTPUT_CSV'
+
+    def __init__(self, biome_algorithm):
+        super().__init__()
+        self.biome_algorithm = biome_algorithm
+        self.biome = biome_algorithm()
+        self.MODEL_COEFFICIENTS = biome_algorithm.MODEL_COEFFICIENTS
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.INPUT_HISTOGRAM,
+                self.tr('CHM histogram (written by the CHM or DTM/DSM algorithms)'),
+                behavior=QgsProcessingParameterFile.File,
+                fileFilter='NumPy archives (*.npz)'
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterString(
+                self.INPUT_THRESHOLD_SWEEP,
+                self.tr('Canopy cover thresholds to sweep, comma separated (e.g. 1, 1.5, 2, 3, 5)'),
+                defaultValue='1, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 5'
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.OUTPUT_CSV,
+                self.tr('Output CSV file'),
+                'CSV files (*.csv)'
+            )
+        )
+
+    def processAlgorithm(self, parameters, context, feedback):
+        histogram_path = self.parameterAsFile(parameters, self.INPUT_HISTOGRAM, context)
+        csv_path = self.parameterAsFileOutput(parameters, self.OUTPUT_CSV, context)
+        try:
+            histogram, pixel_area_m2 = ChmHistogram.load(histogram_path)
+        except (OSError, KeyError, ValueError) as error:
+            raise QgsProcessingException(self.tr('Could not read the CHM histogram: {}').format(error))
+        try:
+            # Os limiares precisam cair nos limites das classes do histograma lido
+            thresholds = parse_thresholds(self.parameterAsString(parameters, self.INPUT_THRESHOLD_SWEEP, context),
+                                          histogram.bin_width, histogram.max_height)
+        except ValueError as error:
+            raise QgsProcessingException(self.tr('Invalid canopy cover thresholds: {}').format(error))
+        if not thresholds:
+            raise QgsProcessingException(self.tr('The threshold sweep needs at least one threshold'))
+        feedback.pushInfo(f'{len(thresholds)} limiares para {histogram.ids.size} zona(s), '
+                          f'classes de {histogram.bin_width:g} m')
+        write_sweep_csv(csv_path, histogram.sweep(thresholds, self.MODEL_COEFFICIENTS, pixel_area_m2))
+        return {self.OUTPUT_CSV: csv_path}
+
+    def name(self):
+        return f'{self.biome.groupId()}thresholdsweep'
+
+    def displayName(self):
+        return self.tr('Canopy cover threshold sweep (from CHM histogram)')
+
+    def group(self):
+        return self.biome.group()
+
+    def groupId(self):
+        return self.biome.groupId()
+
+    def tr(self, string):
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        return TNC_Carbon_Threshold_Sweep(self.biome_algorithm)
@@ -0,0 +1,201 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import struct
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .tnc_carbon_raster_pipeline import raster_windows
+from .tnc_carbon_table_outputs import write_geopackage
+
+# Largura de copa (m) = a + b * h + c * h² (Popescu & Wynne, 2004)
+CROWN_WIDTH_COEFFICIENTS = (2.51, 0.0, 0.00901)
+DEFAULT_MIN_TREE_HEIGHT = 2.0
+# Alturas acima deste valor usam a janela da altura máxima
+MAX_TREE_HEIGHT = 50.0
+# Alturas amostradas para achar onde o raio da janela (em pixels) muda
+LEVEL_SAMPLES = 2048
+TREE_COLUMNS = ('Tree count', 'Trees per ha', 'Tree height mean (m)', 'Tree height max (m)', 'Tree height SD (m)')
+
+
+def max_filter(values, radius_x, radius_y):
+    """Maximum in the ``(2 * radius_y + 1) x (2 * radius_x + 1)`` box around each pixel, separable and clipped at the edges."""
+    if radius_x:
+        padded = np.pad(values, ((0, 0), (radius_x, radius_x)), constant_values=-np.inf)
+        values = sliding_window_view(padded, 2 * radius_x + 1, axis=1).max(axis=-1)
+    if radius_y:
+        padded = np.pad(values, ((radius_y, radius_y), (0, 0)), constant_values=-np.inf)
+        values = sliding_window_view(padded, 2 * radius_y + 1, axis=0).max(axis=-1)
+    return values
+
+
+class TreeDetector:
+    """Tree tops as local maxima of the CHM in a window that grows with the height.
+
+    The window of a pixel of height ``h`` is a box about as wide as the
+    crown of a tree of that height (``CROWN_WIDTH_COEFFICIENTS``). Heights
+    are grouped in levels with the same window radius in pixels (each level
+    starts at the height where the radius changes), and the max filters of
+    growing radii are built incrementally from the previous one (a box max
+    of radius ``r + 1`` is the radius 1 max of the radius ``r`` box), so the
+    cost grows with the number of distinct radii, not with their size. A
+    pixel at or above ``min_height`` is a top when it equals the maximum of
+    its own window; on flat tops only the first pixel (in reading order) is
+    kept.
+
+    ``detect`` runs on strips with ``halo_y`` rows of halo in the compute
+    threads and ``add`` collects the tops in the writer thread.
+    """
+
+    def __init__(self, min_height, pixel_width, pixel_height, coefficients=CROWN_WIDTH_COEFFICIENTS):
+        self.min_height = min_height
+        self.coefficients = coefficients
+        self.pixel_width = abs(pixel_width)
+        self.pixel_height = abs(pixel_height)
+        heights = np.linspace(min_height, max(min_height, MAX_TREE_HEIGHT), LEVEL_SAMPLES)
+        radii = [self.window_radius(height) for height in heights]
+        starts = [0] + [index for index in range(1, len(radii)) if radii[index] != radii[index - 1]]
+        self.level_heights = heights[starts]
+        self.levels = [radii[index] for index in starts]
+        self.halo_x = self.levels[-1][0]
+        self.halo_y = self.levels[-1][1]
+        self.rows = []
+        self.cols = []
+        self.heights = []
+
+    def crown_radius(self, height):
+        a, b, c = self.coefficients
+        height = np.minimum(height, MAX_TREE_HEIGHT)
+        return (a + b * height + c * height ** 2) / 2
+
+    def window_radius(self, height):
+        radius = self.crown_radius(height)
+        return (max(1, int(round(radius / self.pixel_width))), max(1, int(round(radius / self.pixel_height))))
+
+    def detect(self, window, top, data):
+        """Returns ``(rows, cols, heights)`` of the tops in the rows of ``window``."""
+        chm, nodata_mask = data
+        yoff, rows = window
+        start = yoff - top
+        heights = np.where(nodata_mask, -np.inf, chm).astype(np.float32)
+        candidates = ~nodata_mask & (chm >= self.min_height)
+        pixel_levels = np.searchsorted(self.level_heights, chm, side='right') - 1
+
+        tops = np.zeros(chm.shape, dtype=bool)
+        filtered = heights
+        current = (0, 0)
+        for number, level in enumerate(self.levels):
+            in_level = candidates & (pixel_levels == number)
+            filtered = max_filter(filtered, level[0] - current[0], level[1] - current[1])
+            current = level
+            if in_level.any():
+                tops |= in_level & (heights >= filtered)
+
+        # Topos planos: descarta o topo com vizinho anterior (esquerda ou linha de cima) de mesma altura também topo
+        duplicate = np.zeros(chm.shape, dtype=bool)
+        for dy, dx in ((0, -1), (-1, -1), (-1, 0), (-1, 1)):
+            source = tops[max(0, dy):tops.shape[0] + min(0, dy), max(0, dx):tops.shape[1] + min(0, dx)]
+            target = (slice(max(0, -dy), tops.shape[0] + min(0, -dy)), slice(max(0, -dx), tops.shape[1] + min(0, -dx)))
+            same = heights[target] == heights[max(0, dy):heights.shape[0] + min(0, dy),
+                                              max(0, dx):heights.shape[1] + min(0, dx)]
+            duplicate[target] |= source & same
+        tops &= ~duplicate
+
+        found_rows, found_cols = np.nonzero(tops[start:start + rows])
+        return found_rows + yoff, found_cols, chm[found_rows + start, found_cols].astype(np.float64)
+
+    def add(self, found):
+        rows, cols, heights = found
+        self.rows.append(rows)
+        self.cols.append(cols)
+        self.heights.append(heights)
+
+    def state(self):
+        """Tops found so far as arrays, for a checkpoint journal (see ``restore``)."""
+        rows, cols, heights = self.tops()
+        return {'tree_rows': rows, 'tree_cols': cols, 'tree_heights': heights}
+
+    def restore(self, state):
+        self.rows = [np.array(state['tree_rows'], dtype=np.int64)]
+        self.cols = [np.array(state['tree_cols'], dtype=np.int64)]
+        self.heights = [np.array(state['tree_heights'], dtype=np.float64)]
+
+    def tops(self):
+        """All the tops found, sorted by row: ``(rows, cols, heights)``."""
+        if not self.rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate(self.rows), np.concatenate(self.cols), np.concatenate(self.heights)
+
+
+def tree_zones(rows, cols, zones_band):
+    """Zone (position in the zone raster, ``-1`` outside) of each top, reading only the strips that hold tops."""
+    zones = np.full(rows.size, -1, dtype=np.int64)
+    for yoff, count in raster_windows(zones_band):
+        selected = np.flatnonzero((rows >= yoff) & (rows < yoff + count))
+        if selected.size:
+            strip = zones_band.ReadAsArray(0, yoff, zones_band.XSize, count)
+            zones[selected] = strip[rows[selected] - yoff, cols[selected]]
+    return zones
+
+
+def tree_columns(result_ids, zone_ids, tree_zone, heights, area_ha):
+    """Per-zone tree statistics aligned with ``result_ids``; the ID ``-1`` row gets every top inside a zone.
+
+    ``zone_ids`` maps zone positions to feature IDs (None when the whole
+    raster is the zone), ``tree_zone`` holds the zone position of each top.
+    """
+    result_ids = np.asarray(result_ids, dtype=np.int64)
+    count = np.zeros(result_ids.size)
+    total = np.zeros(result_ids.size)
+    squares = np.zeros(result_ids.size)
+    highest = np.full(result_ids.size, np.nan)
+
+    if zone_ids is None:
+        inside = np.ones(heights.size, dtype=bool)
+        position = np.zeros(heights.size, dtype=np.int64)
+    else:
+        inside = tree_zone >= 0
+        # Posição de cada feição da camada de zonas na lista de resultados
+        order = np.argsort(result_ids)
+        found = np.searchsorted(result_ids, zone_ids[tree_zone[inside]], sorter=order)
+        found = np.minimum(found, result_ids.size - 1)
+        position = order[found]
+        matched = result_ids[position] == zone_ids[tree_zone[inside]]
+        inside[np.flatnonzero(inside)[~matched]] = False
+        position = position[matched]
+    zone_heights = heights[inside]
+    np.add.at(count, position, 1)
+    np.add.at(total, position, zone_heights)
+    np.add.at(squares, position, zone_heights ** 2)
+    np.fmax.at(highest, position, zone_heights)
+
+    totals = result_ids == -1
+    if zone_ids is not None and totals.any():
+        count[totals] = zone_heights.size
+        total[totals] = zone_heights.sum()
+        squares[totals] = (zone_heights ** 2).sum()
+        highest[totals] = zone_heights.max() if zone_heights.size else np.nan
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+        deviation = np.where(count > 1, np.sqrt(np.maximum(0.0, squares - count * mean ** 2) / (count - 1)), np.nan)
+        density = np.where(area_ha > 0, count / area_ha, np.nan)
+    return dict(zip(TREE_COLUMNS, (count, density, mean, highest, deviation)))
+
+
+def write_tree_points(path, rows, cols, heights, detector, geotransform, projection, zone_ids=None, tree_zone=None):
+    """GeoPackage with one point per tree top (at the pixel center), its height, crown radius and polygon ID."""
+    x = geotransform[0] + (cols + 0.5) * geotransform[1] + (rows + 0.5) * geotransform[2]
+    y = geotransform[3] + (cols + 0.5) * geotransform[4] + (rows + 0.5) * geotransform[5]
+    columns = {
+        'Height (m)': heights,
+        'Crown radius (m)': detector.crown_radius(heights),
+    }
+    if zone_ids is not None:
+        columns['ID'] = [int(zone_ids[zone]) if zone >= 0 else None for zone in tree_zone.tolist()]
+    geometries = [struct.pack('<BIdd', 1, 1, point_x, point_y) for point_x, point_y in zip(x.tolist(), y.tolist())]
+    write_geopackage(path, 'trees', columns, geometries, projection)
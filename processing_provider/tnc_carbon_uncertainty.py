@@ -0,0 +1,132 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+from statistics import NormalDist
+
+import numpy as np
+
+DEFAULT_CONFIDENCE = 95.0
+DEFAULT_PLOT_AREA_HA = 0.25
+# Elementos por bloco de simulação (sorteios x zonas) no Monte Carlo
+MONTE_CARLO_BLOCK = 1 << 22
+
+
+def parse_covariance(text):
+    """3x3 coefficient covariance from 6 (upper triangle) or 9 comma/space separated values.
+
+    The order of the coefficients is intercept, canopy cover rate, CHM.
+    Returns None for an empty string; raises ``ValueError`` when invalid.
+    """
+    values = [float(value) for value in text.replace(';', ',').replace(',', ' ').split()]
+    if not values:
+        return None
+    if len(values) == 6:
+        aa, ab, ac, bb, bc, cc = values
+        covariance = np.array([[aa, ab, ac], [ab, bb, bc], [ac, bc, cc]])
+    elif len(values) == 9:
+        covariance = np.array(values).reshape(3, 3)
+    else:
+        raise ValueError(f'expected 6 or 9 values, got {len(values)}')
+    if not np.allclose(covariance, covariance.T) or np.linalg.eigvalsh(covariance).min() < -1e-12:
+        raise ValueError('the covariance matrix must be symmetric positive semi-definite')
+    return covariance
+
+
+class LinearModelUncertainty:
+    """Uncertainty of the linear carbon models ``a + b*ccr + c*chm`` per zone.
+
+    Two sources are combined:
+
+    * the coefficient covariance, propagated exactly: the zone mean density
+      is ``x @ beta`` with ``x = [1, ccr, mean CHM]``, so its variance is
+      ``x @ cov @ x``. The zone mean CHM comes back from the zonal mean
+      density, because the model is linear;
+    * the model residual standard error (ton/ha at the plot scale), reduced
+      for zones larger than a plot as if plot-sized residuals were
+      independent (``se**2 * plot_area / zone_area``).
+
+    Coefficient errors are shared by every zone, so the total uses the full
+    covariance of the summed design vector, while residuals add up
+    independently. With ``iterations`` the same model is sampled instead,
+    vectorized over zones in blocks, and the intervals come from percentiles.
+    """
+
+    def __init__(self, coefficients, covariance=None, residual_se=0.0, plot_area_ha=DEFAULT_PLOT_AREA_HA,
+                 confidence=DEFAULT_CONFIDENCE):
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self.covariance = np.zeros((3, 3)) if covariance is None else np.asarray(covariance, dtype=np.float64)
+        self.residual_se = residual_se or 0.0
+        self.plot_area_ha = plot_area_ha or DEFAULT_PLOT_AREA_HA
+        self.confidence = confidence or DEFAULT_CONFIDENCE
+
+    @property
+    def enabled(self):
+        return bool(self.residual_se > 0 or np.any(self.covariance))
+
+    def column_names(self):
+        level = f'{self.confidence:g}%'
+        return ('Carbon SE (ton)', f'Carbon {level} CI lower (ton)', f'Carbon {level} CI upper (ton)')
+
+    def zone_intervals(self, count, mean, canopy_cover_rate, pixel_area_m2, iterations=0, seed=0):
+        """Returns ``(columns, total)``: per-zone SE and CI of the carbon in tons, and the same for their sum."""
+        count = np.asarray(count, dtype=np.float64)
+        mean = np.asarray(mean, dtype=np.float64)
+        valid = ~(np.isnan(count) | np.isnan(mean))
+        area_ha = np.where(valid, count, 0.0) * pixel_area_m2 / 10000
+        design = self._design(mean, canopy_cover_rate, valid)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            residual_var = self.residual_se ** 2 * np.minimum(1.0, self.plot_area_ha / area_ha)
+        residual_var[~valid] = 0.0
+        carbon = np.where(valid, mean, 0.0) * area_ha
+
+        if iterations:
+            se, low, high, total = self._monte_carlo(design, area_ha, residual_var, valid, iterations, seed)
+        else:
+            density_var = np.einsum('ij,jk,ik->i', design, self.covariance, design) + residual_var
+            se = area_ha * np.sqrt(density_var)
+            z = NormalDist().inv_cdf(0.5 + self.confidence / 200)
+            low, high = carbon - z * se, carbon + z * se
+            summed = area_ha @ design
+            total_se = float(np.sqrt(summed @ self.covariance @ summed + np.sum(area_ha ** 2 * residual_var)))
+            total_carbon = float(carbon.sum())
+            total = (total_se, total_carbon - z * total_se, total_carbon + z * total_se)
+
+        names = self.column_names()
+        columns = {name: np.where(valid, values, np.nan) for name, values in zip(names, (se, low, high))}
+        return columns, total
+
+    def _design(self, mean, canopy_cover_rate, valid):
+        intercept, canopy_cover, height = self.coefficients
+        mean_chm = (np.where(valid, mean, 0.0) - intercept - canopy_cover * canopy_cover_rate) / height
+        design = np.empty((mean.size, 3))
+        design[:, 0] = 1.0
+        design[:, 1] = canopy_cover_rate
+        design[:, 2] = mean_chm
+        design[~valid] = 0.0
+        return design
+
+    def _monte_carlo(self, design, area_ha, residual_var, valid, iterations, seed):
+        rng = np.random.default_rng(seed)
+        draws = rng.multivariate_normal(self.coefficients, self.covariance, size=iterations, method='eigh')
+        residual_sd = np.sqrt(residual_var)
+        se = np.full(area_ha.size, np.nan)
+        low = np.full(area_ha.size, np.nan)
+        high = np.full(area_ha.size, np.nan)
+        total = np.zeros(iterations)
+        tail = (100 - self.confidence) / 2
+        block = max(1, MONTE_CARLO_BLOCK // iterations)
+        zones = np.flatnonzero(valid)
+        for start in range(0, zones.size, block):
+            current = zones[start:start + block]
+            # Sorteios x zonas: coeficientes compartilhados, resíduos independentes por zona
+            density = draws @ design[current].T + rng.standard_normal((iterations, current.size)) * residual_sd[current]
+            carbon = density * area_ha[current]
+            total += carbon.sum(axis=1)
+            se[current] = carbon.std(axis=0, ddof=1) if iterations > 1 else 0.0
+            low[current], high[current] = np.percentile(carbon, [tail, 100 - tail], axis=0)
+        total_low, total_high = np.percentile(total, [tail, 100 - tail])
+        total_se = float(total.std(ddof=1)) if iterations > 1 else 0.0
+        return se, low, high, (total_se, float(total_low), float(total_high))
@@ -0,0 +1,117 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import os
+
+from qgis.core import (Qgis, # type: ignore
+                       QgsApplication,
+                       QgsMessageLog,
+                       QgsProcessingException)
+
+from .tnc_carbon_global_chm import TNC_Carbon_Global_CHM
+from .tnc_carbon_global_dtm_dsm import TNC_Carbon_Global_DTM_DSM
+from .tnc_carbon_model_registry import load_registry
+from .tnc_carbon_uncertainty import LinearModelUncertainty
+
+# Lista de registros de modelos (separados por os.pathsep), além dos da pasta de configurações do QGIS
+REGISTRY_ENVIRONMENT = 'TNCCC_MODEL_REGISTRY'
+REGISTRY_FILES = ('models.json', 'models.toml')
+LOG_TAG = 'TNC Carbon Calculator'
+
+
+def registry_paths():
+    """Registry files that exist: the ones in ``TNCCC_MODEL_REGISTRY``, then ``<QGIS settings>/tnccc/models.*``."""
+    paths = [path for path in os.environ.get(REGISTRY_ENVIRONMENT, '').split(os.pathsep) if path]
+    folder = os.path.join(QgsApplication.qgisSettingsDirPath(), 'tnccc')
+    paths.extend(os.path.join(folder, name) for name in REGISTRY_FILES)
+    return [path for path in paths if os.path.isfile(path)]
+
+
+def load_user_models():
+    """Models of every registry file; invalid entries and repeated IDs are logged and skipped."""
+    models = {}
+    for path in registry_paths():
+        try:
+            found, errors = load_registry(path)
+        except (OSError, ValueError) as error:
+            found, errors = [], [str(error)]
+        for error in errors:
+            QgsMessageLog.logMessage(f'{path}: {error}', LOG_TAG, Qgis.Warning)
+        for model in found:
+            if model.id in models:
+                QgsMessageLog.logMessage(f'{path}: model {model.id} is already defined', LOG_TAG, Qgis.Warning)
+                continue
+            models[model.id] = model
+    return list(models.values())
+
+
+class UserModelAlgorithm:
+    """Turns one of the raster algorithms into the algorithm of a registry model.
+
+    Everything but the model comes from the algorithm it is mixed into. The
+    model uncertainty and the threshold sweep assume ``a + b*ccr + c*chm``,
+    so they are refused for models that are not linear.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        self.MODEL_COEFFICIENTS = model.linear_coefficients
+        self.MODEL_EQUATION = model.signature()
+
+    def applyModel(self, chm, canopy_cover_rate):
+        return self.model.kernel(chm, canopy_cover_rate)
+
+    def modelUncertainty(self, parameters, context):
+        if self.MODEL_COEFFICIENTS is not None:
+            return super().modelUncertainty(parameters, context)
+        if self.parameterAsString(parameters, self.INPUT_COEFFICIENT_COVARIANCE, context).strip() \
+                or self.parameterAsDouble(parameters, self.INPUT_RESIDUAL_SE, context) > 0:
+            raise QgsProcessingException(self.tr('The model uncertainty needs a model linear in the CHM and the canopy cover rate'))
+        return LinearModelUncertainty((0.0, 0.0, 0.0))
+
+    def sweepThresholds(self, parameters, context):
+        if self.MODEL_COEFFICIENTS is None:
+            raise QgsProcessingException(self.tr('The threshold sweep needs a model linear in the CHM and the canopy cover rate'))
+        return super().sweepThresholds(parameters, context)
+
+    def shortHelpString(self):
+        help_text = f'{self.model.description}\n\n' if self.model.description else ''
+        coefficients = ', '.join(f'{name} = {value:g}' for name, value in self.model.coefficients.items())
+        help_text += self.tr('Carbon density (ton/ha) = {}').format(self.model.equation)
+        if coefficients:
+            help_text += f'\n{coefficients}'
+        return help_text
+
+    def group(self):
+        return self.tr('Carbon Calculator - User models')
+
+    def groupId(self):
+        return 'usermodels'
+
+
+class TNC_Carbon_User_Model_CHM(UserModelAlgorithm, TNC_Carbon_Global_CHM):
+
+    def name(self):
+        return f'user{self.model.id}chm'
+
+    def displayName(self):
+        return f'{self.model.name} - ' + self.tr('Canopy Height Model (CHM)')
+
+    def createInstance(self):
+        return TNC_Carbon_User_Model_CHM(self.model)
+
+
+class TNC_Carbon_User_Model_DTM_DSM(UserModelAlgorithm, TNC_Carbon_Global_DTM_DSM):
+
+    def name(self):
+        return f'user{self.model.id}dtmdsm'
+
+    def displayName(self):
+        return f'{self.model.name} - ' + self.tr('Digital Terrain Model + Digital Surface Model (DTM + DSM)')
+
+    def createInstance(self):
+        return TNC_Carbon_User_Model_DTM_DSM(self.model)
@@ -0,0 +1,245 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import csv
+import itertools
+
+import numpy as np
+
+from qgis.core import (QgsFeature, # type: ignore
+                       QgsFeatureRequest,
+                       QgsField,
+                       QgsFields,
+                       QgsMemoryProviderUtils,
+                       NULL)
+from qgis.PyQt.QtCore import QVariant # type: ignore
+import processing # type: ignore
+
+from .tnc_carbon_table_outputs import write_geopackage, write_parquet
+from .tnc_carbon_run_registry import RunRegistry
+
+ZONE_ID_FIELD = '_zst_id'
+ZONE_LAYER_NAME = 'carbon'
+CARBON_COLUMNS = ('Carbon Density (ton/ha)', 'Carbon Density (kg/m2)', 'Carbon (ton)', 'Carbon (kg)')
+# Prefixo dos atributos 'id' e 'fid' nas tabelas: 'fid' é a chave primária do GeoPackage e 'ID' a coluna do identificador
+TABLE_ATTRIBUTE_PREFIX = 'attr_'
+DEFAULT_BATCH_SIZE = 10000
+
+
+class ZonalResults:
+    """Zonal statistics of the carbon raster kept as columns, one entry per zone.
+
+    ``ids`` are the feature IDs of the polygon layer (``-1`` for the whole
+    raster), ``count`` the number of valid pixels and ``mean`` the mean carbon
+    density in ton/ha. Zones without pixels have ``NaN`` in both. ``extra``
+    holds additional output columns (such as the uncertainty intervals),
+    written after the carbon columns.
+    """
+
+    def __init__(self, ids, count, mean, extra=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.count = np.asarray(count, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.extra = dict(extra or {})
+
+    def __len__(self):
+        return self.ids.size
+
+    def uncovered_ids(self):
+        return self.ids[np.isnan(self.count) | np.isnan(self.mean)]
+
+    def with_total(self, extra_values=()):
+        """Copy with a last row (ID ``-1``) summing every zone; ``extra_values`` fills the extra columns."""
+        valid = ~(np.isnan(self.count) | np.isnan(self.mean))
+        count = self.count[valid].sum()
+        mean = (self.mean[valid] * self.count[valid]).sum() / count if count else np.nan
+        extra = {name: np.append(values, value) for (name, values), value in zip(self.extra.items(), extra_values)}
+        return ZonalResults(np.append(self.ids, -1), np.append(self.count, count), np.append(self.mean, mean), extra)
+
+    def carbon_columns(self, pixel_area_m2):
+        area_m2 = self.count * pixel_area_m2
+        carbon_ton_ha = self.mean
+        carbon_kg_m2 = self.mean / 10
+        return {
+            CARBON_COLUMNS[0]: carbon_ton_ha,
+            CARBON_COLUMNS[1]: carbon_kg_m2,
+            CARBON_COLUMNS[2]: carbon_ton_ha * area_m2 / 10000,
+            CARBON_COLUMNS[3]: carbon_kg_m2 * area_m2,
+        }
+
+
+def polygon_zonal_results(polygon_layer, raster_layer, context, feedback):
+    """Runs the zonal statistics on a geometry-only copy of ``polygon_layer``.
+
+    The attribute table is left behind so the zonal output does not duplicate
+    it; attributes are joined back by ID when the CSV is written.
+    """
+    zones = zone_layer(polygon_layer)
+    zonal_processing = processing.run("native:zonalstatisticsfb", {
+        'INPUT': zones,
+        'INPUT_RASTER': raster_layer,
+        'COLUMN_PREFIX': '_zst_',
+        'STATISTICS': [0, 2], # Count, Mean
+        'OUTPUT': 'memory:'
+    }, context=context, feedback=feedback)
+    result_layer = zonal_processing['OUTPUT']
+
+    size = result_layer.featureCount()
+    ids = np.empty(size, dtype=np.int64)
+    count = np.full(size, np.nan)
+    mean = np.full(size, np.nan)
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([ZONE_ID_FIELD, '_zst_count', '_zst_mean'], result_layer.fields())
+    for position, feature in enumerate(result_layer.getFeatures(request)):
+        ids[position] = feature[ZONE_ID_FIELD]
+        current_count = feature['_zst_count']
+        current_mean = feature['_zst_mean']
+        # Contagem zero ou nula: o polígono não cobre nenhum pixel
+        if current_count not in (None, NULL, 0) and current_mean not in (None, NULL):
+            count[position] = current_count
+            mean[position] = current_mean
+    return ZonalResults(ids, count, mean)
+
+
+def zone_layer(polygon_layer):
+    """Memory copy of the polygons keeping only the geometry and the feature ID."""
+    fields = QgsFields()
+    fields.append(QgsField(ZONE_ID_FIELD, QVariant.LongLong))
+    layer = QgsMemoryProviderUtils.createMemoryLayer('zones', fields, polygon_layer.wkbType(), polygon_layer.crs())
+    provider = layer.dataProvider()
+
+    batch = []
+    for source in polygon_layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        feature = QgsFeature(fields)
+        feature.setGeometry(source.geometry())
+        feature.setAttributes([source.id()])
+        batch.append(feature)
+        if len(batch) >= DEFAULT_BATCH_SIZE:
+            provider.addFeatures(batch)
+            batch = []
+    provider.addFeatures(batch)
+    return layer
+
+
+def add_uncertainty(results, uncertainty, canopy_cover_rate, pixel_area_m2, iterations=0, with_total=False):
+    """Adds the uncertainty columns; with ``with_total`` also appends the row summing every zone."""
+    columns, total = uncertainty.zone_intervals(results.count, results.mean, canopy_cover_rate, pixel_area_m2, iterations)
+    results.extra.update(columns)
+    if with_total:
+        return results.with_total(total)
+    return results
+
+
+def attribute_field_names(polygon_layer, include_attributes, selected_fields):
+    """Attribute columns to copy into the CSV: the selected ones, all of them, or none."""
+    if polygon_layer is None:
+        return []
+    if selected_fields:
+        return list(selected_fields)
+    if include_attributes:
+        return polygon_layer.fields().names()
+    return []
+
+
+def write_zonal_csv(csv_path, results, pixel_area_m2, attribute_layer=None, attribute_fields=(),
+                    batch_size=DEFAULT_BATCH_SIZE, feedback=None):
+    """Writes the results in batches, joining the requested attributes by feature ID."""
+    columns = results.carbon_columns(pixel_area_m2)
+    attribute_fields = list(attribute_fields) if attribute_layer is not None else []
+
+    with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        columns.update(results.extra)
+        writer.writerow(['ID'] + attribute_fields + list(columns))
+        for start in range(0, len(results), batch_size):
+            if feedback is not None and feedback.isCanceled():
+                break
+            ids = results.ids[start:start + batch_size]
+            values = [_csv_values(column[start:start + batch_size]) for column in columns.values()]
+            if attribute_fields:
+                attributes = _attributes_by_id(attribute_layer, ids, attribute_fields)
+                empty = [None] * len(attribute_fields)
+                rows = ([feature_id] + attributes.get(feature_id, empty) + list(carbon)
+                        for feature_id, carbon in zip(ids.tolist(), zip(*values)))
+            else:
+                rows = ([feature_id] + list(carbon) for feature_id, carbon in zip(ids.tolist(), zip(*values)))
+            writer.writerows(rows)
+
+
+def write_zonal_tables(results, pixel_area_m2, polygon_layer=None, attribute_fields=(), gpkg_path=None, parquet_path=None):
+    """Writes the same columns as the CSV, plus the zone geometries, to GeoPackage and/or Parquet."""
+    columns = {'ID': results.ids}
+    attribute_fields = list(attribute_fields)
+    if polygon_layer is not None and attribute_fields:
+        attributes = _attributes_by_id(polygon_layer, results.ids, attribute_fields)
+        empty = [None] * len(attribute_fields)
+        rows = [attributes.get(feature_id, empty) for feature_id in results.ids.tolist()]
+        for position, name in enumerate(attribute_fields):
+            columns[table_column_name(name)] = [row[position] for row in rows]
+    columns.update(results.carbon_columns(pixel_area_m2))
+    columns.update(results.extra)
+
+    geometries = crs_wkt = None
+    if polygon_layer is not None:
+        geometries = zone_geometries(polygon_layer, results.ids)
+        crs_wkt = polygon_layer.crs().toWkt()
+    if gpkg_path:
+        write_geopackage(gpkg_path, ZONE_LAYER_NAME, columns, geometries, crs_wkt)
+    if parquet_path:
+        write_parquet(parquet_path, columns, geometries, crs_wkt)
+
+
+def table_column_name(name):
+    """Column of an attribute in the GeoPackage/Parquet outputs: ``id`` and ``fid`` (any case) get the ``attr_`` prefix."""
+    return TABLE_ATTRIBUTE_PREFIX + name if name.lower() in ('id', 'fid') else name
+
+
+def zone_geometries(layer, ids=None):
+    """WKB of the polygons, aligned with ``ids`` (or in iteration order when ``ids`` is None)."""
+    request = QgsFeatureRequest().setNoAttributes()
+    if ids is None:
+        return [bytes(feature.geometry().asWkb()) for feature in layer.getFeatures(request)]
+    geometries = {feature.id(): bytes(feature.geometry().asWkb())
+                  for feature in layer.getFeatures(request.setFilterFids(ids.tolist()))}
+    return [geometries.get(feature_id) for feature_id in ids.tolist()]
+
+
+def record_zonal_run(registry_path, algorithm, biome, parameters, inputs, results, pixel_area_m2,
+                     polygon_layer=None, key_field=None, campaign=None):
+    """Appends this run and its per-zone carbon to the SQLite registry; returns the run ID."""
+    columns = results.carbon_columns(pixel_area_m2)
+    carbon = [_csv_values(columns[name]) for name in CARBON_COLUMNS]
+    counts = [None if value is None else int(value) for value in _csv_values(results.count)]
+    keys = zone_keys(polygon_layer, results.ids, key_field) if polygon_layer is not None and key_field else [None] * len(results)
+    extra_names = list(results.extra)
+    extra = zip(*[_csv_values(values) for values in results.extra.values()]) if extra_names else itertools.repeat(())
+    rows = ((feature_id, key, count, ton_ha, kg_m2, ton, kg, dict(zip(extra_names, values)) or None)
+            for feature_id, key, count, ton_ha, kg_m2, ton, kg, values
+            in zip(results.ids.tolist(), keys, counts, *carbon, extra))
+    with RunRegistry(registry_path) as registry:
+        return registry.record_run(algorithm, biome, parameters, inputs, rows, campaign)
+
+
+def zone_keys(layer, ids, field_name):
+    """Values of ``field_name`` aligned with ``ids``."""
+    attributes = _attributes_by_id(layer, ids, [field_name])
+    return [attributes.get(feature_id, [None])[0] for feature_id in ids.tolist()]
+
+
+def _attributes_by_id(layer, ids, field_names):
+    request = QgsFeatureRequest().setFilterFids(ids.tolist()).setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes(field_names, layer.fields())
+    attributes = {}
+    for feature in layer.getFeatures(request):
+        attributes[feature.id()] = [None if feature[name] == NULL else feature[name] for name in field_names]
+    return attributes
+
+
+def _csv_values(values):
+    # NaN vira célula vazia, como acontecia com None no DictWriter
+    cells = values.astype(object)
+    cells[np.isnan(values)] = None
+    return cells.tolist()
@@ -0,0 +1,109 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import itertools
+
+import numpy as np
+
+from qgis.core import (QgsCoordinateReferenceSystem, # type: ignore
+                       QgsCoordinateTransform,
+                       QgsFeatureRequest,
+                       QgsGeometry,
+                       QgsProcessingUtils,
+                       QgsSpatialIndex)
+from osgeo import gdal, ogr, osr # type: ignore
+
+ZONE_NODATA = -1
+
+
+def rasterize_zones(polygon_layer, reference_ds, context, feedback=None, feature_ids=None):
+    """Burns the position of each polygon (0..n-1) into an Int32 raster aligned with ``reference_ds``.
+
+    The zone raster is written once to a compressed, tiled temporary GTiff so
+    it can be read window by window next to the input rasters. Pixels go to
+    the polygon holding their center; where polygons overlap, the last one
+    wins. With ``feature_ids`` only those features are burned (see
+    ``disjoint_zone_groups``). Returns ``(zones_ds, ids)`` where ``ids[i]``
+    is the feature ID of zone ``i``.
+    """
+    projection = reference_ds.GetProjection()
+    transform = QgsCoordinateTransform(polygon_layer.crs(), QgsCoordinateReferenceSystem.fromWkt(projection),
+                                       context.transformContext())
+    srs = osr.SpatialReference(wkt=projection)
+    srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    memory_ds = ogr.GetDriverByName('Memory').CreateDataSource('zones')
+    layer = memory_ds.CreateLayer('zones', srs, ogr.wkbUnknown)
+    layer.CreateField(ogr.FieldDefn('zone', ogr.OFTInteger))
+    request = QgsFeatureRequest().setNoAttributes()
+    if feature_ids is not None:
+        request.setFilterFids(list(feature_ids))
+    ids = []
+    for feature in polygon_layer.getFeatures(request):
+        geometry = feature.geometry()
+        geometry.transform(transform)
+        zone = ogr.Feature(layer.GetLayerDefn())
+        zone.SetField(0, len(ids))
+        zone.SetGeometry(ogr.CreateGeometryFromWkb(bytes(geometry.asWkb())))
+        layer.CreateFeature(zone)
+        ids.append(feature.id())
+
+    path = QgsProcessingUtils.generateTempFilename('zones.tif')
+    zones_ds = gdal.GetDriverByName('GTiff').Create(
+        path, reference_ds.RasterXSize, reference_ds.RasterYSize, 1, gdal.GDT_Int32,
+        ['COMPRESS=DEFLATE', 'TILED=YES', 'BIGTIFF=IF_SAFER'])
+    zones_ds.SetGeoTransform(reference_ds.GetGeoTransform())
+    zones_ds.SetProjection(projection)
+    band = zones_ds.GetRasterBand(1)
+    band.SetNoDataValue(ZONE_NODATA)
+    band.Fill(ZONE_NODATA)
+    if feedback is not None:
+        feedback.pushInfo(f'Rasterizando {len(ids)} polígono(s) em "{path}"')
+    gdal.RasterizeLayer(zones_ds, [1], layer, options=['ATTRIBUTE=zone'])
+    band.FlushCache()
+    return zones_ds, np.array(ids, dtype=np.int64)
+
+
+def disjoint_zone_groups(polygon_layer, feedback=None):
+    """Splits the features in groups of polygons that do not overlap one another.
+
+    One zone raster keeps a single polygon per pixel, so a layer with
+    overlapping polygons is burned one group at a time for every polygon to
+    get all of its pixels, as with the per-polygon zonal statistics. Polygons
+    that only touch stay in the same group. Returns ``(feature_ids, groups)``
+    in iteration order, ``groups[i]`` being the group of ``feature_ids[i]``;
+    a layer without overlaps has the single group ``0``.
+    """
+    index = QgsSpatialIndex()
+    geometries = {}
+    group_of = {}
+    feature_ids = []
+    for feature in polygon_layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        if feedback is not None and feedback.isCanceled():
+            break
+        geometry = feature.geometry()
+        engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+        engine.prepareGeometry()
+        taken = set()
+        for other in index.intersects(geometry.boundingBox()):
+            if group_of[other] in taken or not engine.intersects(geometries[other].constGet()):
+                continue
+            if geometry.intersection(geometries[other]).area() > 0:
+                taken.add(group_of[other])
+        group_of[feature.id()] = next(group for group in itertools.count() if group not in taken)
+        geometries[feature.id()] = geometry
+        index.addFeature(feature)
+        feature_ids.append(feature.id())
+    groups = [group_of[feature_id] for feature_id in feature_ids]
+    return np.array(feature_ids, dtype=np.int64), np.array(groups, dtype=np.int64)
+
+
+def zone_reader(zones_band):
+    """Window reader for the zone raster (same ``(yoff, rows)`` windows as the pipeline)."""
+    def read(window):
+        yoff, rows = window
+        return zones_band.ReadAsArray(0, yoff, zones_band.XSize, rows).astype(np.int64)
+    return read
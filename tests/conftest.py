@@ -0,0 +1,11 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import os
+import sys
+
+# Os testes importam os módulos de processing_provider que não dependem do QGIS
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
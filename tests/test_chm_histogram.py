@@ -0,0 +1,126 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import numpy as np
+import pytest
+
+from processing_provider import tnc_carbon_chm_histogram
+from processing_provider.tnc_carbon_chm_histogram import ChmHistogram, parse_thresholds
+
+COEFFICIENTS = (1.5, 20.0, 0.8)
+PIXEL_AREA_M2 = 0.25
+
+
+def raster(seed=11, shape=(120, 90), zones=40):
+    rng = np.random.default_rng(seed)
+    chm = np.round(rng.gamma(2.0, 4.0, shape), 3).astype(np.float32)
+    valid = rng.random(shape) > 0.1
+    zone_ids = rng.integers(-1, zones, shape)
+    return chm, valid, zone_ids
+
+
+def fill(histogram, chm, valid, zone_ids, rows=17):
+    for yoff in range(0, chm.shape[0], rows):
+        window = slice(yoff, yoff + rows)
+        histogram.add(histogram.partial(None if zone_ids is None else zone_ids[window], chm[window], valid[window]))
+    return histogram
+
+
+def brute_force(chm, valid, zone_ids, zones, threshold):
+    """Zone canopy cover rates and densities straight from the pixels."""
+    above = valid & (chm >= threshold)
+    rate = np.count_nonzero(above) / np.count_nonzero(valid)
+    zone_rate, density = [], []
+    for zone in range(zones):
+        inside = valid & (zone_ids == zone)
+        zone_rate.append(np.count_nonzero(above & inside) / np.count_nonzero(inside))
+        mean_chm = chm[inside].astype(np.float64).mean()
+        density.append(COEFFICIENTS[0] + COEFFICIENTS[1] * rate + COEFFICIENTS[2] * mean_chm)
+    return rate, np.array(zone_rate), np.array(density)
+
+
+def test_sweep_matches_the_pixels(monkeypatch):
+    # Mescla frequente para cobrir o caminho das parciais pendentes
+    monkeypatch.setattr(tnc_carbon_chm_histogram, 'HISTOGRAM_MERGE_ENTRIES', 50)
+    chm, valid, zone_ids = raster()
+    histogram = fill(ChmHistogram(np.arange(40)), chm, valid, zone_ids)
+    thresholds = [0.0, 1.5, 2.0, 5.0, 12.3]
+    columns = histogram.sweep(thresholds, COEFFICIENTS, PIXEL_AREA_M2)
+    for step, threshold in enumerate(thresholds):
+        rate, zone_rate, density = brute_force(chm, valid, zone_ids, 40, threshold)
+        rows = slice(step, 40 * len(thresholds), len(thresholds))
+        np.testing.assert_allclose(columns['Canopy cover rate'][rows], rate)
+        np.testing.assert_allclose(columns['Zone canopy cover rate'][rows], zone_rate)
+        np.testing.assert_allclose(columns['Carbon Density (ton/ha)'][rows], density, rtol=1e-6)
+    total = columns['ID'] == -1
+    area_ha = np.count_nonzero(valid & (zone_ids >= 0)) * PIXEL_AREA_M2 / 1e4
+    assert columns['Area (ha)'][total][0] == pytest.approx(area_ha)
+
+
+def test_zone_counts_are_sparse_int32():
+    chm, valid, zone_ids = raster(zones=2000)
+    histogram = fill(ChmHistogram(np.arange(2000)), chm, valid, zone_ids)
+    state = histogram.state()
+    assert state['histogram_zone_values'].dtype == np.int32
+    # Cada zona só guarda as classes que tem, não as 1001
+    assert state['histogram_zone_keys'].size < 2000 * histogram.bins // 50
+    assert histogram.zone_counts().sum() == np.count_nonzero(valid & (zone_ids >= 0))
+
+
+def test_restored_state_and_saved_sidecar_give_the_same_sweep(tmp_path):
+    chm, valid, zone_ids = raster()
+    whole = fill(ChmHistogram(np.arange(40)), chm, valid, zone_ids)
+    first = fill(ChmHistogram(np.arange(40)), chm[:60], valid[:60], zone_ids[:60])
+    resumed = ChmHistogram(np.arange(40))
+    resumed.restore(first.state())
+    fill(resumed, chm[60:], valid[60:], zone_ids[60:])
+    whole.save(str(tmp_path / 'histogram.npz'), PIXEL_AREA_M2)
+    loaded, pixel_area_m2 = ChmHistogram.load(str(tmp_path / 'histogram.npz'))
+    assert pixel_area_m2 == PIXEL_AREA_M2
+    expected = whole.sweep([1.0, 2.0], COEFFICIENTS, PIXEL_AREA_M2)
+    for histogram in (resumed, loaded):
+        columns = histogram.sweep([1.0, 2.0], COEFFICIENTS, PIXEL_AREA_M2)
+        for name, values in expected.items():
+            np.testing.assert_allclose(columns[name], values)
+
+
+def test_dense_sidecar_of_the_first_version_still_loads(tmp_path):
+    chm, valid, zone_ids = raster()
+    histogram = fill(ChmHistogram(np.arange(40)), chm, valid, zone_ids)
+    state = histogram.state()
+    keys = state['histogram_zone_keys']
+    assert keys.size
+    dense = np.zeros((40, histogram.bins), dtype=np.int64)
+    dense.ravel()[keys] = state['histogram_zone_values']
+    path = str(tmp_path / 'old.npz')
+    np.savez_compressed(path, version=1, bin_width=histogram.bin_width, max_height=histogram.max_height,
+                        pixel_area_m2=PIXEL_AREA_M2, ids=histogram.ids, counts=histogram.counts,
+                        chm_sum=histogram.chm_sum, zone_counts=dense, zone_sums=histogram.zone_sums)
+    loaded, _ = ChmHistogram.load(path)
+    np.testing.assert_array_equal(loaded.zone_keys, keys)
+    np.testing.assert_array_equal(loaded.zone_values, state['histogram_zone_values'])
+
+
+def test_single_zone_histogram():
+    chm, valid, _ = raster()
+    histogram = fill(ChmHistogram(), chm, valid, None)
+    columns = histogram.sweep([2.0], COEFFICIENTS, PIXEL_AREA_M2)
+    assert columns['ID'].tolist() == [-1]
+    assert columns['Zone canopy cover rate'][0] == pytest.approx(np.count_nonzero(valid & (chm >= 2.0))
+                                                                 / np.count_nonzero(valid))
+
+
+def test_thresholds_off_the_bin_edges_are_rejected():
+    assert parse_thresholds('3, 1; 1.5 2') == [1.0, 1.5, 2.0, 3.0]
+    with pytest.raises(ValueError, match='2.05'):
+        parse_thresholds('2, 2.05')
+    with pytest.raises(ValueError):
+        parse_thresholds('150')
+    with pytest.raises(ValueError):
+        parse_thresholds('-1')
+    assert parse_thresholds('2.5', bin_width=0.5) == [2.5]
+    with pytest.raises(ValueError):
+        ChmHistogram().sweep([2.05], COEFFICIENTS, PIXEL_AREA_M2)
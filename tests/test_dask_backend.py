@@ -0,0 +1,131 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import numpy as np
+import pytest
+
+pytest.importorskip('dask')
+pytest.importorskip('osgeo')
+
+from processing_provider import tnc_carbon_dask_backend
+from processing_provider.tnc_carbon_dask_backend import (canopy_cover_counts, carbon_density, chm_array,
+                                                         dtm_dsm_array, scheduler, whole_raster_mean, zonal_sums)
+from processing_provider.tnc_carbon_raster_pipeline import (chm_reader, count_canopy_cover, dtm_dsm_reader,
+                                                            write_model_raster)
+
+XSIZE, YSIZE = 90, 70
+NODATA = -9999.0
+COEFFICIENTS = (1.5, 20.0, 0.8)
+THRESHOLD = 2.0
+ZONES = 6
+
+
+class Band:
+    """In-memory band answering the GDAL calls of both backends."""
+
+    def __init__(self, values, nodata=NODATA, block_size=(XSIZE, 8)):
+        self.values = values
+        self.nodata = nodata
+        self.block_size = block_size
+        self.YSize, self.XSize = values.shape
+
+    def ReadAsArray(self, xoff, yoff, xsize, ysize):
+        return self.values[yoff:yoff + ysize, xoff:xoff + xsize].copy()
+
+    def WriteArray(self, array, xoff, yoff):
+        self.values[yoff:yoff + array.shape[0], xoff:xoff + array.shape[1]] = array
+
+    def GetNoDataValue(self):
+        return self.nodata
+
+    def GetBlockSize(self):
+        return list(self.block_size)
+
+    def GetDataset(self):
+        return self
+
+    def FlushCache(self):
+        pass
+
+
+class Dataset:
+
+    def __init__(self, band):
+        self.band = band
+        self.RasterYSize, self.RasterXSize = band.values.shape
+
+    def GetRasterBand(self, number):
+        return self.band
+
+
+class Gdal:
+    """Opens the in-memory bands by path."""
+
+    def __init__(self, bands):
+        self.bands = bands
+
+    def Open(self, path):
+        return Dataset(self.bands[path])
+
+
+def surfaces(seed=3):
+    rng = np.random.default_rng(seed)
+    dtm = (100 + rng.normal(0, 2, (YSIZE, XSIZE))).astype(np.float32)
+    chm = rng.gamma(2.0, 4.0, (YSIZE, XSIZE)).astype(np.float32)
+    dtm[rng.random(dtm.shape) < 0.05] = NODATA
+    chm_with_nodata = np.where(dtm == NODATA, np.float32(NODATA), chm)
+    return chm_with_nodata, dtm, dtm + chm, rng.integers(-1, ZONES, (YSIZE, XSIZE))
+
+
+def numpy_pipeline(read):
+    windows = [(yoff, min(16, YSIZE - yoff)) for yoff in range(0, YSIZE, 16)]
+    total, canopy = count_canopy_cover(read, windows, THRESHOLD, workers=2)
+    rate = canopy / total
+    intercept, canopy_cover, height = COEFFICIENTS
+    out_band = Band(np.zeros((YSIZE, XSIZE), dtype=np.float32))
+    assert write_model_raster(read, windows, lambda chm: intercept + canopy_cover * rate + height * chm, out_band,
+                              NODATA, workers=2)
+    density = out_band.values.astype(np.float64)
+    density[density == NODATA] = np.nan
+    return total, canopy, density
+
+
+@pytest.mark.parametrize('inputs', ['chm', 'dtm_dsm'])
+def test_dask_graph_matches_the_windowed_pipeline(monkeypatch, inputs):
+    chm, dtm, dsm, zone_ids = surfaces()
+    bands = {'chm.tif': Band(chm), 'dtm.tif': Band(dtm), 'dsm.tif': Band(dsm, nodata=None),
+             'zones.tif': Band(zone_ids, nodata=-1)}
+    monkeypatch.setattr(tnc_carbon_dask_backend, 'gdal', Gdal(bands))
+    if inputs == 'chm':
+        read = chm_reader(bands['chm.tif'])
+    else:
+        read = dtm_dsm_reader(bands['dtm.tif'], bands['dsm.tif'])
+    total, canopy, expected = numpy_pipeline(read)
+
+    with scheduler():
+        # Blocos de 24 pixels: não alinhados com as janelas nem com o raster
+        if inputs == 'chm':
+            heights, mask, nodata_value = chm_array('chm.tif', 24)
+        else:
+            heights, mask, nodata_value = dtm_dsm_array('dtm.tif', 'dsm.tif', 24)
+        assert nodata_value == NODATA
+        assert canopy_cover_counts(heights, mask, THRESHOLD) == (total, canopy)
+        density = carbon_density(heights, mask, COEFFICIENTS, canopy / total)
+        values = density.compute()
+        assert values.dtype == np.float32
+        np.testing.assert_array_equal(np.isnan(values), np.isnan(expected))
+        np.testing.assert_allclose(values, expected, rtol=1e-6)
+
+        count, mean = whole_raster_mean(density)
+        assert count == np.count_nonzero(~np.isnan(expected))
+        assert mean == pytest.approx(np.nanmean(expected))
+
+        zones = tnc_carbon_dask_backend.GdalBandArray('zones.tif', dtype=np.int64).to_dask(24)
+        counts, sums = zonal_sums(density, zones, ZONES)
+    for zone in range(ZONES):
+        inside = (zone_ids == zone) & ~np.isnan(expected)
+        assert counts[zone] == np.count_nonzero(inside)
+        assert sums[zone] / counts[zone] == pytest.approx(expected[inside].mean())
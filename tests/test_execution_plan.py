@@ -0,0 +1,63 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import pytest
+
+pytest.importorskip('osgeo')
+
+from processing_provider.tnc_carbon_execution_plan import MB, PARALLEL, STREAMED, plan_raster_run
+from processing_provider.tnc_carbon_raster_pipeline import raster_windows
+
+GDT_FLOAT32 = 6
+
+
+class Dataset:
+
+    def GetMetadataItem(self, name, domain=None):
+        return 'DEFLATE'
+
+
+class Band:
+    """Metadata of a Float32 band, which is all the planner reads."""
+
+    def __init__(self, xsize, ysize, block_size):
+        self.XSize, self.YSize = xsize, ysize
+        self.DataType = GDT_FLOAT32
+        self.block_size = block_size
+
+    def GetBlockSize(self):
+        return list(self.block_size)
+
+    def GetDataset(self):
+        return Dataset()
+
+
+def test_large_budget_keeps_whole_blocks_and_threads():
+    plan = plan_raster_run([Band(100_000, 20_000, (256, 256))], 8192, workers=4, available_bytes=16 << 30)
+    assert plan.engine == PARALLEL and plan.window_rows % 256 == 0
+    assert plan.peak_bytes <= plan.budget_bytes and not plan.notes
+
+
+def test_wide_raster_goes_below_the_block_height_to_fit_the_budget():
+    band = Band(100_000, 20_000, (256, 256))
+    plan = plan_raster_run([band], 512, workers=4, available_bytes=16 << 30)
+    assert plan.engine == STREAMED
+    assert plan.window_rows < 256
+    assert plan.peak_bytes <= 512 * MB
+    assert not any('Nem a menor janela' in note for note in plan.notes)
+    windows = raster_windows(band, rows=plan.window_rows)
+    assert windows[0] == (0, plan.window_rows)
+    assert sum(rows for _, rows in windows) == band.YSize
+
+
+def test_strips_keep_room_for_the_halo():
+
+    class Trees:
+        halo_y = 20
+
+    plan = plan_raster_run([Band(100_000, 20_000, (256, 256))], 64, local_canopy=None, trees=Trees(), workers=4,
+                           available_bytes=16 << 30)
+    assert plan.window_rows >= 2 * Trees.halo_y
@@ -0,0 +1,181 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from processing_provider.tnc_carbon_job_service import (FAILED, LARGE, QUEUED, RUNNING, SMALL, SUCCEEDED, HttpHandler,
+                                                         JobService, ServiceError)
+
+TOKEN = 'secret'
+
+
+class Jobs:
+    """``run_job`` stand-in: each job waits until it is released, unless it runs free."""
+
+    def __init__(self, free=False):
+        self.release = threading.Event()
+        if free:
+            self.release.set()
+        self.errors = []
+
+    def __call__(self, algorithm, parameters):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.release.wait(10)
+        return {'OUTPUT': f'{algorithm}.csv'}
+
+
+def service(run_job, **options):
+    return JobService(executor_factory=ThreadPoolExecutor, run_job=run_job, **options)
+
+
+async def settle(service, status=None):
+    # Deixa o despachante e os jobs avançarem (os jobs rodam em threads)
+    for _ in range(200):
+        await asyncio.sleep(0.01)
+        if status is None or all(job.status in status for job in service.jobs.values()):
+            return
+
+
+async def request(port, method, path, body=None, token=TOKEN, host='localhost', origin=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = json.dumps(body).encode() if body is not None else b''
+    head = [f'{method} {path} HTTP/1.1', f'Host: {host}', f'Content-Length: {len(payload)}']
+    if token is not None:
+        head.append(f'Authorization: Bearer {token}')
+    if origin is not None:
+        head.append(f'Origin: {origin}')
+    if body is not None:
+        head.append('Content-Type: application/json')
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status_line, _, rest = response.partition(b'\r\n')
+    return int(status_line.split()[1]), json.loads(rest.partition(b'\r\n\r\n')[2])
+
+
+def test_requests_without_the_token_or_from_other_hosts_are_refused():
+
+    async def scenario():
+        jobs = service(Jobs(free=True))
+        await jobs.start()
+        server = await asyncio.start_server(HttpHandler(jobs, TOKEN), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            assert (await request(port, 'GET', '/jobs', token=None))[0] == 401
+            assert (await request(port, 'GET', '/jobs', token='wrong'))[0] == 401
+            assert (await request(port, 'GET', '/jobs', host='attacker.example'))[0] == 403
+            assert (await request(port, 'GET', '/jobs', origin='http://attacker.example'))[0] == 403
+            assert (await request(port, 'POST', '/jobs', {'algorithm': 'native:buffer'}))[0] == 403
+            assert (await request(port, 'GET', '/jobs', host='127.0.0.1:8765', origin='http://localhost:3000')) \
+                == (200, {'jobs': []})
+            status, job = await request(port, 'POST', '/jobs', {'algorithm': 'amazonchm', 'parameters': {}})
+            assert status == 202 and job['algorithm'] == 'tnccc:amazonchm'
+        finally:
+            server.close()
+            await jobs.stop()
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_answers_503():
+
+    async def scenario():
+        run_job = Jobs()
+        jobs = service(run_job, workers=1, large_slots=0, max_queued=2)
+        await jobs.start()
+        running = jobs.submit('amazonchm', {})
+        await settle(jobs)
+        assert running.status == RUNNING
+        jobs.submit('amazonchm', {})
+        jobs.submit('amazonchm', {})
+        with pytest.raises(ServiceError) as error:
+            jobs.submit('amazonchm', {})
+        assert error.value.status == 503
+        run_job.release.set()
+        await settle(jobs, (SUCCEEDED,))
+        jobs.submit('amazonchm', {})
+        await jobs.stop()
+
+    asyncio.run(scenario())
+
+
+def test_large_jobs_leave_a_slot_for_small_ones(tmp_path):
+    large_input = tmp_path / 'cloud.laz'
+    large_input.write_bytes(b'x' * 100)
+
+    async def scenario():
+        run_job = Jobs()
+        jobs = service(run_job, workers=2, large_job_bytes=50)
+        assert jobs.large_slots == 1
+        await jobs.start()
+        first = jobs.submit('amazonpointcloud', {'INPUT_CLOUD': str(large_input)})
+        second = jobs.submit('amazonpointcloud', {'INPUT_CLOUD': str(large_input)})
+        small = jobs.submit('amazonchm', {'INPUT_RASTER': str(tmp_path / 'missing.tif')})
+        await settle(jobs)
+        assert (first.lane, second.lane, small.lane) == (LARGE, LARGE, SMALL)
+        assert (first.status, second.status, small.status) == (RUNNING, QUEUED, RUNNING)
+        run_job.release.set()
+        await settle(jobs, (SUCCEEDED,))
+        await jobs.stop()
+
+    asyncio.run(scenario())
+
+
+def test_single_worker_gets_an_extra_slot_for_small_jobs():
+    jobs = service(Jobs(), workers=1)
+    assert (jobs.workers, jobs.large_slots) == (2, 1)
+
+
+def test_a_dead_worker_process_fails_its_job_and_replaces_the_pool():
+
+    async def scenario():
+        run_job = Jobs(free=True)
+        run_job.errors.append(BrokenProcessPool('killed'))
+        jobs = service(run_job, workers=1, large_slots=0)
+        await jobs.start()
+        broken_pool = jobs.executor
+        failed = jobs.submit('amazonchm', {})
+        await settle(jobs, (FAILED,))
+        assert failed.status == FAILED and 'worker process died' in failed.error
+        assert jobs.executor is not broken_pool
+        succeeded = jobs.submit('amazonchm', {})
+        await settle(jobs, (FAILED, SUCCEEDED))
+        assert succeeded.status == SUCCEEDED and succeeded.outputs == {'OUTPUT': 'tnccc:amazonchm.csv'}
+        assert jobs.running == {SMALL: 0, LARGE: 0}
+        await jobs.stop()
+        broken_pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_finished_jobs_are_forgotten_beyond_the_cap_and_after_the_ttl():
+
+    async def scenario():
+        jobs = service(Jobs(free=True), workers=1, large_slots=0, keep_finished=2)
+        await jobs.start()
+        submitted = [jobs.submit('amazonchm', {}) for _ in range(4)]
+        await settle(jobs, (SUCCEEDED,))
+        assert list(jobs.jobs) == [job.id for job in submitted[2:]]
+        with pytest.raises(ServiceError) as error:
+            jobs.get(submitted[0].id)
+        assert error.value.status == 404
+
+        jobs.finished_ttl = 60.0
+        submitted[2].finished_at -= 120.0
+        queued = jobs.submit('amazonchm', {})
+        assert submitted[2].id not in jobs.jobs and queued.id in jobs.jobs
+        await settle(jobs, (SUCCEEDED,))
+        await jobs.stop()
+
+    asyncio.run(scenario())
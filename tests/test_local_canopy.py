@@ -0,0 +1,51 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import numpy as np
+import pytest
+
+from processing_provider.tnc_carbon_local_canopy import LocalCanopyCover, box_sums
+
+
+def brute_force_box_sums(values, halo_x, halo_y):
+    height, width = values.shape
+    sums = np.zeros(values.shape, dtype=np.int64)
+    for y in range(height):
+        for x in range(width):
+            sums[y, x] = values[max(0, y - halo_y):y + halo_y + 1, max(0, x - halo_x):x + halo_x + 1].sum()
+    return sums
+
+
+@pytest.mark.parametrize('halo_x, halo_y', [(0, 0), (1, 2), (3, 1), (7, 9)])
+def test_box_sums_match_brute_force(halo_x, halo_y):
+    values = np.random.default_rng(halo_x * 10 + halo_y).random((23, 31)) < 0.4
+    expected = brute_force_box_sums(values, halo_x, halo_y)
+    np.testing.assert_array_equal(box_sums(values, halo_x, halo_y, 0, 23), expected)
+    np.testing.assert_array_equal(box_sums(values, halo_x, halo_y, 5, 11), expected[5:16])
+
+
+def test_strip_rates_match_the_whole_raster():
+    rng = np.random.default_rng(2)
+    chm = rng.gamma(2.0, 3.0, (60, 40)).astype(np.float32)
+    nodata_mask = rng.random(chm.shape) < 0.1
+    local_canopy = LocalCanopyCover(2.0, 5.5, 0.5, 0.5)
+    assert local_canopy.window_pixels() == (11, 11)
+    whole = local_canopy.rates((0, 60), 0, (chm, nodata_mask))[2]
+    halo = local_canopy.halo_y
+    for yoff in range(0, 60, 7):
+        rows = min(7, 60 - yoff)
+        top, bottom = max(0, yoff - halo), min(60, yoff + rows + halo)
+        strip = local_canopy.rates((yoff, rows), top, (chm[top:bottom], nodata_mask[top:bottom]))
+        np.testing.assert_array_equal(strip[0], chm[yoff:yoff + rows])
+        np.testing.assert_array_equal(strip[2], whole[yoff:yoff + rows])
+
+
+def test_rate_is_the_share_of_valid_pixels_above_the_threshold():
+    chm = np.array([[0.0, 3.0, 5.0], [1.0, 2.0, 9.0]], dtype=np.float32)
+    nodata_mask = np.array([[False, False, True], [False, False, False]])
+    _, _, rate = LocalCanopyCover(2.0, 1000.0, 1.0, 1.0).rates((0, 2), 0, (chm, nodata_mask))
+    # Janela maior que o raster: todos os pixels válidos entram, o nodata não
+    np.testing.assert_allclose(rate, np.full((2, 3), 3 / 5))
@@ -0,0 +1,65 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import json
+
+import numpy as np
+import pytest
+
+from processing_provider.tnc_carbon_model_registry import CarbonModel, parse_registry
+
+
+def registry(*equations):
+    return json.dumps({'models': [{'id': f'model_{index}', 'equation': equation}
+                                  for index, equation in enumerate(equations)]})
+
+
+def test_kernel_matches_the_equation_with_folded_coefficients():
+    model = CarbonModel('power', 'Power', 'a * chm ** b + c * ccr', {'a': 0.4, 'b': 1.7, 'c': 12.0})
+    chm = np.array([[0.0, 3.5], [12.0, 40.0]], dtype=np.float32)
+    np.testing.assert_allclose(model.kernel(chm, 0.6), 0.4 * chm ** 1.7 + 12.0 * 0.6, rtol=1e-6)
+    assert model.linear_coefficients is None
+
+
+def test_linear_equations_expose_their_coefficients():
+    model = CarbonModel('linear', None, 'a + b * ccr + c * chm', {'a': -3.0, 'b': 20.0, 'c': 1.25})
+    assert model.linear_coefficients == pytest.approx((-3.0, 20.0, 1.25))
+    assert CarbonModel('scaled', None, '(2 + chm) * 3').linear_coefficients == pytest.approx((6.0, 0.0, 3.0))
+
+
+@pytest.mark.parametrize('equation', ['__import__("os").system("true")', 'chm.__class__', 'lambda: chm',
+                                      'open("x")', 'ccr * 2', '1 < chm < 2', 'exp'])
+def test_unsafe_or_invalid_equations_are_rejected(equation):
+    with pytest.raises(ValueError):
+        CarbonModel('bad', None, equation)
+
+
+def test_huge_powers_are_reported_and_do_not_hide_the_other_models():
+    models, errors = parse_registry(registry('chm + 10**400', 'chm + 10.0**400.0', 'chm + 10**(10**10)', 'chm + 1e400',
+                                             '2 * chm'))
+    assert [model.equation for model in models] == ['2 * chm']
+    assert len(errors) == 4
+    assert 'integer exponents' in errors[0]
+    assert 'OverflowError' in errors[1] and 'OverflowError' in errors[2]
+
+
+def test_invalid_entries_and_duplicated_ids_are_skipped():
+    text = json.dumps({'models': [{'id': 'a', 'equation': 'chm'}, {'id': 'a', 'equation': '2 * chm'},
+                                  {'id': 'B', 'equation': 'chm'}, 'x',
+                                  {'id': 'c', 'equation': 'chm', 'coefficients': 3}]})
+    models, errors = parse_registry(text)
+    assert [model.id for model in models] == ['a']
+    assert len(errors) == 4
+    assert parse_registry('{"version": "x", "models": []}') == ([], ["invalid registry version 'x'"])
+    assert parse_registry('{"models": ')[0] == []
+
+
+def test_toml_registry():
+    pytest.importorskip('tomllib')
+    models, errors = parse_registry('[[models]]\nid = "toml"\nequation = "a * chm"\ncoefficients = {a = 2.5}\n',
+                                    'toml')
+    assert not errors
+    assert models[0].linear_coefficients == pytest.approx((0.0, 0.0, 2.5))
@@ -0,0 +1,114 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import numpy as np
+import pytest
+
+pytest.importorskip('osgeo')
+pytest.importorskip('qgis.core')
+
+from processing_provider.tnc_carbon_multi_epoch import EpochZoneStats, epoch_change_columns
+
+COEFFICIENTS = (1.5, 20.0, 0.8)
+PIXEL_AREA_M2 = 0.25
+THRESHOLD = 2.0
+ZONES = 5
+
+
+def epochs(count=3, shape=(60, 40), seed=21):
+    """CHM stack where every epoch grows a little and loses a different set of pixels to nodata."""
+    rng = np.random.default_rng(seed)
+    base = rng.gamma(2.0, 4.0, shape)
+    stack = []
+    for epoch in range(count):
+        chm = (base + epoch * rng.uniform(0.0, 1.0, shape)).astype(np.float32)
+        stack.append((chm, rng.random(shape) < 0.1))
+    return stack, rng.integers(-1, ZONES, shape)
+
+
+def fill(stats, stack, zone_ids, rows=16):
+    for yoff in range(0, zone_ids.shape[0], rows):
+        window = slice(yoff, yoff + rows)
+        stats.add(stats.partial(zone_ids[window], [(chm[window], nodata[window]) for chm, nodata in stack]))
+    return stats
+
+
+@pytest.mark.parametrize('common_mask', [True, False])
+def test_zone_statistics_use_the_common_mask(common_mask):
+    stack, zone_ids = epochs()
+    stats = fill(EpochZoneStats(len(stack), ZONES, THRESHOLD, common_mask), stack, zone_ids)
+    valid_everywhere = np.logical_and.reduce([~nodata for _, nodata in stack])
+    for epoch, (chm, nodata) in enumerate(stack):
+        # A taxa de cobertura de dossel de cada época usa todos os seus pixels válidos
+        assert stats.valid[epoch] == np.count_nonzero(~nodata)
+        assert stats.canopy[epoch] == np.count_nonzero((chm >= THRESHOLD) & ~nodata)
+        selected = valid_everywhere if common_mask else ~nodata
+        for zone in range(ZONES):
+            inside = selected & (zone_ids == zone)
+            assert stats.counts[epoch, zone] == np.count_nonzero(inside)
+            assert stats.sums[epoch, zone] == pytest.approx(chm[inside].astype(np.float64).sum())
+    if common_mask:
+        assert (stats.counts == stats.counts[0]).all()
+    else:
+        assert not (stats.counts == stats.counts[0]).all()
+
+
+def test_density_follows_the_mean_chm_of_each_zone():
+    stack, zone_ids = epochs(count=2)
+    stats = fill(EpochZoneStats(2, ZONES, THRESHOLD), stack, zone_ids)
+    rate, count, density, carbon_ton = stats.carbon(COEFFICIENTS, PIXEL_AREA_M2)
+    common = ~stack[0][1] & ~stack[1][1]
+    for epoch, (chm, nodata) in enumerate(stack):
+        canopy = np.count_nonzero((chm >= THRESHOLD) & ~nodata)
+        assert rate[epoch] == pytest.approx(canopy / np.count_nonzero(~nodata))
+        for zone in range(ZONES):
+            inside = common & (zone_ids == zone)
+            expected = COEFFICIENTS[0] + COEFFICIENTS[1] * rate[epoch] + COEFFICIENTS[2] * chm[inside].mean()
+            assert density[epoch, zone] == pytest.approx(expected)
+            assert carbon_ton[epoch, zone] == pytest.approx(expected * inside.sum() * PIXEL_AREA_M2 / 10000)
+
+
+def test_total_row_sums_the_zones_and_skips_empty_ones():
+    count = np.array([[4.0, np.nan, 6.0], [4.0, np.nan, 6.0]])
+    density = np.array([[10.0, np.nan, 20.0], [12.0, np.nan, 19.0]])
+    carbon_ton = density * count * PIXEL_AREA_M2 / 10000
+    columns = epoch_change_columns(['2020', '2024'], count, density, carbon_ton, PIXEL_AREA_M2)
+    assert all(values.size == 4 for values in columns.values())
+    assert columns['Area 2020 (ha)'][-1] == pytest.approx(10 * PIXEL_AREA_M2 / 10000)
+    assert columns['Carbon 2020 (ton)'][-1] == pytest.approx(np.nansum(carbon_ton[0]))
+    # Densidade do total ponderada pela área de cada zona
+    assert columns['Carbon Density 2020 (ton/ha)'][-1] == pytest.approx((4 * 10.0 + 6 * 20.0) / 10)
+    assert columns['Carbon Density 2024 (ton/ha)'][-1] == pytest.approx((4 * 12.0 + 6 * 19.0) / 10)
+    assert np.isnan(columns['Carbon change 2020-2024 (ton)'][1])
+    assert columns['Carbon change 2020-2024 (%)'][-1] == pytest.approx(
+        (np.nansum(carbon_ton[1]) - np.nansum(carbon_ton[0])) / np.nansum(carbon_ton[0]) * 100)
+
+
+def test_intervals_add_the_first_to_last_one_with_three_epochs():
+    stack, zone_ids = epochs(count=3)
+    _, count, density, carbon_ton = fill(EpochZoneStats(3, ZONES, THRESHOLD), stack, zone_ids).carbon(
+        COEFFICIENTS, PIXEL_AREA_M2)
+    columns = epoch_change_columns(['a', 'b', 'c'], count, density, carbon_ton, PIXEL_AREA_M2)
+    changes = [name for name in columns if name.startswith('Carbon change') and name.endswith('(ton)')]
+    assert changes == ['Carbon change a-b (ton)', 'Carbon change b-c (ton)', 'Carbon change a-c (ton)']
+    np.testing.assert_allclose(columns['Carbon change a-c (ton)'],
+                               columns['Carbon change a-b (ton)'] + columns['Carbon change b-c (ton)'])
+    np.testing.assert_allclose(columns['Carbon Density change a-c (ton/ha)'][:-1], density[2] - density[0])
+
+    two = epoch_change_columns(['a', 'b'], count[:2], density[:2], carbon_ton[:2], PIXEL_AREA_M2)
+    assert not any('a-c' in name or 'b-c' in name for name in two)
+
+
+def test_without_polygons_the_raster_is_the_only_row():
+    stack, _ = epochs(count=2)
+    stats = EpochZoneStats(2, 1, THRESHOLD)
+    stats.add(stats.partial(None, stack))
+    _, count, density, carbon_ton = stats.carbon(COEFFICIENTS, PIXEL_AREA_M2)
+    columns = epoch_change_columns(['2020', '2024'], count, density, carbon_ton, PIXEL_AREA_M2, with_total=False)
+    assert all(values.size == 1 for values in columns.values())
+    common = ~stack[0][1] & ~stack[1][1]
+    assert columns['Area 2020 (ha)'][0] == pytest.approx(np.count_nonzero(common) * PIXEL_AREA_M2 / 10000)
+    assert columns['Carbon Density 2024 (ton/ha)'][0] == pytest.approx(density[1, 0])
@@ -0,0 +1,132 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import numpy as np
+import pytest
+
+laspy = pytest.importorskip('laspy')
+
+from processing_provider.tnc_carbon_point_cloud_batch import accumulate_regions_batched
+from processing_provider.tnc_carbon_point_cloud_io import PolygonRegion, iter_las_chunks, las_point_ranges
+from processing_provider.tnc_carbon_point_cloud_normalize import HeightNormalizer
+
+
+class CanceledFeedback:
+
+    def isCanceled(self):
+        return True
+
+    def setProgress(self, progress):
+        pass
+
+
+def write_cloud(path, count=130_000, extent=200.0, seed=3):
+    rng = np.random.default_rng(seed)
+    header = laspy.LasHeader(point_format=3, version='1.2')
+    header.scales = np.array([0.01, 0.01, 0.01])
+    header.offsets = np.array([0.0, 0.0, 0.0])
+    las = laspy.LasData(header)
+    las.x = rng.uniform(0, extent, count)
+    las.y = rng.uniform(0, extent, count)
+    las.z = rng.gamma(2.0, 6.0, count)
+    las.classification = np.where(rng.random(count) < 0.2, 2, 1).astype(np.uint8)
+    las.write(str(path))
+    return str(path)
+
+
+def square(x, y, side):
+    return PolygonRegion([[(x, y), (x + side, y), (x + side, y + side), (x, y + side), (x, y)]], side * side)
+
+
+def summary(results):
+    return [(accumulator.count, accumulator.percentile(10), accumulator.percentile(75), thinner.original_count,
+             thinner.kept_count) for accumulator, thinner in results]
+
+
+def test_point_ranges_cover_the_file_once(tmp_path):
+    path = write_cloud(tmp_path / 'cloud.las')
+    ranges = las_point_ranges(path, 4)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 130_000
+    assert all(stop == start for (_, stop), (start, _) in zip(ranges, ranges[1:]))
+    whole = np.concatenate([chunk['z'] for chunk in iter_las_chunks(path, 40_000)])
+    split = np.concatenate([chunk['z'] for start, stop in ranges
+                            for chunk in iter_las_chunks(path, 40_000, start=start, stop=stop)])
+    np.testing.assert_array_equal(whole, split)
+
+
+@pytest.mark.parametrize('target_density', [None, 0.7])
+def test_parallel_parts_match_the_sequential_scan(tmp_path, target_density):
+    path = write_cloud(tmp_path / 'cloud.las')
+    regions = [square(10, 10, 40), square(30, 30, 50), square(120, 60, 70), square(300, 300, 10)]
+    sequential = accumulate_regions_batched(path, regions, 1, HeightNormalizer(1.0), target_density,
+                                            chunk_size=40_000)
+    parallel = accumulate_regions_batched(path, regions, 2, HeightNormalizer(1.0), target_density,
+                                          chunk_size=40_000)
+    assert summary(parallel) == summary(sequential)
+    assert sequential[-1][0].count == 0
+    if target_density:
+        assert sequential[0][1].kept_count < sequential[0][1].original_count
+
+
+def test_canceled_run_returns_none(tmp_path):
+    path = write_cloud(tmp_path / 'cloud.las', count=1_000)
+    regions = [square(10, 10, 40)]
+    assert accumulate_regions_batched(path, regions, 1, feedback=CanceledFeedback()) is None
+    assert accumulate_regions_batched(path, regions, 2, feedback=CanceledFeedback()) is None
+
+
+def test_index_cache_rebuilds_the_same_ground_tin(tmp_path):
+    pytest.importorskip('scipy')
+    from processing_provider.tnc_carbon_point_cloud_index_cache import MembershipIndex, file_fingerprint
+
+    path = write_cloud(tmp_path / 'cloud.las')
+    regions = [square(10, 10, 40), square(120, 60, 70)]
+    index = lambda: MembershipIndex(path, file_fingerprint(path), 'polygons')
+    plain = accumulate_regions_batched(path, regions, 1, HeightNormalizer(0.5, ground_tin=True), chunk_size=40_000)
+    first = accumulate_regions_batched(path, regions, 1, HeightNormalizer(0.5, ground_tin=True), chunk_size=40_000,
+                                       index=index())
+    assert index().is_valid() and index().has_ground()
+    cached = accumulate_regions_batched(path, regions, 1, HeightNormalizer(0.5, ground_tin=True), chunk_size=40_000,
+                                        index=index())
+    assert summary(first) == summary(plain)
+    assert summary(cached) == summary(first)
+
+
+def test_index_written_without_ground_gets_it_on_the_first_tin_run(tmp_path):
+    pytest.importorskip('scipy')
+    from processing_provider.tnc_carbon_point_cloud_index_cache import MembershipIndex, file_fingerprint
+
+    path = write_cloud(tmp_path / 'cloud.las')
+    regions = [square(10, 10, 40), square(120, 60, 70)]
+    index = lambda: MembershipIndex(path, file_fingerprint(path), 'polygons')
+    accumulate_regions_batched(path, regions, 1, HeightNormalizer(0.5), chunk_size=40_000, index=index())
+    assert index().is_valid() and not index().has_ground()
+    plain = accumulate_regions_batched(path, regions, 1, HeightNormalizer(0.5, ground_tin=True), chunk_size=40_000)
+    cached = accumulate_regions_batched(path, regions, 1, HeightNormalizer(0.5, ground_tin=True), chunk_size=40_000,
+                                        index=index())
+    assert index().has_ground()
+    assert summary(cached) == summary(plain)
+
+
+def test_sequential_scan_reports_progress_and_stops_on_cancel(tmp_path):
+    path = write_cloud(tmp_path / 'cloud.las')
+
+    class Feedback:
+        def __init__(self, cancel_after):
+            self.progress = []
+            self.cancel_after = cancel_after
+
+        def isCanceled(self):
+            return len(self.progress) >= self.cancel_after
+
+        def setProgress(self, progress):
+            self.progress.append(progress)
+
+    feedback = Feedback(cancel_after=100)
+    assert accumulate_regions_batched(path, [square(10, 10, 40)], 1, feedback=feedback, chunk_size=40_000)
+    assert feedback.progress[-1] == pytest.approx(100.0)
+    assert accumulate_regions_batched(path, [square(10, 10, 40)], 1, feedback=Feedback(cancel_after=1),
+                                      chunk_size=40_000) is None
@@ -0,0 +1,96 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import pickle
+
+import numpy as np
+import pytest
+
+from processing_provider.tnc_carbon_point_cloud_decimation import (MAX_THINNING_CELLS, DensityThinner,
+                                                                   uniform_hash)
+
+BBOX = (0.0, 0.0, 200.0, 100.0)
+
+
+def points(count=400_000, seed=10):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 200, count), rng.uniform(0, 100, count), rng.uniform(0, 30, count)
+
+
+def thin_in_chunks(x, y, z, chunk_size, target=1.4, unit_area=1.0):
+    thinner = DensityThinner(target, BBOX, unit_area)
+    for start in range(0, x.size, chunk_size):
+        thinner.count(x[start:start + chunk_size], y[start:start + chunk_size])
+    keep = np.concatenate([thinner.thin(x[start:start + chunk_size], y[start:start + chunk_size],
+                                        z[start:start + chunk_size]) for start in range(0, x.size, chunk_size)])
+    return thinner, keep
+
+
+@pytest.mark.parametrize('target', [0.3, 1.4, 10.5])
+def test_fractional_targets_are_met_on_average(target):
+    x, y, z = points()
+    thinner, keep = thin_in_chunks(x, y, z, 50_000, target)
+    area = (BBOX[2] - BBOX[0]) * (BBOX[3] - BBOX[1])
+    assert thinner.effective_density(area) == pytest.approx(target, rel=0.03)
+    assert thinner.kept_count == keep.sum()
+    assert thinner.original_count == x.size
+
+
+def test_kept_points_do_not_depend_on_order_or_chunking():
+    x, y, z = points(100_000)
+    _, keep = thin_in_chunks(x, y, z, 100_000)
+    order = np.random.default_rng(11).permutation(x.size)
+    _, shuffled = thin_in_chunks(x[order], y[order], z[order], 7_000)
+    assert np.array_equal(keep[order], shuffled)
+
+
+def test_workers_can_merge_counts_and_totals():
+    x, y, z = points(100_000)
+    single, keep = thin_in_chunks(x, y, z, 100_000)
+    parts = [slice(0, 60_000), slice(60_000, None)]
+    counted = DensityThinner(1.4, BBOX)
+    for part in parts:
+        worker = DensityThinner(1.4, BBOX)
+        worker.count(x[part], y[part])
+        counted.merge_counts(worker)
+    # Cada processo recebe as contagens somadas para a segunda passada
+    workers = [pickle.loads(pickle.dumps(counted)) for _ in parts]
+    kept = np.concatenate([worker.thin(x[part], y[part], z[part]) for worker, part in zip(workers, parts)])
+    workers[0].merge(workers[1])
+    assert np.array_equal(kept, keep)
+    assert workers[0].kept_count == single.kept_count
+
+
+def test_density_is_in_square_metres_for_other_units():
+    x, y, z = points()
+    # Nuvem em pés: cada unidade quadrada tem 0.0929 m²
+    thinner, keep = thin_in_chunks(x, y, z, 100_000, target=1.0, unit_area=0.3048 ** 2)
+    area = (BBOX[2] - BBOX[0]) * (BBOX[3] - BBOX[1])
+    # As células cortadas pela borda da área recebem o limite inteiro
+    assert thinner.effective_density(area) == pytest.approx(1.0, rel=0.05)
+    assert keep.sum() == pytest.approx(area * 0.3048 ** 2, rel=0.05)
+
+
+def test_grid_is_bounded_for_huge_extents():
+    thinner = DensityThinner(50.0, (0.0, 0.0, 1.0e6, 1.0e6))
+    assert thinner.grid.size <= MAX_THINNING_CELLS * 1.01
+    assert thinner.cap == pytest.approx(50.0 * thinner.grid.cell_size ** 2)
+
+
+def test_disabled_thinner_only_counts():
+    x, y, z = points(1_000)
+    thinner = DensityThinner(None, BBOX)
+    assert not thinner.needs_count_pass
+    assert thinner.thin(x, y, z).all()
+    assert thinner.original_count == thinner.kept_count == 1_000
+
+
+def test_uniform_hash_is_deterministic_and_uniform():
+    x, y, z = points(200_000)
+    values = uniform_hash(x, y, z)
+    assert np.array_equal(values, uniform_hash(x.copy(), y.copy(), z.copy()))
+    assert values.min() >= 0 and values.max() < 1
+    assert np.histogram(values, bins=10, range=(0, 1))[0] == pytest.approx(np.full(10, 20_000), rel=0.03)
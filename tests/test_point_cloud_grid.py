@@ -0,0 +1,57 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import numpy as np
+import pytest
+
+pytest.importorskip('osgeo')
+
+from processing_provider.tnc_carbon_point_cloud_grid import grid_metrics, grid_strips, strip_rows_for
+from processing_provider.tnc_carbon_point_cloud_io import PointGrid
+from processing_provider.tnc_carbon_point_cloud_normalize import HeightNormalizer
+
+
+class CanceledFeedback:
+
+    def isCanceled(self):
+        return True
+
+
+def make_chunks(count=100_000, chunk_size=30_000, seed=1):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, 500, count)
+    y = rng.uniform(0, 300, count)
+    z = rng.gamma(2.0, 6.0, count)
+    classification = np.ones(count, dtype=np.uint8)
+    chunks = lambda: ({'x': x[i:i + chunk_size], 'y': y[i:i + chunk_size], 'z': z[i:i + chunk_size],
+                       'classification': classification[i:i + chunk_size]} for i in range(0, count, chunk_size))
+    return x, y, z, chunks
+
+
+@pytest.mark.parametrize('strip_rows', [1, 4, 7, None])
+def test_strips_match_the_whole_grid(strip_rows):
+    x, y, z, chunks = make_chunks()
+    grid = PointGrid(0, 0, 500, 300, 20)
+    valid = z >= 1.0
+    whole = grid_metrics(grid.cell_index(x[valid], y[valid]), z[valid].astype(np.float32), grid.size)
+    strips = list(grid_strips(chunks, HeightNormalizer(1.0), grid, strip_rows=strip_rows))
+    assert sum(rows for _, rows, _ in strips) == grid.rows
+    for name in ('ACD', 'sgm', 'cnt'):
+        joined = np.concatenate([metrics[name] for _, _, metrics in strips])
+        np.testing.assert_allclose(joined, whole[name], equal_nan=True)
+
+
+def test_strip_rows_are_bounded_by_points_and_cells():
+    grid = PointGrid(0, 0, 500, 300, 20)
+    assert strip_rows_for(grid, 0) == grid.rows
+    assert strip_rows_for(grid, 100_000, strip_points=20_000) == 3
+    assert strip_rows_for(grid, 10, strip_points=50) == 2
+
+
+def test_canceled_grid_yields_nothing():
+    _, _, _, chunks = make_chunks(count=1_000)
+    grid = PointGrid(0, 0, 500, 300, 20)
+    assert list(grid_strips(chunks, HeightNormalizer(), grid, strip_rows=2, feedback=CanceledFeedback())) == []
@@ -0,0 +1,121 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import io
+import struct
+import threading
+
+import numpy as np
+import pytest
+
+from processing_provider.tnc_carbon_point_cloud_io import prefetch
+
+
+def test_prefetch_closes_the_source_when_the_consumer_stops():
+    closed = threading.Event()
+
+    def source():
+        try:
+            for value in range(1_000):
+                yield value
+        finally:
+            closed.set()
+
+    reader = prefetch(source(), depth=1)
+    assert next(reader) == 0
+    reader.close()
+    assert closed.wait(5)
+
+
+def test_prefetch_forwards_errors_and_closes_the_source():
+    closed = threading.Event()
+
+    def source():
+        try:
+            yield 1
+            raise OSError('corrupted chunk')
+        finally:
+            closed.set()
+
+    with pytest.raises(OSError):
+        list(prefetch(source()))
+    assert closed.wait(5)
+
+
+def test_workers_skip_the_parallel_laz_backend(monkeypatch):
+    laspy = pytest.importorskip('laspy')
+    from processing_provider import tnc_carbon_point_cloud_io as io
+
+    monkeypatch.setattr(io, '_parallel_laz', True)
+    io.single_threaded_laz()
+    assert laspy.LazBackend.LazrsParallel not in (io.laz_backend() or ())
+
+
+def write_laz(path, count, chunk_size=None, chunks=None):
+    """LAZ file with ``chunk_size`` points per chunk, or variable-size ``chunks``, compressed with lazrs."""
+    laspy = pytest.importorskip('laspy')
+    lazrs = pytest.importorskip('lazrs')
+    header = laspy.LasHeader(point_format=3, version='1.2')
+    header.scales = [0.01, 0.01, 0.01]
+    las = laspy.LasData(header)
+    las.x = np.arange(count) * 0.01
+    las.y = np.zeros(count)
+    las.z = np.arange(count) % 97
+    laz = io.BytesIO()
+    las.write(laz, do_compress=True)
+    data = laz.getvalue()
+    header = laspy.LasHeader.read_from(io.BytesIO(data))
+    default = bytes(next(vlr for vlr in header.vlrs if vlr.record_id == 22204).record_data)
+
+    # Recomprime os pontos com o tamanho de bloco pedido, trocando o VLR do LASzip no cabeçalho
+    compression = lazrs.LazVlr.new_for_compression(3, 0, use_variable_size_chunks=chunks is not None)
+    record = bytearray(compression.record_data())
+    if chunk_size is not None:
+        struct.pack_into('<I', record, 12, chunk_size)
+    vlr = lazrs.LazVlr(bytes(record))
+    with open(path, 'wb') as file:
+        file.write(data[:header.offset_to_point_data].replace(default, bytes(record)))
+        compressor = lazrs.LasZipCompressor(file, vlr)
+        compressor.reserve_offset_to_chunk_table()
+        points = las.points.array.tobytes()
+        start = 0
+        for size in chunks or [count]:
+            compressor.compress_many(points[start * vlr.item_size():(start + size) * vlr.item_size()])
+            if chunks is not None:
+                compressor.finish_current_chunk()
+            start += size
+        compressor.done()
+    return np.asarray(las.z)
+
+
+def test_ranges_follow_the_chunk_size_of_the_laszip_vlr(tmp_path):
+    from processing_provider.tnc_carbon_point_cloud_io import iter_las_chunks, las_chunk_edges, las_point_ranges
+
+    path = str(tmp_path / 'cloud.laz')
+    z = write_laz(path, 10_000, chunk_size=3_000)
+    np.testing.assert_array_equal(las_chunk_edges(path), [0, 3_000, 6_000, 9_000, 10_000])
+    ranges = las_point_ranges(path, 3)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 10_000
+    assert all(start % 3_000 == 0 for start, _ in ranges) and len(ranges) == 3
+    read = [np.concatenate([chunk['z'] for chunk in iter_las_chunks(path, 1_000, start=start, stop=stop)])
+            for start, stop in ranges]
+    np.testing.assert_array_equal(np.concatenate(read), z)
+
+
+def test_variable_chunks_and_uncompressed_files(tmp_path):
+    laspy = pytest.importorskip('laspy')
+    from processing_provider.tnc_carbon_point_cloud_io import LAZ_CHUNK_POINTS, las_chunk_edges, las_point_ranges
+
+    variable = str(tmp_path / 'variable.laz')
+    write_laz(variable, 10_000, chunks=[3_000, 1_500, 4_000, 1_500])
+    assert las_point_ranges(variable, 4) == [(0, 10_000)]
+
+    uncompressed = str(tmp_path / 'cloud.las')
+    las = laspy.LasData(laspy.LasHeader(point_format=3, version='1.2'))
+    las.x = las.y = las.z = np.zeros(2 * LAZ_CHUNK_POINTS + 10)
+    las.write(uncompressed)
+    np.testing.assert_array_equal(las_chunk_edges(uncompressed),
+                                  [0, LAZ_CHUNK_POINTS, 2 * LAZ_CHUNK_POINTS, 2 * LAZ_CHUNK_POINTS + 10])
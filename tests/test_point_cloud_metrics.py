@@ -0,0 +1,85 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import numpy as np
+import pytest
+
+from processing_provider.tnc_carbon_point_cloud_metrics import DEFAULT_BIN_WIDTH, StreamingHeightMetrics
+
+PERCENTILES = (5, 10, 25, 75)
+
+
+def accumulate(heights, chunk_size=None, **kwargs):
+    metrics = StreamingHeightMetrics(**kwargs)
+    chunk_size = chunk_size or max(1, len(heights))
+    for start in range(0, len(heights), chunk_size):
+        metrics.update(heights[start:start + chunk_size])
+    return metrics
+
+
+@pytest.mark.parametrize('heights', [
+    np.array([1.0, 2.0, 3.0]),
+    np.array([0.5, 7.25]),
+    np.array([4.2]),
+    np.array([0.0, 0.0, 30.0, 31.5, 31.5]),
+    np.random.default_rng(1).uniform(0, 40, 11),
+])
+def test_percentiles_on_sparse_heights(heights):
+    metrics = accumulate(heights)
+    for q in PERCENTILES:
+        assert abs(metrics.percentile(q) - np.percentile(heights, q)) < DEFAULT_BIN_WIDTH
+
+
+def test_percentiles_on_dense_heights():
+    rng = np.random.default_rng(2)
+    heights = np.concatenate([rng.gamma(2.0, 4.0, 200_000), rng.normal(25.0, 3.0, 100_000)])
+    metrics = accumulate(heights, chunk_size=30_000)
+    for q in PERCENTILES:
+        assert abs(metrics.percentile(q) - np.percentile(heights, q)) < DEFAULT_BIN_WIDTH
+    assert metrics.metrics()['h100'] == heights.max()
+    assert metrics.metrics()['cnt'] == heights.size
+
+
+def test_moments_match_numpy():
+    heights = np.random.default_rng(3).lognormal(1.5, 0.6, 50_000)
+    metrics = accumulate(heights, chunk_size=7_000)
+    centered = heights - heights.mean()
+    kurtosis = heights.size * (centered ** 4).sum() / ((centered ** 2).sum() ** 2) - 3.0
+    assert metrics.mean == pytest.approx(heights.mean(), rel=1e-12)
+    assert metrics.kurtosis() == pytest.approx(kurtosis, rel=1e-9)
+
+
+def test_merge_equals_single_pass():
+    heights = np.random.default_rng(4).uniform(-2, 45, 20_000)
+    merged = accumulate(heights[:5_000])
+    merged.merge(accumulate(heights[5_000:]))
+    single = accumulate(heights)
+    assert merged.count == single.count
+    assert merged.mean == pytest.approx(single.mean)
+    for q in PERCENTILES:
+        assert merged.percentile(q) == pytest.approx(single.percentile(q))
+
+
+def test_outlier_keeps_the_histogram_bounded():
+    rng = np.random.default_rng(5)
+    heights = np.append(rng.uniform(0, 30, 10_000), 5.0e6)
+    metrics = accumulate(heights, chunk_size=1_000, max_bins=4096)
+    assert metrics._histogram.size <= 4096
+    for q in PERCENTILES:
+        assert abs(metrics.percentile(q) - np.percentile(heights, q)) < metrics.bin_width
+    assert metrics.max == 5.0e6
+
+
+def test_merge_with_a_coarser_accumulator():
+    rng = np.random.default_rng(6)
+    wide = np.append(rng.uniform(0, 30, 1_000), 1.0e5)
+    narrow = rng.uniform(0, 30, 1_000)
+    merged = accumulate(narrow, max_bins=4096)
+    merged.merge(accumulate(wide, max_bins=4096))
+    heights = np.concatenate([narrow, wide])
+    assert merged._histogram.sum() == heights.size
+    for q in PERCENTILES:
+        assert abs(merged.percentile(q) - np.percentile(heights, q)) < merged.bin_width
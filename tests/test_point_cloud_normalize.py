@@ -0,0 +1,101 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+
+from processing_provider.tnc_carbon_point_cloud_normalize import (GROUND_CLASS, HeightNormalizer, TiledGroundTin,
+                                                                  ground_mask, ground_tiles, in_tiles)
+
+
+def ground_plane(x, y):
+    return 100.0 + 0.05 * x - 0.02 * y
+
+
+def cloud_chunks(rng, count=40_000, extent=450.0, chunk_size=10_000):
+    x = rng.uniform(0, extent, count)
+    y = rng.uniform(0, extent, count)
+    ground = rng.random(count) < 0.3
+    z = ground_plane(x, y) + np.where(ground, 0.0, rng.uniform(0.5, 35.0, count))
+    classification = np.where(ground, GROUND_CLASS, 1).astype(np.uint8)
+    return [{'x': x[i:i + chunk_size], 'y': y[i:i + chunk_size], 'z': z[i:i + chunk_size],
+             'classification': classification[i:i + chunk_size]} for i in range(0, count, chunk_size)]
+
+
+def test_tiled_tin_recovers_a_planar_ground_across_tiles():
+    rng = np.random.default_rng(7)
+    tin = TiledGroundTin(tile_size=100.0, cache_tiles=2)
+    for chunk in cloud_chunks(rng):
+        keep = ground_mask(chunk)
+        tin.add(chunk['x'][keep], chunk['y'][keep], chunk['z'][keep])
+    tin.finish()
+    assert len(os.listdir(tin.folder)) >= 16
+
+    x = rng.uniform(5, 445, 5_000)
+    y = rng.uniform(5, 445, 5_000)
+    assert np.allclose(tin.sample(x, y), ground_plane(x, y), atol=1e-6)
+
+
+def test_tiled_tin_survives_pickling_and_cleans_up():
+    rng = np.random.default_rng(8)
+    tin = TiledGroundTin(tile_size=100.0)
+    x = rng.uniform(0, 200, 2_000)
+    y = rng.uniform(0, 200, 2_000)
+    tin.add(x, y, ground_plane(x, y))
+    tin.finish()
+    copy = pickle.loads(pickle.dumps(tin))
+    assert np.allclose(copy.sample(x[:50], y[:50]), ground_plane(x[:50], y[:50]), atol=1e-6)
+    folder = tin.folder
+    del copy
+    assert os.path.isdir(folder)
+    del tin
+    assert not os.path.isdir(folder)
+
+
+def test_ground_tin_normalization_and_height_filter():
+    rng = np.random.default_rng(9)
+    chunks = cloud_chunks(rng)
+    normalizer = HeightNormalizer(min_height=2.0, ground_tin=True)
+    normalizer.prepare(chunks)
+    for chunk in chunks:
+        heights = normalizer.normalize(chunk)
+        expected = chunk['z'] - ground_plane(chunk['x'], chunk['y'])
+        expected[expected < 2.0] = np.nan
+        # Na borda da nuvem (fora do fecho dos pontos de solo) vale o ponto de solo mais próximo
+        interior = (chunk['x'] > 10) & (chunk['x'] < 440) & (chunk['y'] > 10) & (chunk['y'] < 440)
+        assert np.allclose(heights[interior], expected[interior], atol=1e-6, equal_nan=True)
+
+
+def test_tin_over_a_bbox_only_keeps_nearby_ground():
+    chunk = {'x': np.array([0.0, 50.0, 75.0]), 'y': np.array([0.0, 50.0, 50.0]),
+             'z': np.zeros(3), 'classification': np.array([GROUND_CLASS, GROUND_CLASS, 1], dtype=np.uint8)}
+    assert ground_mask(chunk, (45.0, 45.0, 55.0, 55.0)).tolist() == [False, True, False]
+
+
+def test_tin_of_the_polygon_tiles_matches_the_tin_of_the_whole_cloud():
+    rng = np.random.default_rng(10)
+    chunks = cloud_chunks(rng)
+    for chunk in chunks:
+        # Solo irregular: a triangulação, e não só o plano, precisa ser a mesma
+        chunk['z'] = chunk['z'] + rng.normal(0.0, 0.5, chunk['z'].size)
+    whole = HeightNormalizer(ground_tin=True)
+    whole.prepare(chunks)
+
+    bboxes = [(120.0, 130.0, 180.0, 170.0), (310.0, 20.0, 330.0, 95.0)]
+    tiles = ground_tiles(bboxes, tile_size=100.0)
+    assert {(1, 1), (0, 0), (2, 2), (4, 1)} <= set(map(tuple, tiles.tolist()))
+    assert (4, 3) not in set(map(tuple, tiles.tolist()))
+    polygons = HeightNormalizer(ground_tin=True)
+    polygons.prepare({key: values[in_tiles(chunk['x'], chunk['y'], tiles, 100.0)] for key, values in chunk.items()}
+                     for chunk in chunks)
+    for xmin, ymin, xmax, ymax in bboxes:
+        inside = {'x': rng.uniform(xmin, xmax, 500), 'y': rng.uniform(ymin, ymax, 500), 'z': np.zeros(500)}
+        np.testing.assert_array_equal(polygons.normalize(inside), whole.normalize(inside))
@@ -0,0 +1,77 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import struct
+
+import numpy as np
+import pytest
+
+pytest.importorskip('osgeo')
+
+from processing_provider.tnc_carbon_raster_aggregate import CellAggregator
+
+PIXEL_SIZE = 0.7
+CELL_SIZE = 10.0
+SHAPE = (95, 61)
+GEOTRANSFORM = (500000.0, PIXEL_SIZE, 0.0, 7000000.0, 0.0, -PIXEL_SIZE)
+
+
+def density():
+    rng = np.random.default_rng(9)
+    values = rng.gamma(3.0, 20.0, SHAPE)
+    valid = rng.random(SHAPE) > 0.15
+    return values, valid
+
+
+def brute_force(values, valid):
+    """Cell sums and counts assigning each pixel to the cell holding its center."""
+    rows = int(np.ceil(SHAPE[0] * PIXEL_SIZE / CELL_SIZE))
+    cols = int(np.ceil(SHAPE[1] * PIXEL_SIZE / CELL_SIZE))
+    sums = np.zeros((rows, cols))
+    counts = np.zeros((rows, cols), dtype=np.int64)
+    for y in range(SHAPE[0]):
+        for x in range(SHAPE[1]):
+            if valid[y, x]:
+                row = min(int((y + 0.5) * PIXEL_SIZE // CELL_SIZE), rows - 1)
+                col = min(int((x + 0.5) * PIXEL_SIZE // CELL_SIZE), cols - 1)
+                sums[row, col] += values[y, x]
+                counts[row, col] += 1
+    return sums.ravel(), counts.ravel()
+
+
+@pytest.mark.parametrize('strip_rows', [1, 13, SHAPE[0]])
+def test_strips_match_brute_force(strip_rows):
+    values, valid = density()
+    aggregator = CellAggregator(GEOTRANSFORM, SHAPE[1], SHAPE[0], CELL_SIZE)
+    for yoff in range(0, SHAPE[0], strip_rows):
+        window = slice(yoff, yoff + strip_rows)
+        aggregator.add(aggregator.partial(yoff, values[window], valid[window]))
+    sums, counts = brute_force(values, valid)
+    np.testing.assert_allclose(aggregator.sums, sums)
+    np.testing.assert_array_equal(aggregator.counts, counts)
+
+
+def test_carbon_columns_and_restored_state():
+    values, valid = density()
+    aggregator = CellAggregator(GEOTRANSFORM, SHAPE[1], SHAPE[0], CELL_SIZE)
+    aggregator.add(aggregator.partial(0, values, valid))
+    restored = CellAggregator(GEOTRANSFORM, SHAPE[1], SHAPE[0], CELL_SIZE)
+    restored.restore(aggregator.state())
+    density_ha, carbon_ton, area_ha = restored.carbon_columns(PIXEL_SIZE ** 2)
+    sums, counts = brute_force(values, valid)
+    np.testing.assert_allclose(density_ha, sums / counts)
+    np.testing.assert_allclose(area_ha, counts * PIXEL_SIZE ** 2 / 10000)
+    np.testing.assert_allclose(carbon_ton, density_ha * area_ha)
+
+
+def test_cell_polygons_tile_the_raster_extent():
+    aggregator = CellAggregator(GEOTRANSFORM, SHAPE[1], SHAPE[0], CELL_SIZE)
+    last = aggregator.rows * aggregator.cols - 1
+    first_ring = struct.unpack('<BIII10d', aggregator.cell_polygon_wkb(0))[4:]
+    last_ring = struct.unpack('<BIII10d', aggregator.cell_polygon_wkb(last))[4:]
+    assert (first_ring[0], first_ring[5]) == (GEOTRANSFORM[0], GEOTRANSFORM[3])
+    assert last_ring[2] == GEOTRANSFORM[0] + aggregator.cols * CELL_SIZE
+    assert last_ring[1] == GEOTRANSFORM[3] - aggregator.rows * CELL_SIZE
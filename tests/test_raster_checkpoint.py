@@ -0,0 +1,116 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('osgeo')
+pytest.importorskip('qgis.core')
+
+from processing_provider.tnc_carbon_checkpoint import RasterCheckpoint
+from processing_provider.tnc_carbon_raster_aggregate import CellAggregator
+from processing_provider.tnc_carbon_raster_pipeline import MODEL_PASS, write_model_raster
+
+XSIZE, YSIZE = 64, 200
+NODATA = -9999.0
+
+
+class FileBand:
+    """Output band backed by a raw float32 file, so two runs can be compared byte for byte."""
+
+    def __init__(self, path):
+        mode = 'r+' if os.path.exists(path) else 'w+'
+        self.values = np.memmap(path, dtype=np.float32, mode=mode, shape=(YSIZE, XSIZE))
+        self.XSize, self.YSize = XSIZE, YSIZE
+
+    def WriteArray(self, array, xoff, yoff):
+        self.values[yoff:yoff + array.shape[0], xoff:xoff + array.shape[1]] = array
+
+    def GetDataset(self):
+        return self
+
+    def FlushCache(self):
+        self.values.flush()
+
+
+class CancelAfter:
+
+    def __init__(self, windows):
+        self.windows = windows
+        self.progress = 0
+
+    def isCanceled(self):
+        return self.progress >= self.windows
+
+    def setProgress(self, progress):
+        self.progress += 1
+
+
+def chm():
+    rng = np.random.default_rng(5)
+    values = rng.gamma(2.0, 6.0, (YSIZE, XSIZE)).astype(np.float32)
+    values[rng.random(values.shape) < 0.05] = NODATA
+    return values
+
+
+def run(path, checkpoint=None, feedback=None, aggregate=True):
+    values = chm()
+    read = lambda window: (values[window[0]:window[0] + window[1]], values[window[0]:window[0] + window[1]] == NODATA)
+    windows = [(yoff, min(16, YSIZE - yoff)) for yoff in range(0, YSIZE, 16)]
+    aggregator = CellAggregator((0.0, 1.0, 0.0, YSIZE, 0.0, -1.0), XSIZE, YSIZE, 10.0) if aggregate else None
+    band = FileBand(path)
+    complete = write_model_raster(read, windows, lambda chm: 0.3 * np.abs(chm) ** 1.5, band, NODATA, aggregator,
+                                  workers=2, queue_depth=1, feedback=feedback, checkpoint=checkpoint)
+    band.FlushCache()
+    return complete, aggregator
+
+
+def test_resumed_model_pass_matches_an_uninterrupted_run(tmp_path):
+    whole_path = str(tmp_path / 'whole.raw')
+    complete, whole = run(whole_path)
+    assert complete
+
+    resumed_path = str(tmp_path / 'resumed.raw')
+    journal = resumed_path + '.npz'
+    complete, _ = run(resumed_path, RasterCheckpoint(journal, 'run', [resumed_path], interval=0.0), CancelAfter(5))
+    assert not complete
+    done = RasterCheckpoint(journal, 'run').resume(MODEL_PASS)[0]
+    assert 0 < done < YSIZE
+
+    complete, resumed = run(resumed_path, RasterCheckpoint(journal, 'run', [resumed_path], interval=0.0))
+    assert complete
+    with open(whole_path, 'rb') as first, open(resumed_path, 'rb') as second:
+        assert first.read() == second.read()
+    np.testing.assert_array_equal(resumed.sums, whole.sums)
+    np.testing.assert_array_equal(resumed.counts, whole.counts)
+
+
+def test_journal_of_another_run_is_ignored(tmp_path):
+    path = str(tmp_path / 'out.raw')
+    journal = path + '.npz'
+    run(path, RasterCheckpoint(journal, 'run', [path], interval=0.0), CancelAfter(3))
+    assert RasterCheckpoint(journal, 'run').resume(MODEL_PASS)[0] > 0
+    assert RasterCheckpoint(journal, 'other run').resume(MODEL_PASS) == (0, None)
+
+
+def test_resume_with_an_aggregator_the_interrupted_run_did_not_have_starts_over(tmp_path):
+    whole_path = str(tmp_path / 'whole.raw')
+    _, whole = run(whole_path)
+
+    path = str(tmp_path / 'out.raw')
+    journal = path + '.npz'
+    complete, _ = run(path, RasterCheckpoint(journal, 'run', [path], interval=0.0), CancelAfter(5), aggregate=False)
+    assert not complete and RasterCheckpoint(journal, 'run').resume(MODEL_PASS)[0] > 0
+
+    checkpoint = RasterCheckpoint(journal, 'run', [path], interval=0.0)
+    complete, resumed = run(path, checkpoint)
+    assert complete
+    with open(whole_path, 'rb') as first, open(path, 'rb') as second:
+        assert first.read() == second.read()
+    np.testing.assert_array_equal(resumed.sums, whole.sums)
+    np.testing.assert_array_equal(resumed.counts, whole.counts)
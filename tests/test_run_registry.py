@@ -0,0 +1,75 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import json
+import sqlite3
+
+import pytest
+
+from processing_provider.tnc_carbon_run_registry import REGISTRY_VERSION, RunRegistry, input_fingerprint
+
+HISTORY = ('SELECT run_id, campaign, zone_id, sample_count, carbon_ton FROM zone_history '
+           'WHERE zone_key = ? ORDER BY run_id')
+
+
+def rows(carbon):
+    return [(zone_id, f'CAR-{zone_id}', 100 + zone_id, ton / 2.5, ton / 250, ton, ton * 1000,
+             {'Canopy Cover Rate': 0.8} if zone_id == 0 else None)
+            for zone_id, ton in enumerate(carbon)]
+
+
+def test_zone_history_follows_a_zone_across_runs(tmp_path):
+    raster = tmp_path / 'chm.tif'
+    raster.write_bytes(b'II*\x00chm')
+    path = str(tmp_path / 'registry.sqlite')
+    with RunRegistry(path) as registry:
+        first = registry.record_run('tnccc:amazonchm', 'Amazônia', {'THRESHOLD': 2.0},
+                                    {'INPUT_RASTER': str(raster), 'INPUT_POLYGON': None}, rows([10.0, 20.0]), '2020')
+        second = registry.record_run('tnccc:amazonchm', 'Amazônia', {'THRESHOLD': 2.0},
+                                     {'INPUT_RASTER': str(raster)}, rows([12.0, 18.0, 5.0]), '2024')
+    assert second > first
+
+    with RunRegistry(path) as registry:
+        history = registry.connection.execute(HISTORY, ('CAR-1',)).fetchall()
+        assert history == [(first, '2020', 1, 101, 20.0), (second, '2024', 1, 101, 18.0)]
+        assert registry.connection.execute(HISTORY, ('CAR-2',)).fetchall() == [(second, '2024', 2, 102, 5.0)]
+        inputs = registry.connection.execute(
+            'SELECT name, fingerprint FROM run_inputs WHERE run_id = ? ORDER BY name', (first,)).fetchall()
+        assert inputs == [('INPUT_POLYGON', None), ('INPUT_RASTER', input_fingerprint(str(raster)))]
+        metrics, parameters = registry.connection.execute(
+            'SELECT metrics, parameters FROM results JOIN runs USING (run_id) WHERE run_id = ? AND zone_id = 0',
+            (first,)).fetchone()
+        assert json.loads(metrics) == {'Canopy Cover Rate': 0.8}
+        assert json.loads(parameters) == {'THRESHOLD': 2.0}
+
+
+def test_a_zone_is_recorded_once_per_run(tmp_path):
+    with RunRegistry(str(tmp_path / 'registry.sqlite')) as registry:
+        run_id = registry.record_run('tnccc:amazonchm', 'Amazônia', {}, {}, rows([10.0]))
+        with pytest.raises(sqlite3.IntegrityError):
+            registry.record_run('tnccc:amazonchm', 'Amazônia', {}, {}, rows([10.0]) + rows([11.0]))
+        # A transação inteira é desfeita: nem a execução nem os resultados parciais ficam
+        assert registry.connection.execute('SELECT run_id FROM runs').fetchall() == [(run_id,)]
+        assert registry.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0] == 1
+
+
+def test_registry_of_an_older_version_gets_the_missing_schema(tmp_path):
+    path = str(tmp_path / 'registry.sqlite')
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE runs (run_id INTEGER PRIMARY KEY, started_at TEXT NOT NULL, algorithm TEXT NOT NULL,
+                           biome TEXT, campaign TEXT, parameters TEXT);
+        INSERT INTO runs VALUES (1, '2024-01-01T00:00:00+00:00', 'tnccc:amazonchm', 'Amazônia', '2023', '{}');
+    """)
+    connection.close()
+
+    with RunRegistry(path) as registry:
+        assert registry.connection.execute('PRAGMA user_version').fetchone()[0] == REGISTRY_VERSION
+        names = {name for name, in registry.connection.execute('SELECT name FROM sqlite_master')}
+        assert {'run_inputs', 'results', 'zone_history', 'results_run_zone', 'results_zone_key'} <= names
+        assert registry.connection.execute('SELECT campaign FROM runs').fetchall() == [('2023',)]
+        run_id = registry.record_run('tnccc:amazonchm', 'Amazônia', {}, {}, rows([7.0]), '2024')
+        assert registry.connection.execute(HISTORY, ('CAR-0',)).fetchall() == [(run_id, '2024', 0, 100, 7.0)]
@@ -0,0 +1,89 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip('osgeo')
+
+from osgeo import ogr # type: ignore
+
+from processing_provider.tnc_carbon_table_outputs import (GEOMETRY_COLUMN, GEOPARQUET_VERSION, _as_list, _field_kind,
+                                                          write_parquet)
+
+
+def wkb(wkt):
+    return bytes(ogr.CreateGeometryFromWkt(wkt).ExportToIsoWkb())
+
+
+def test_nan_becomes_null():
+    assert _as_list(np.array([1.5, np.nan, 3.0])) == [1.5, None, 3.0]
+    assert _as_list([1.5, float('nan'), np.float32('nan'), np.float64(2.0), None]) == [1.5, None, None, 2.0, None]
+    assert _as_list(np.array([1, 2], dtype=np.int64)) == [1, 2]
+
+
+@pytest.mark.parametrize('values, kind', [
+    ([1, 2, None], 'integer'),
+    ([np.int64(1), 2], 'integer'),
+    ([1, 2.5, None], 'real'),
+    ([2.5, np.int32(1)], 'real'),
+    ([None, None], 'real'),
+    ([1, True], 'string'),
+    ([np.bool_(True)], 'string'),
+    ([1.5, 'CAR-1'], 'string'),
+])
+def test_field_kind(values, kind):
+    assert _field_kind(values) == kind
+
+
+def test_geoparquet_columns_and_metadata(tmp_path):
+    pyarrow = pytest.importorskip('pyarrow')
+    pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'zones.parquet')
+    columns = {
+        'ID': np.array([1, 2, 3], dtype=np.int64),
+        'Carbon (ton)': np.array([10.5, np.nan, 7.25]),
+        'Sample Count': [4, 2.5, None],
+        'Valid': [True, False, None],
+        'Key': ['CAR-1', 2, None],
+    }
+    geometries = [wkb('POLYGON ((0 0, 4 0, 4 3, 0 3, 0 0))'),
+                  wkb('MULTIPOLYGON (((10 -2, 12 -2, 12 1, 10 -2)))'),
+                  None]
+    write_parquet(path, columns, geometries)
+
+    table = pyarrow.parquet.read_table(path)
+    assert table.schema.field('ID').type == pyarrow.int64()
+    assert table.schema.field('Carbon (ton)').type == pyarrow.float64()
+    assert table.schema.field('Sample Count').type == pyarrow.float64()
+    assert table.schema.field('Valid').type == pyarrow.string()
+    assert table.schema.field('Key').type == pyarrow.string()
+    assert table.schema.field(GEOMETRY_COLUMN).type == pyarrow.binary()
+    assert table.column('Carbon (ton)').to_pylist() == [10.5, None, 7.25]
+    assert table.column('Sample Count').to_pylist() == [4.0, 2.5, None]
+    assert table.column('Valid').to_pylist() == ['True', 'False', None]
+    assert table.column('Key').to_pylist() == ['CAR-1', '2', None]
+    assert table.column(GEOMETRY_COLUMN).to_pylist() == geometries
+
+    geo = json.loads(table.schema.metadata[b'geo'])
+    assert geo['version'] == GEOPARQUET_VERSION and geo['primary_column'] == GEOMETRY_COLUMN
+    column = geo['columns'][GEOMETRY_COLUMN]
+    assert column['encoding'] == 'WKB'
+    assert column['geometry_types'] == ['MultiPolygon', 'Polygon']
+    assert column['bbox'] == [0.0, -2.0, 12.0, 3.0]
+    assert 'crs' not in column
+
+
+def test_parquet_without_geometries_has_no_geo_metadata(tmp_path):
+    pyarrow = pytest.importorskip('pyarrow')
+    pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'raster.parquet')
+    write_parquet(path, {'Carbon (ton)': [np.float64(1.5)]})
+    table = pyarrow.parquet.read_table(path)
+    assert b'geo' not in (table.schema.metadata or {})
+    assert table.column('Carbon (ton)').to_pylist() == [1.5]
@@ -0,0 +1,80 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import numpy as np
+import pytest
+
+pytest.importorskip('osgeo')
+
+from processing_provider.tnc_carbon_raster_pipeline import halo_extent
+from processing_provider.tnc_carbon_tree_detection import TreeDetector, max_filter
+
+SHAPE = (150, 80)
+
+
+def canopy(seed=4):
+    """Gaussian crowns of random heights over a noisy ground, with a flat top and some nodata."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:SHAPE[0], 0:SHAPE[1]]
+    chm = rng.random(SHAPE) * 0.5
+    for _ in range(60):
+        cy, cx = rng.uniform(0, SHAPE[0]), rng.uniform(0, SHAPE[1])
+        height, radius = rng.uniform(5, 30), rng.uniform(2, 6)
+        chm = np.maximum(chm, height * np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * radius ** 2)))
+    chm = np.round(chm, 2).astype(np.float32)
+    chm[40:42, 30:33] = 40.0
+    nodata_mask = rng.random(SHAPE) < 0.02
+    return chm, nodata_mask
+
+
+def detect(detector, chm, nodata_mask, strip_rows):
+    for yoff in range(0, SHAPE[0], strip_rows):
+        window = (yoff, min(strip_rows, SHAPE[0] - yoff))
+        top, bottom = halo_extent(window, detector.halo_y, SHAPE[0])
+        detector.add(detector.detect(window, top, (chm[top:bottom], nodata_mask[top:bottom])))
+    return detector.tops()
+
+
+def test_max_filter_matches_brute_force():
+    values = np.random.default_rng(1).random((17, 13))
+    expected = np.array([[values[max(0, y - 2):y + 3, max(0, x - 1):x + 2].max() for x in range(13)]
+                         for y in range(17)])
+    np.testing.assert_array_equal(max_filter(values, 1, 2), expected)
+
+
+@pytest.mark.parametrize('strip_rows', [1, 9, 32])
+def test_strips_find_the_same_tops_as_the_whole_raster(strip_rows):
+    chm, nodata_mask = canopy()
+    whole = detect(TreeDetector(2.0, 0.5, 0.5), chm, nodata_mask, SHAPE[0])
+    strips = detect(TreeDetector(2.0, 0.5, 0.5), chm, nodata_mask, strip_rows)
+    for expected, found in zip(whole, strips):
+        np.testing.assert_array_equal(found, expected)
+
+
+def test_tops_are_the_maximum_of_their_window():
+    chm, nodata_mask = canopy()
+    detector = TreeDetector(2.0, 0.5, 0.5)
+    rows, cols, heights = detect(detector, chm, nodata_mask, SHAPE[0])
+    assert rows.size > 20
+    # O topo plano de 2 x 3 pixels conta uma única vez, no primeiro pixel em ordem de leitura
+    flat = (rows >= 40) & (rows < 42) & (cols >= 30) & (cols < 33)
+    assert list(zip(rows[flat], cols[flat])) == [(40, 30)]
+    valid_heights = np.where(nodata_mask, -np.inf, chm)
+    for row, col, height in zip(rows, cols, heights):
+        radius_x, radius_y = detector.window_radius(height)
+        box = valid_heights[max(0, row - radius_y):row + radius_y + 1, max(0, col - radius_x):col + radius_x + 1]
+        assert height >= detector.min_height and height == box.max()
+        assert not nodata_mask[row, col]
+
+
+def test_restored_state_keeps_the_tops():
+    chm, nodata_mask = canopy()
+    detector = TreeDetector(2.0, 0.5, 0.5)
+    tops = detect(detector, chm, nodata_mask, 32)
+    restored = TreeDetector(2.0, 0.5, 0.5)
+    restored.restore(detector.state())
+    for expected, found in zip(tops, restored.tops()):
+        np.testing.assert_array_equal(found, expected)
@@ -0,0 +1,69 @@
+__author__ = 'Vitor Di Lorenzzi Nunes da Cunha'
+__date__ = '2026-10-19'
+__copyright__ = '(C) 2026 by Vitor Di Lorenzzi Nunes da Cunha'
+
+__revision__ = '$Format:%H$'
+
+import numpy as np
+import pytest
+
+from processing_provider.tnc_carbon_uncertainty import LinearModelUncertainty, parse_covariance
+
+COEFFICIENTS = (-4.0, 30.0, 1.8)
+COVARIANCE = '4.0, -0.5, 0.02, 9.0, -0.1, 0.01'
+PIXEL_AREA_M2 = 1.0
+
+
+def zones():
+    count = np.array([400.0, 2500.0, 40_000.0, 250_000.0, np.nan])
+    mean_chm = np.array([3.0, 8.5, 14.0, 21.0, 5.0])
+    rate = 0.62
+    mean = COEFFICIENTS[0] + COEFFICIENTS[1] * rate + COEFFICIENTS[2] * mean_chm
+    return count, mean, rate
+
+
+def test_parse_covariance():
+    covariance = parse_covariance(COVARIANCE)
+    np.testing.assert_array_equal(covariance, covariance.T)
+    np.testing.assert_array_equal(parse_covariance(' '.join(map(str, covariance.ravel()))), covariance)
+    assert parse_covariance('') is None
+    with pytest.raises(ValueError):
+        parse_covariance('1, 2, 3')
+    with pytest.raises(ValueError):
+        parse_covariance('1, 0, 0, -1, 0, 1')
+
+
+def test_monte_carlo_agrees_with_the_analytic_standard_errors():
+    uncertainty = LinearModelUncertainty(COEFFICIENTS, parse_covariance(COVARIANCE), residual_se=12.0)
+    count, mean, rate = zones()
+    analytic, analytic_total = uncertainty.zone_intervals(count, mean, rate, PIXEL_AREA_M2)
+    sampled, sampled_total = uncertainty.zone_intervals(count, mean, rate, PIXEL_AREA_M2, iterations=20_000, seed=7)
+    se_name, low_name, high_name = uncertainty.column_names()
+    np.testing.assert_allclose(sampled[se_name][:4], analytic[se_name][:4], rtol=0.03)
+    # Os limites podem ficar perto de zero: a tolerância é uma fração do erro padrão
+    tolerance = 0.05 * analytic[se_name][:4]
+    assert np.all(np.abs(sampled[low_name][:4] - analytic[low_name][:4]) <= tolerance)
+    assert np.all(np.abs(sampled[high_name][:4] - analytic[high_name][:4]) <= tolerance)
+    assert sampled_total[0] == pytest.approx(analytic_total[0], rel=0.03)
+    assert np.isnan(analytic[se_name][4]) and np.isnan(sampled[se_name][4])
+
+
+def test_shared_coefficient_errors_do_not_average_out_in_the_total():
+    uncertainty = LinearModelUncertainty(COEFFICIENTS, parse_covariance(COVARIANCE))
+    count, mean, rate = zones()
+    columns, total = uncertainty.zone_intervals(count, mean, rate, PIXEL_AREA_M2)
+    se = columns[uncertainty.column_names()[0]][:4]
+    # Sem resíduos, o erro de todas as zonas vem dos mesmos coeficientes: o total fica acima da soma em quadratura
+    assert total[0] > np.sqrt(np.sum(se ** 2))
+    carbon = np.nansum(mean * count * PIXEL_AREA_M2 / 10000)
+    assert (total[1] + total[2]) / 2 == pytest.approx(carbon)
+
+
+def test_residuals_shrink_with_the_zone_area():
+    uncertainty = LinearModelUncertainty(COEFFICIENTS, residual_se=12.0, plot_area_ha=0.25)
+    count, mean, rate = zones()
+    columns, _ = uncertainty.zone_intervals(count, mean, rate, PIXEL_AREA_M2)
+    area_ha = count[:4] * PIXEL_AREA_M2 / 10000
+    expected = area_ha * 12.0 * np.sqrt(np.minimum(1.0, 0.25 / area_ha))
+    np.testing.assert_allclose(columns[uncertainty.column_names()[0]][:4], expected)
+    assert not LinearModelUncertainty(COEFFICIENTS).enabled